@@ -38,39 +38,68 @@ Agent Integration:
 """
 
 import logging
-
-# Configure module logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='[%(asctime)s] [%(levelname)s] [%(name)s] %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
-
-# Public API exports
-from session_db import (
-    SessionDB,
-    SessionDBError,
-    SessionNotFoundError,
-    DatabaseConnectionError,
-    ConfigurationError
-)
-
-from query import (
-    get_relevant_context,
-    search_sessions,
-    get_recent_sessions
-)
-
-from hooks import (
-    on_agent_exit,
-    on_agent_start,
-    save_agent_session
-)
-
-from capture import (
-    capture_session_on_exit,
-    preprocess_conversation
-)
+import importlib
+
+# Library logging: handlers are left to the application (see README)
+logging.getLogger("bmad.session_logger").addHandler(logging.NullHandler())
+
+# Public API exports, imported on first attribute access so that importing
+# the package does not pull in chromadb or sentence-transformers
+_LAZY_EXPORTS = {
+    # session_db
+    "SessionDB": "session_db",
+    "SessionDBError": "session_db",
+    "SessionNotFoundError": "session_db",
+    "DatabaseConnectionError": "session_db",
+    "ConfigurationError": "session_db",
+
+    # query
+    "get_relevant_context": "query",
+    "search_sessions": "query",
+    "get_recent_sessions": "query",
+
+    # hooks
+    "on_agent_exit": "hooks",
+    "on_agent_start": "hooks",
+    "open_agent_session": "hooks",
+    "on_agent_turns": "hooks",
+    "save_agent_session": "hooks",
+
+    # capture
+    "capture_session_on_exit": "capture",
+    "preprocess_conversation": "capture",
+
+    # capture_queue
+    "CaptureQueue": "capture_queue",
+    "get_capture_queue": "capture_queue",
+    "flush_captures": "capture_queue",
+
+    # engine
+    "get_registry": "engine",
+    "close_engines": "engine",
+
+    # tracing
+    "add_span_listener": "tracing",
+    "remove_span_listener": "tracing",
+    "profile": "tracing",
+
+    # config
+    "get_config": "config",
+    "reload_config": "config",
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
 
 
 __version__ = "1.0.0"
@@ -94,9 +123,29 @@ __all__ = [
     # Agent hooks
     "on_agent_exit",
     "on_agent_start",
+    "open_agent_session",
+    "on_agent_turns",
     "save_agent_session",
 
     # Capture functions
     "capture_session_on_exit",
     "preprocess_conversation",
+
+    # Background capture
+    "CaptureQueue",
+    "get_capture_queue",
+    "flush_captures",
+
+    # Engine registry
+    "get_registry",
+    "close_engines",
+
+    # Tracing and profiling
+    "add_span_listener",
+    "remove_span_listener",
+    "profile",
+
+    # Configuration
+    "get_config",
+    "reload_config",
 ]
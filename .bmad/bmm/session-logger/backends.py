@@ -0,0 +1,191 @@
+"""
+BMAD Session Logger - Storage Backends
+Backend protocol for vector storage, and the ChromaDB implementation.
+
+SessionDB talks to its storage only through StorageBackend. Calls and
+results follow the ChromaDB collection conventions (lists of ids,
+embeddings, documents and metadatas; ``where`` filters with ``$and``,
+``$or``, ``$eq``, ``$ne``, ``$in``, ``$nin``, ``$gt``, ``$gte``, ``$lt`` and
+``$lte``; query results nested one list per query embedding), so the Chroma
+backend is a thin adapter and other backends can be swapped in.
+
+Backends:
+    chroma - ChromaDB persistent collection (HNSW index)
+    numpy  - Memory-mapped float32 matrix + SQLite metadata table with exact
+             vectorized search (see numpy_backend.py); no ChromaDB needed
+    quantized - numpy layout plus int8 or binary codes scanned first, with
+             exact rescoring of the best candidates (see quantized_backend.py)
+
+Distances depend on the backend's distance space; distance_to_relevance()
+turns them into cosine similarity so relevance thresholds mean the same
+thing everywhere.
+"""
+
+import logging
+from typing import Dict, List, Optional, Sequence
+
+
+# Configure logging
+logger = logging.getLogger("bmad.session_logger.backends")
+
+
+# Constants
+BACKENDS = ("chroma", "numpy", "quantized")
+DEFAULT_BACKEND = "chroma"
+GET_INCLUDE = ("documents", "metadatas")
+QUERY_INCLUDE = ("documents", "metadatas", "distances")
+DISTANCE_SPACES = ("l2", "cosine", "ip")
+DEFAULT_SPACE = "l2"
+
+
+def distance_to_relevance(distance: float, space: str = DEFAULT_SPACE) -> float:
+    """Convert a backend distance to a relevance score in 0.0-1.0.
+
+    SessionDB stores unit-length embeddings, so every space maps onto
+    cosine similarity: squared L2 is 2 - 2cos, and the "cosine" and "ip"
+    distances are both 1 - cos. Negative similarities clamp to 0.0.
+
+    Args:
+        distance: Distance returned by query()
+        space: Distance space of the collection (see DISTANCE_SPACES)
+    """
+    if space == "l2":
+        similarity = 1.0 - distance / 2.0
+    else:
+        similarity = 1.0 - distance
+    return max(0.0, min(1.0, similarity))
+
+
+class StorageBackend:
+    """Vector storage for one collection of records.
+
+    Distances returned by query() are in the backend's ``space`` (squared
+    L2 unless the collection was created otherwise).
+    """
+
+    name = "base"
+    space = DEFAULT_SPACE
+
+    def add(self, ids: List[str], embeddings: Sequence, documents: List[str],
+            metadatas: List[Dict]) -> None:
+        """Insert records; IDs that already exist are left unchanged."""
+        raise NotImplementedError
+
+    def upsert(self, ids: List[str], embeddings: Sequence, documents: List[str],
+               metadatas: List[Dict]) -> None:
+        """Insert records, replacing any with the same ID."""
+        raise NotImplementedError
+
+    def update_metadata(self, ids: List[str], metadatas: List[Dict]) -> None:
+        """Replace the metadata of existing records, keeping vectors and documents.
+
+        Metadata dicts are complete (every key of the record); unknown IDs
+        are ignored.
+        """
+        raise NotImplementedError
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None,
+            include: Optional[List[str]] = None, limit: Optional[int] = None,
+            offset: Optional[int] = None) -> Dict:
+        """Fetch records by ID and/or filter.
+
+        Returns:
+            Dict with "ids" plus the included fields ("documents",
+            "metadatas", "embeddings"), one entry per record
+        """
+        raise NotImplementedError
+
+    def query(self, query_embeddings: Sequence, n_results: int = 10,
+              where: Optional[Dict] = None, include: Optional[List[str]] = None) -> Dict:
+        """Nearest-neighbour search.
+
+        Returns:
+            Dict with "ids" and the included fields ("documents", "metadatas",
+            "distances", "embeddings"), each a list per query embedding,
+            nearest first
+        """
+        raise NotImplementedError
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None) -> None:
+        """Remove records by ID and/or filter."""
+        raise NotImplementedError
+
+    def count(self) -> int:
+        """Number of stored records."""
+        raise NotImplementedError
+
+    def list(self, limit: Optional[int] = None, offset: int = 0, where: Optional[Dict] = None,
+             include: Optional[List[str]] = None) -> Dict:
+        """Page through records in storage order (see get)."""
+        return self.get(where=where, include=include, limit=limit, offset=offset)
+
+    def close(self) -> None:
+        """Release files or handles held by the backend."""
+
+
+class ChromaBackend(StorageBackend):
+    """StorageBackend over a ChromaDB collection.
+
+    Args:
+        collection: chromadb Collection
+    """
+
+    name = "chroma"
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.space = self._read_space(collection)
+
+    @staticmethod
+    def _read_space(collection) -> str:
+        """Distance space from the collection configuration (legacy metadata as fallback)."""
+        hnsw = (getattr(collection, "configuration_json", None) or {}).get("hnsw") or {}
+        space = hnsw.get("space") or (collection.metadata or {}).get("hnsw:space")
+        return space if space in DISTANCE_SPACES else DEFAULT_SPACE
+
+    def add(self, ids, embeddings, documents, metadatas) -> None:
+        self.collection.add(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def upsert(self, ids, embeddings, documents, metadatas) -> None:
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def update_metadata(self, ids, metadatas) -> None:
+        existing = set(self.collection.get(ids=ids, include=[])["ids"])
+        pairs = [(record_id, metadata) for record_id, metadata in zip(ids, metadatas)
+                 if record_id in existing]
+        if pairs:
+            self.collection.update(
+                ids=[record_id for record_id, _ in pairs],
+                metadatas=[metadata for _, metadata in pairs]
+            )
+
+    def get(self, ids=None, where=None, include=None, limit=None, offset=None) -> Dict:
+        kwargs = {"include": list(include) if include is not None else list(GET_INCLUDE)}
+        if ids is not None:
+            kwargs["ids"] = ids
+        if where:
+            kwargs["where"] = where
+        if limit is not None:
+            kwargs["limit"] = limit
+        if offset:
+            kwargs["offset"] = offset
+        return self.collection.get(**kwargs)
+
+    def query(self, query_embeddings, n_results=10, where=None, include=None) -> Dict:
+        return self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where or None,
+            include=list(include) if include is not None else list(QUERY_INCLUDE)
+        )
+
+    def delete(self, ids=None, where=None) -> None:
+        kwargs = {}
+        if ids is not None:
+            kwargs["ids"] = ids
+        if where:
+            kwargs["where"] = where
+        self.collection.delete(**kwargs)
+
+    def count(self) -> int:
+        return self.collection.count()
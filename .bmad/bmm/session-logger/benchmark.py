@@ -0,0 +1,649 @@
+#!/usr/bin/env python3
+"""
+BMAD Session Logger - Benchmark Suite
+Reproducible performance measurements on a synthetic session corpus.
+
+Generates BMAD-style conversations (agents, workflows, topics, file
+artifacts) at a chosen scale and measures:
+    - cold startup in a fresh interpreter (package import and time to the
+      first list_sessions page, checked against STARTUP_TARGETS) and warm
+      in-process SessionDB startup
+    - single save_session latency
+    - save_sessions bulk-ingest throughput
+    - query_sessions latency p50/p95/p99, with and without filters
+    - process RSS
+    - optionally (--quantized) recall@k, latency and memory of int8 and
+      binary quantized search against exact search and the benchmarked
+      backend, on the ingested embeddings
+
+Results are written as JSON so runs can be compared; --compare flags
+metrics that regressed beyond a tolerance against a previous run.
+
+Usage:
+    python benchmark.py --scale 1k
+    python benchmark.py --sessions 5000 --output bench-5k.json
+    python benchmark.py --scale 10k --compare bench-baseline.json
+    python benchmark.py --sessions 200 --startup-only
+    python benchmark.py --scale 10k --backend numpy
+    python benchmark.py --scale 10k --quantized
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List
+
+# Setup paths
+sys.path.insert(0, str(Path(__file__).parent))
+
+from backends import BACKENDS, DEFAULT_BACKEND
+from session_db import SessionDB
+
+
+# Constants
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000}
+
+AGENT_PERSONAS = {
+    "architect": "Winston",
+    "pm": "Morgan",
+    "dev": "Amelia",
+    "tea": "Murat",
+    "sm": "Bob",
+    "ux-designer": "Sally",
+}
+
+DEFAULT_AGENT_WEIGHTS = {
+    "architect": 0.20, "pm": 0.15, "dev": 0.35, "tea": 0.10, "sm": 0.10, "ux-designer": 0.10,
+}
+
+DEFAULT_WORKFLOW_WEIGHTS = {
+    "dev-story": 0.30, "code-review": 0.15, "create-story": 0.15, "create-architecture": 0.10,
+    "prd": 0.10, "tech-spec": 0.10, "retrospective": 0.05, "none": 0.05,
+}
+
+TOPICS = [
+    "authentication", "supabase", "stripe", "webhooks", "credits", "oauth",
+    "row level security", "song generation", "suno api", "norwegian lyrics",
+    "playwright", "vercel deployment", "rate limiting", "database migrations",
+    "ui components", "tailwind", "error handling", "caching", "pricing",
+    "vipps", "accessibility", "navigation", "song library", "audio player",
+]
+
+FILE_ROOTS = [
+    "src/app/api", "src/components", "src/lib", "supabase/migrations",
+    "docs/stories", "src/app/(dashboard)", "tests/e2e",
+]
+
+SENTENCES = [
+    "We should keep the {topic} logic behind a single service module.",
+    "The {topic} flow fails when the session token has expired.",
+    "Let's add a test that covers {topic} before merging.",
+    "I updated {path} to handle the {topic} edge case.",
+    "The acceptance criteria for {topic} are now met.",
+    "Error: Cannot coerce result to single JSON object while saving {topic}.",
+    "Consider moving {topic} configuration into environment variables.",
+    "The {topic} decision is recorded in the architecture document.",
+]
+
+LATENCY_PERCENTILES = (50, 95, 99)
+
+# Cold-start budget (seconds) for hooks and CLI tools; the model load is
+# deliberately excluded because listing must not trigger it
+STARTUP_TARGETS = {"import_seconds": 0.25, "first_list_seconds": 0.75}
+
+# Runs in a fresh interpreter: argv[1] = session-logger dir, argv[2] = db path,
+# argv[3] = storage backend
+STARTUP_SCRIPT = """
+import sys, time, json, importlib.util
+started = time.perf_counter()
+spec = importlib.util.spec_from_file_location(
+    "session_logger", sys.argv[1] + "/__init__.py", submodule_search_locations=[sys.argv[1]]
+)
+sys.path.insert(0, sys.argv[1])
+package = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(package)
+SessionDB = package.SessionDB
+imported = time.perf_counter()
+SessionDB(db_path=sys.argv[2], backend=sys.argv[3]).list_sessions(limit=10)
+listed = time.perf_counter()
+print(json.dumps({
+    "import_seconds": imported - started,
+    "first_list_seconds": listed - started,
+    "chromadb_imported": "chromadb" in sys.modules,
+    "model_loaded": "sentence_transformers" in sys.modules,
+}))
+"""
+
+# Metrics where a larger value is better (everything else: smaller is better)
+HIGHER_IS_BETTER = {"sessions_per_sec", "tokens_per_sec", "recall_at_k"}
+
+TRADEOFF_RESULTS = 10        # n_results of the quantization tradeoff queries
+TRADEOFF_BATCH = 5000        # vectors per write when building the comparison stores
+
+
+# Corpus generation
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """Parse "name=weight,name=weight" (a bare name gets weight 1)."""
+    weights = {}
+    for item in spec.split(","):
+        name, _, weight = item.strip().partition("=")
+        if name:
+            weights[name] = float(weight) if weight else 1.0
+    return weights
+
+
+def topic_weights(skew: float) -> List[float]:
+    """Zipf-like topic popularity: weight of rank r is 1 / r**skew (0 = uniform)."""
+    return [1.0 / (rank ** skew) for rank in range(1, len(TOPICS) + 1)]
+
+
+def _sample_topics(rng: random.Random, weights: List[float], k: int) -> List[str]:
+    """Weighted sample of k distinct topics."""
+    chosen: List[str] = []
+    while len(chosen) < min(k, len(TOPICS)):
+        topic = rng.choices(TOPICS, weights=weights)[0]
+        if topic not in chosen:
+            chosen.append(topic)
+    return chosen
+
+
+def generate_conversation(
+    rng: random.Random,
+    topics: List[str],
+    artifacts: List[str],
+    target_chars: int
+) -> str:
+    """Build one synthetic User:/Assistant: conversation of about target_chars."""
+    parts = [f"## {topics[0].title()} session\n"]
+    length = len(parts[0])
+    turn = 0
+    while length < target_chars:
+        topic = rng.choice(topics)
+        sentences = " ".join(
+            rng.choice(SENTENCES).format(topic=topic, path=rng.choice(artifacts))
+            for _ in range(rng.randint(1, 4))
+        )
+        if turn % 2 == 0:
+            text = f"User: {sentences}"
+        else:
+            text = f"Assistant: **{topic}** - {sentences}"
+            if rng.random() < 0.2:
+                text += f"\n\n### {rng.choice(topics).title()}\n"
+        parts.append(text)
+        length += len(text) + 1
+        turn += 1
+    return "\n".join(parts)
+
+
+def generate_corpus(
+    n_sessions: int,
+    seed: int = 42,
+    min_chars: int = 2_000,
+    max_chars: int = 20_000,
+    topics_per_session: int = 3,
+    topic_skew: float = 1.0,
+    agent_weights: Dict[str, float] = None,
+    workflow_weights: Dict[str, float] = None,
+    project_name: str = "benchmark"
+) -> Iterator[Dict]:
+    """Yield save_sessions records for a deterministic synthetic corpus.
+
+    Args:
+        n_sessions: Number of sessions
+        seed: RNG seed (same seed, same corpus)
+        min_chars / max_chars: Conversation length range (uniform)
+        topics_per_session: Topics tagged per session
+        topic_skew: Zipf exponent of topic popularity (0 = uniform)
+        agent_weights: Relative frequency per agent_name
+        workflow_weights: Relative frequency per workflow
+        project_name: project_name for every session
+
+    Yields:
+        Dicts accepted by SessionDB.save_sessions
+    """
+    rng = random.Random(seed)
+    agent_weights = agent_weights or DEFAULT_AGENT_WEIGHTS
+    workflow_weights = workflow_weights or DEFAULT_WORKFLOW_WEIGHTS
+    agents, workflows = list(agent_weights), list(workflow_weights)
+    weights = topic_weights(topic_skew)
+    start = datetime(2025, 1, 1)
+    for i in range(n_sessions):
+        agent = rng.choices(agents, weights=list(agent_weights.values()))[0]
+        topics = _sample_topics(rng, weights, topics_per_session)
+        artifacts = [
+            f"{rng.choice(FILE_ROOTS)}/{topics[0].replace(' ', '-')}-{rng.randint(1, 200)}.ts"
+            for _ in range(rng.randint(0, 3))
+        ] or ["docs/notes.md"]
+        end_time = start + timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+        yield {
+            "session_id": f"bench-{seed}-{i:07d}",
+            "conversation_text": generate_conversation(
+                rng, topics, artifacts, rng.randint(min_chars, max_chars)
+            ),
+            "agent_name": agent,
+            "agent_persona": AGENT_PERSONAS.get(agent, agent.title()),
+            "project_name": project_name,
+            "workflow": rng.choices(workflows, weights=list(workflow_weights.values()))[0],
+            "topics": topics,
+            "artifacts": artifacts,
+            "start_time": end_time - timedelta(minutes=rng.randint(5, 120)),
+            "end_time": end_time,
+        }
+
+
+# Measurement helpers
+
+def percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    """Nearest-rank percentiles plus mean of latency samples (milliseconds)."""
+    if not samples_ms:
+        return {}
+    ordered = sorted(samples_ms)
+    result = {}
+    for p in LATENCY_PERCENTILES:
+        rank = max(1, int(round(p / 100.0 * len(ordered))))
+        result[f"p{p}_ms"] = round(ordered[rank - 1], 3)
+    result["mean_ms"] = round(sum(ordered) / len(ordered), 3)
+    return result
+
+
+def rss_mb() -> Dict[str, float]:
+    """Current and peak resident set size of this process in MB."""
+    result = {}
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        result["current_mb"] = round(pages * os.sysconf("SC_PAGE_SIZE") / 1e6, 1)
+    except (OSError, ValueError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KB, macOS bytes
+        result["peak_mb"] = round(peak / (1e6 if sys.platform == "darwin" else 1e3), 1)
+    except ImportError:
+        pass
+    return result
+
+
+def measure_cold_startup(db_path: str, backend: str = DEFAULT_BACKEND) -> Dict:
+    """Time package import and first list_sessions in a fresh interpreter.
+
+    Returns:
+        Dict with import_seconds (package + SessionDB attribute),
+        first_list_seconds (from interpreter start of the measurement to the
+        first page of sessions), and whether chromadb / the embedding model
+        were loaded along the way
+    """
+    output = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT,
+         str(Path(__file__).parent), db_path, backend],
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+# Benchmarks
+
+def bench_startup(db_path: str, backend: str = DEFAULT_BACKEND) -> Dict:
+    result = {}
+    try:
+        cold = measure_cold_startup(db_path, backend)
+        result.update({
+            key: round(value, 4) if isinstance(value, float) else value
+            for key, value in cold.items()
+        })
+    except (subprocess.CalledProcessError, ValueError) as e:
+        stderr = getattr(e, "stderr", "") or ""
+        result["cold_error"] = stderr.strip().splitlines()[-1] if stderr.strip() else str(e)
+    started = time.perf_counter()
+    SessionDB(db_path=db_path, backend=backend)
+    result["warm_seconds"] = round(time.perf_counter() - started, 6)
+    result["targets"] = dict(STARTUP_TARGETS)
+    return result
+
+
+def check_startup_targets(startup: Dict) -> List[str]:
+    """Return startup metrics that exceed STARTUP_TARGETS (or failed to run)."""
+    if "cold_error" in startup:
+        return [f"cold startup failed: {startup['cold_error']}"]
+    return [
+        f"{name}: {startup[name]:g}s > {target:g}s"
+        for name, target in STARTUP_TARGETS.items()
+        if startup.get(name, 0.0) > target
+    ]
+
+
+def bench_save(db: SessionDB, records: List[Dict]) -> Dict:
+    samples = []
+    for record in records:
+        started = time.perf_counter()
+        db.save_session(**record)
+        samples.append((time.perf_counter() - started) * 1000)
+    return {"count": len(samples), **percentiles(samples)}
+
+
+def bench_bulk_ingest(db: SessionDB, records: Iterator[Dict], batch_size: int) -> Dict:
+    totals = {"sessions": 0, "tokens": 0}
+
+    def counted():
+        for record in records:
+            totals["sessions"] += 1
+            totals["tokens"] += len(record["conversation_text"].split())
+            yield record
+
+    started = time.perf_counter()
+    db.save_sessions(counted(), batch_size=batch_size)
+    elapsed = time.perf_counter() - started
+    return {
+        "sessions": totals["sessions"],
+        "batch_size": batch_size,
+        "seconds": round(elapsed, 3),
+        "sessions_per_sec": round(totals["sessions"] / elapsed, 2),
+        "tokens_per_sec": round(totals["tokens"] / elapsed, 1),
+    }
+
+
+def bench_queries(db: SessionDB, n_queries: int, seed: int) -> Dict:
+    rng = random.Random(seed + 1)
+    queries = [
+        f"how did we handle {rng.choice(TOPICS)} in {rng.choice(TOPICS)}?"
+        for _ in range(n_queries)
+    ]
+    # Warm-up so model/HNSW loading is not counted as query latency
+    db.query_sessions(queries[0], n_results=5)
+
+    cases = {
+        "unfiltered": {},
+        "agent_filter": {"agent_name": "dev"},
+        "agent_workflow_filter": {"agent_name": "dev", "workflow": "dev-story"},
+        "topic_prefilter": {"topics_any": ["stripe", "webhooks"]},
+    }
+    results = {}
+    for name, filters in cases.items():
+        samples = []
+        for query in queries:
+            started = time.perf_counter()
+            db.query_sessions(query, n_results=5, **filters)
+            samples.append((time.perf_counter() - started) * 1000)
+        results[name] = {"count": len(samples), **percentiles(samples)}
+    return results
+
+
+def _files_mb(paths) -> float:
+    return round(sum(path.stat().st_size for path in paths if path.is_file()) / 1e6, 2)
+
+
+def _backend_memory(db: SessionDB) -> Dict:
+    """Size of what the benchmarked backend scans per query."""
+    if db.backend == "chroma":
+        # HNSW segment directories; ChromaDB keeps the whole index in memory
+        segments = [path.parent for path in Path(db.db_path).glob("*/data_level0.bin")]
+        return {"index_mb": _files_mb(path for segment in segments for path in segment.iterdir())}
+    collection = db.collection
+    if hasattr(collection, "memory_usage"):
+        usage = collection.memory_usage()
+        return {"first_pass_mb": round(usage["codes_bytes"] / 1e6, 2),
+                "float_mb": round(usage["float_bytes"] / 1e6, 2)}
+    return {"first_pass_mb": _files_mb([collection.path / "embeddings.npy"])}
+
+
+def bench_vector_tradeoff(db: SessionDB, n_queries: int, seed: int) -> Dict:
+    """Recall@k, latency and memory of quantized first passes.
+
+    The session embeddings are copied into an exact NumPy store (ground
+    truth) and one quantized store per quantization; the benchmarked
+    backend answers the same queries. Memory is what a query scans: the
+    float matrix for exact search, the codes for quantized search (the
+    float matrix stays on disk and only rescored rows are read), the HNSW
+    index for ChromaDB.
+    """
+    import numpy as np
+    from numpy_backend import NumpyBackend, normalize_rows
+    from quantized_backend import QuantizedBackend, QUANTIZATIONS
+
+    stored = db.collection.get(include=["embeddings"])
+    ids = stored["ids"]
+    vectors = np.asarray(stored["embeddings"], dtype=np.float32)
+    rng = random.Random(seed + 2)
+    queries = [
+        f"what did we decide about {rng.choice(TOPICS)} and {rng.choice(TOPICS)}?"
+        for _ in range(n_queries)
+    ]
+    query_vectors = normalize_rows(np.asarray(db.embedding_function(queries), dtype=np.float32))
+
+    work_dir = tempfile.mkdtemp(prefix="bmad-bench-quantized-")
+    stores = {"exact": NumpyBackend(str(Path(work_dir) / "exact"))}
+    for quantization in QUANTIZATIONS:
+        stores[quantization] = QuantizedBackend(str(Path(work_dir) / quantization), quantization)
+
+    def run(store) -> tuple:
+        samples, found = [], []
+        for query_vector in query_vectors:
+            started = time.perf_counter()
+            result = store.query([query_vector], n_results=TRADEOFF_RESULTS, include=["distances"])
+            samples.append((time.perf_counter() - started) * 1000)
+            found.append(set(result["ids"][0]))
+        return samples, found
+
+    try:
+        for store in stores.values():
+            for start in range(0, len(ids), TRADEOFF_BATCH):
+                part = ids[start:start + TRADEOFF_BATCH]
+                store.add(part, vectors[start:start + TRADEOFF_BATCH], [""] * len(part), [{}] * len(part))
+
+        # First pass doubles as warm-up of the exact store
+        _, truth = run(stores["exact"])
+        k = min(TRADEOFF_RESULTS, len(ids))
+
+        def summary(store) -> Dict:
+            samples, found = run(store)
+            recall = sum(len(hits & expected) for hits, expected in zip(found, truth))
+            return {"recall_at_k": round(recall / (k * len(truth)), 4) if k else 1.0, **percentiles(samples)}
+
+        results = {"exact": {**summary(stores["exact"]), "first_pass_mb": round(vectors.nbytes / 1e6, 2)}}
+        for quantization in QUANTIZATIONS:
+            store = stores[quantization]
+            usage = store.memory_usage()
+            results[quantization] = {
+                **summary(store),
+                "rescore_factor": store.rescore_factor,
+                "first_pass_mb": round(usage["codes_bytes"] / 1e6, 2),
+                "float_mb": round(usage["float_bytes"] / 1e6, 2),
+            }
+        results[f"backend_{db.backend}"] = {**summary(db.collection), **_backend_memory(db)}
+    finally:
+        for store in stores.values():
+            store.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "vectors": len(ids),
+        "dim": int(vectors.shape[1]) if len(ids) else 0,
+        "n_results": k,
+        "stores": results,
+    }
+
+
+def run_benchmark(args) -> Dict:
+    n_sessions = SCALES.get(args.scale, 0) if args.sessions is None else args.sessions
+    db_path = args.db_path or tempfile.mkdtemp(prefix="bmad-bench-")
+    corpus_args = dict(
+        seed=args.seed,
+        min_chars=args.min_chars,
+        max_chars=args.max_chars,
+        topics_per_session=args.topics_per_session,
+        topic_skew=args.topic_skew,
+        agent_weights=parse_weights(args.agents) if args.agents else None,
+        workflow_weights=parse_weights(args.workflows) if args.workflows else None,
+    )
+
+    report = {
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "chromadb": _package_version("chromadb"),
+            "sentence_transformers": _package_version("sentence_transformers"),
+        },
+        "parameters": {
+            "sessions": n_sessions,
+            "save_samples": args.save_samples,
+            "queries": args.queries,
+            "batch_size": args.batch_size,
+            "chunking": args.chunking,
+            "backend": args.backend,
+            "quantized": args.quantized,
+            **corpus_args,
+        },
+        "results": {},
+    }
+
+    try:
+        # Without the query cache the warm-up query and repeated topic pairs
+        # would be served from memory instead of measured
+        db = SessionDB(db_path=db_path, backend=args.backend, chunking=args.chunking, query_cache=False)
+        report["results"]["rss_after_open"] = rss_mb()
+
+        print(f"Bulk ingest of {n_sessions} sessions...", file=sys.stderr)
+        report["results"]["bulk_ingest"] = bench_bulk_ingest(
+            db, generate_corpus(n_sessions, **corpus_args), args.batch_size
+        )
+
+        if not args.startup_only:
+            print(f"Single save latency ({args.save_samples} saves)...", file=sys.stderr)
+            save_records = list(generate_corpus(args.save_samples, **{**corpus_args, "seed": args.seed + 1000}))
+            report["results"]["save_session"] = bench_save(db, save_records)
+
+            print(f"Query latency ({args.queries} queries per case)...", file=sys.stderr)
+            report["results"]["query_sessions"] = bench_queries(db, args.queries, args.seed)
+
+            if args.quantized:
+                print("Quantized search tradeoff (recall, latency, memory)...", file=sys.stderr)
+                report["results"]["vector_tradeoff"] = bench_vector_tradeoff(db, args.queries, args.seed)
+
+        print("Startup (cold subprocess, warm in-process)...", file=sys.stderr)
+        report["results"]["startup"] = bench_startup(db_path, args.backend)
+
+        report["results"]["rss_final"] = rss_mb()
+    finally:
+        if not args.keep and args.db_path is None:
+            shutil.rmtree(db_path, ignore_errors=True)
+
+    return report
+
+
+# Comparison
+
+def _flatten(data: Dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = float(value)
+    return flat
+
+
+def compare_reports(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Return human-readable regressions of current vs baseline results.
+
+    A metric regresses when it is worse than the baseline by more than
+    tolerance (fraction). Latencies, seconds and memory are lower-is-better;
+    throughput is higher-is-better.
+    """
+    regressions = []
+    cur, base = _flatten(current["results"]), _flatten(baseline["results"])
+    for name in sorted(set(cur) & set(base)):
+        if name.endswith(".count") or name.endswith(".sessions") or name.endswith(".batch_size"):
+            continue
+        old, new = base[name], cur[name]
+        if old == 0:
+            continue
+        change = (new - old) / old
+        worse = -change if name.rsplit(".", 1)[-1] in HIGHER_IS_BETTER else change
+        if worse > tolerance:
+            regressions.append(f"{name}: {old:g} -> {new:g} ({change:+.1%})")
+    return regressions
+
+
+def _package_version(name: str) -> str:
+    try:
+        module = __import__(name)
+        return getattr(module, "__version__", "unknown")
+    except ImportError:
+        return "not installed"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the BMAD session logger.")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="1k", help="Corpus size preset")
+    parser.add_argument("--sessions", type=int, default=None, help="Exact corpus size (overrides --scale)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--min-chars", type=int, default=2_000)
+    parser.add_argument("--max-chars", type=int, default=20_000)
+    parser.add_argument("--topics-per-session", type=int, default=3)
+    parser.add_argument("--topic-skew", type=float, default=1.0, help="Zipf exponent of topic popularity")
+    parser.add_argument("--agents", default=None, help='Agent mix, e.g. "dev=0.6,architect=0.4"')
+    parser.add_argument("--workflows", default=None, help='Workflow mix, e.g. "dev-story=2,code-review=1"')
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--save-samples", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--chunking", action="store_true", help="Benchmark chunked indexing")
+    parser.add_argument("--backend", choices=BACKENDS, default=DEFAULT_BACKEND,
+                        help="Storage backend to benchmark")
+    parser.add_argument("--quantized", action="store_true",
+                        help="Compare int8/binary quantized search with exact search and the backend")
+    parser.add_argument("--startup-only", action="store_true",
+                        help="Only ingest the corpus and measure startup against its targets")
+    parser.add_argument("--db-path", default=None, help="Database path (default: temporary directory)")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary database")
+    parser.add_argument("--output", default=None, help="Write JSON results here (default: stdout)")
+    parser.add_argument("--compare", default=None, help="Baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed regression fraction")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+    exit_code = 0
+    misses = check_startup_targets(report["results"]["startup"])
+    if misses:
+        print("\n[FAIL] Startup over target:", file=sys.stderr)
+        for line in misses:
+            print(f"  {line}", file=sys.stderr)
+        exit_code = 1
+    else:
+        print("\n[OK] Startup within target", file=sys.stderr)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        regressions = compare_reports(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\n[FAIL] {len(regressions)} regression(s) beyond {args.tolerance:.0%}:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            return 1
+        print(f"\n[OK] No regressions beyond {args.tolerance:.0%} against {args.compare}", file=sys.stderr)
+
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,11 +4,16 @@ Session capture and preprocessing logic.
 """
 
 import re
+import time
 import logging
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Union
 from datetime import datetime
 
-from session_db import SessionDB, SessionDBError
+from config import get_config
+from daemon_client import daemon_call, DaemonTimeoutError
+from metrics import get_metrics
+from tracing import span
+from session_db import SessionDB, SessionDBError, SessionNotFoundError, generate_session_id
 
 
 # Configure logging
@@ -82,10 +87,61 @@ def extract_topics(conversation_text: str, max_topics: int = 5) -> List[str]:
     return unique_topics
 
 
+def prepare_session(agent_context: Dict, conversation_log: str) -> Optional[Dict]:
+    """Validate agent context and preprocess a conversation for saving.
+
+    Args:
+        agent_context: Agent context dict (see capture_session_on_exit)
+        conversation_log: Full conversation text
+
+    Returns:
+        Keyword arguments for SessionDB.save_session, or None if the
+        context is invalid or the conversation is empty
+    """
+    # Validate required fields
+    required_fields = ["agent_name", "agent_persona", "project_name"]
+    for field in required_fields:
+        if field not in agent_context:
+            logger.error(f"Missing required field in agent_context: {field}")
+            return None
+
+    metrics = get_metrics()
+
+    # Preprocess conversation (unless disabled in config)
+    with metrics.timer("preprocess"):
+        if get_config()["preprocess_conversations"]:
+            cleaned_text = preprocess_conversation(conversation_log)
+        else:
+            cleaned_text = (conversation_log or "").strip()
+
+    if not cleaned_text:
+        logger.warning("Empty conversation after preprocessing, skipping save")
+        return None
+
+    # Extract topics if not provided
+    topics = agent_context.get("topics")
+    if not topics:
+        with metrics.timer("topics"):
+            topics = extract_topics(cleaned_text)
+
+    return {
+        "conversation_text": cleaned_text,
+        "agent_name": agent_context["agent_name"],
+        "agent_persona": agent_context["agent_persona"],
+        "project_name": agent_context["project_name"],
+        "workflow": agent_context.get("workflow", "none"),
+        "topics": topics,
+        "artifacts": agent_context.get("artifacts", []),
+        "start_time": agent_context.get("start_time"),
+        "end_time": agent_context.get("end_time")
+    }
+
+
 def capture_session_on_exit(
     agent_context: Dict,
     conversation_log: str,
-    db_path: str = None
+    db_path: str = None,
+    session_id: str = None
 ) -> Optional[str]:
     """Called by agent on exit. Captures and saves session.
 
@@ -101,57 +157,212 @@ def capture_session_on_exit(
             - end_time: datetime (optional)
         conversation_log: Full conversation text
         db_path: Database path (optional, uses default if None)
+        session_id: Pre-assigned session ID (optional, generated if None)
 
     Returns:
         session_id of saved session, or None if failed
 
     Note:
-        Fails gracefully - logs errors but doesn't crash agent
+        Fails gracefully - logs errors but doesn't crash agent. Runs on
+        the session logger daemon when one is running (see daemon.py).
     """
-    try:
-        # Validate required fields
-        required_fields = ["agent_name", "agent_persona", "project_name"]
-        for field in required_fields:
-            if field not in agent_context:
-                logger.error(f"Missing required field in agent_context: {field}")
+    with span("capture_session_on_exit", db_path=db_path,
+              agent_name=agent_context.get("agent_name")) as current:
+        if current:
+            current.set(doc_bytes=len((conversation_log or "").encode("utf-8")))
+        try:
+            # Assigned here so the ID is the same whether the daemon or this
+            # process saves the session
+            if session_id is None:
+                session_id = generate_session_id(agent_context.get("agent_name", "unknown"))
+            handled, saved_id = daemon_call(
+                "capture_session_on_exit", agent_context=agent_context,
+                conversation_log=conversation_log, db_path=db_path, session_id=session_id
+            )
+            if handled:
+                current.set(daemon=True, session_id=saved_id)
+                return saved_id
+
+            metrics = get_metrics()
+            started = time.perf_counter()
+            session_kwargs = prepare_session(agent_context, conversation_log)
+            if session_kwargs is None:
                 return None
 
-        # Preprocess conversation
-        cleaned_text = preprocess_conversation(conversation_log)
+            # Initialize database
+            db = SessionDB(db_path=db_path)
+
+            # Save session
+            session_id = db.save_session(session_id=session_id, **session_kwargs)
 
-        if not cleaned_text:
-            logger.warning("Empty conversation after preprocessing, skipping save")
+            current.set(session_id=session_id)
+            metrics.count("captures")
+            metrics.observe("capture", time.perf_counter() - started)
+            logger.info(f"Successfully captured session: {session_id}")
+            return session_id
+
+        except DaemonTimeoutError as e:
+            # The daemon may have saved it: saving in-process could duplicate it
+            get_metrics().count("errors.capture")
+            logger.error(f"Failed to capture session {session_id}: {e}")
+            return None
+        except SessionDBError as e:
+            get_metrics().count("errors.capture")
+            logger.error(f"Failed to capture session (database error): {e}")
+            return None
+        except Exception as e:
+            get_metrics().count("errors.capture")
+            logger.error(f"Unexpected error capturing session: {e}", exc_info=True)
             return None
 
-        # Extract topics if not provided
-        topics = agent_context.get("topics")
-        if not topics:
-            topics = extract_topics(cleaned_text)
 
-        # Initialize database
-        db = SessionDB(db_path=db_path)
+def _preprocess_turns(turns: List[Union[str, Dict]]) -> List[Union[str, Dict]]:
+    """Apply preprocess_conversation to each turn (unless disabled in config)."""
+    if not get_config()["preprocess_conversations"]:
+        return list(turns)
+    return [
+        dict(turn, content=preprocess_conversation(turn.get("content", "")))
+        if isinstance(turn, dict) else preprocess_conversation(turn)
+        for turn in turns
+    ]
+
+
+def open_session_capture(
+    agent_context: Dict,
+    db_path: str = None,
+    session_id: str = None
+) -> Optional[str]:
+    """Open a session for incremental capture (see capture_turns).
+
+    Args:
+        agent_context: Dict with agent_name, agent_persona, project_name
+            (required) and workflow, topics, artifacts, start_time (optional)
+        db_path: Database path (optional, uses default if None)
+        session_id: Pre-assigned session ID (optional, generated if None)
+
+    Returns:
+        session_id of the open session, or None if failed
+    """
+    for field in ("agent_name", "agent_persona", "project_name"):
+        if field not in agent_context:
+            logger.error(f"Missing required field in agent_context: {field}")
+            return None
 
-        # Save session
-        session_id = db.save_session(
-            conversation_text=cleaned_text,
+    try:
+        if session_id is None:
+            session_id = generate_session_id(agent_context["agent_name"])
+        handled, opened_id = daemon_call(
+            "open_session_capture", agent_context=agent_context, db_path=db_path, session_id=session_id
+        )
+        if handled:
+            return opened_id
+
+        db = SessionDB(db_path=db_path)
+        return db.open_session(
             agent_name=agent_context["agent_name"],
             agent_persona=agent_context["agent_persona"],
             project_name=agent_context["project_name"],
             workflow=agent_context.get("workflow", "none"),
-            topics=topics,
-            artifacts=agent_context.get("artifacts", []),
+            topics=agent_context.get("topics"),
+            artifacts=agent_context.get("artifacts"),
             start_time=agent_context.get("start_time"),
-            end_time=agent_context.get("end_time")
+            session_id=session_id
         )
+    except DaemonTimeoutError as e:
+        logger.error(f"Failed to open session {session_id}: {e}")
+        return None
+    except SessionDBError as e:
+        logger.error(f"Failed to open session (database error): {e}")
+        return None
+    except Exception as e:
+        logger.error(f"Unexpected error opening session: {e}", exc_info=True)
+        return None
+
+
+def capture_turns(
+    session_id: str,
+    turns: List[Union[str, Dict]],
+    db_path: str = None
+) -> bool:
+    """Append turns to a session opened with open_session_capture.
+
+    Args:
+        session_id: Open session
+        turns: Strings (e.g. "User: ...") or dicts with role and content
+        db_path: Database path (optional, uses default if None)
+
+    Returns:
+        True if the turns were stored
+    """
+    try:
+        handled, stored = daemon_call("capture_turns", session_id=session_id, turns=turns, db_path=db_path)
+        if handled:
+            return stored
+
+        db = SessionDB(db_path=db_path)
+        db.append_turns(session_id, _preprocess_turns(turns))
+        return True
+    except DaemonTimeoutError as e:
+        # The daemon may have stored them: appending in-process could duplicate them
+        logger.error(f"Failed to capture turns for {session_id}: {e}")
+        return False
+    except SessionDBError as e:
+        logger.error(f"Failed to capture turns for {session_id} (database error): {e}")
+        return False
+    except Exception as e:
+        logger.error(f"Unexpected error capturing turns: {e}", exc_info=True)
+        return False
 
-        logger.info(f"Successfully captured session: {session_id}")
-        return session_id
 
+def close_session_capture(
+    session_id: str,
+    agent_context: Dict = None,
+    db_path: str = None
+) -> Optional[str]:
+    """Complete a session opened with open_session_capture.
+
+    Topics are extracted from the captured conversation when agent_context
+    does not provide any, as for capture_session_on_exit.
+
+    Args:
+        session_id: Open session
+        agent_context: Optional dict with topics, artifacts, end_time
+        db_path: Database path (optional, uses default if None)
+
+    Returns:
+        session_id, or None if the session is not open, had no turns, or
+        closing failed
+    """
+    agent_context = agent_context or {}
+    try:
+        handled, closed_id = daemon_call(
+            "close_session_capture", session_id=session_id, agent_context=agent_context, db_path=db_path
+        )
+        if handled:
+            return closed_id
+
+        db = SessionDB(db_path=db_path)
+        topics = agent_context.get("topics")
+        if not topics:
+            if db.open_sessions.get(session_id) is not None:
+                topics = extract_topics(db.open_sessions.document(session_id))
+        return db.close_session(
+            session_id,
+            topics=topics,
+            artifacts=agent_context.get("artifacts"),
+            end_time=agent_context.get("end_time")
+        )
+    except SessionNotFoundError:
+        logger.debug(f"Session {session_id} is not open")
+        return None
+    except DaemonTimeoutError as e:
+        logger.error(f"Failed to close session {session_id}: {e}")
+        return None
     except SessionDBError as e:
-        logger.error(f"Failed to capture session (database error): {e}")
+        logger.error(f"Failed to close session {session_id} (database error): {e}")
         return None
     except Exception as e:
-        logger.error(f"Unexpected error capturing session: {e}", exc_info=True)
+        logger.error(f"Unexpected error closing session: {e}", exc_info=True)
         return None
 
 
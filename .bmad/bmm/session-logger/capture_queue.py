@@ -0,0 +1,361 @@
+"""
+BMAD Session Logger - Background Capture Queue
+Non-blocking session capture for agent exit hooks.
+
+Captured conversations are put on a bounded in-process queue (optionally
+mirrored to an on-disk spool for durability) and a worker thread embeds and
+writes them in batches. The caller gets its session_id back immediately.
+"""
+
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from session_db import SessionDB, generate_session_id
+from capture import prepare_session
+
+
+# Configure logging
+logger = logging.getLogger("bmad.session_logger.capture_queue")
+
+
+# Constants
+DEFAULT_QUEUE_SIZE = 100
+DEFAULT_BATCH_SIZE = 16
+DEFAULT_PUT_TIMEOUT = 2.0     # seconds to wait for space before falling back
+DEFAULT_EXIT_TIMEOUT = 30.0   # seconds atexit waits for pending captures
+ON_FULL_POLICIES = ("sync", "spool", "drop")
+
+_DATETIME_FIELDS = ("start_time", "end_time")
+
+
+def _to_json(item: Dict) -> Dict:
+    """Make a queued capture item JSON-serializable."""
+    context = dict(item["agent_context"])
+    for field in _DATETIME_FIELDS:
+        if isinstance(context.get(field), datetime):
+            context[field] = context[field].isoformat()
+    return {**item, "agent_context": context}
+
+
+def _from_json(item: Dict) -> Dict:
+    """Restore datetimes of a capture item read back from the spool."""
+    context = dict(item["agent_context"])
+    for field in _DATETIME_FIELDS:
+        if isinstance(context.get(field), str):
+            context[field] = datetime.fromisoformat(context[field])
+    return {**item, "agent_context": context}
+
+
+class CaptureQueue:
+    """Bounded background queue that saves captured sessions off-thread.
+
+    Args:
+        db_path: Database path (optional, uses default if None)
+        maxsize: Maximum number of pending captures held in memory
+        batch_size: Maximum captures written per worker iteration
+        spool_dir: Directory for the durable spool (optional). When set,
+            every capture is written there before it is queued and removed
+            once saved, and leftovers are recovered on the next start.
+        on_full: What to do when the queue stays full for put_timeout:
+            "sync" saves in the caller's thread, "spool" leaves the capture
+            in the spool for the next start (requires spool_dir), "drop"
+            discards it
+        put_timeout: Seconds to block waiting for queue space (back-pressure)
+    """
+
+    def __init__(
+        self,
+        db_path: str = None,
+        maxsize: int = DEFAULT_QUEUE_SIZE,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        spool_dir: str = None,
+        on_full: str = "sync",
+        put_timeout: float = DEFAULT_PUT_TIMEOUT
+    ):
+        if on_full not in ON_FULL_POLICIES:
+            raise ValueError(f"on_full must be one of {ON_FULL_POLICIES}")
+        if on_full == "spool" and spool_dir is None:
+            raise ValueError("on_full='spool' requires spool_dir")
+
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.on_full = on_full
+        self.put_timeout = put_timeout
+        self.spool_dir = Path(spool_dir) if spool_dir else None
+
+        self._queue: "queue.Queue[Dict]" = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._stats = {
+            "submitted": 0,
+            "written": 0,
+            "failed": 0,
+            "dropped": 0,
+            "sync_fallbacks": 0,
+            "recovered": 0,
+            "batches": 0,
+            "last_lag_seconds": 0.0,
+            "max_lag_seconds": 0.0,
+        }
+
+        if self.spool_dir is not None:
+            self.spool_dir.mkdir(parents=True, exist_ok=True)
+            self._recover_spool()
+
+        atexit.register(self._drain_at_exit)
+
+    # Submission
+
+    def submit(self, agent_context: Dict, conversation_log: str, session_id: str = None) -> str:
+        """Queue a capture and return its session_id immediately.
+
+        The ID is provisional: the session becomes searchable once the worker
+        has written it, and is lost if the write fails (see stats()).
+
+        Args:
+            agent_context: Agent context dict (see capture_session_on_exit)
+            conversation_log: Full conversation text
+            session_id: Pre-assigned session ID (optional, generated if None)
+
+        Returns:
+            Provisional session_id
+        """
+        if session_id is None:
+            session_id = generate_session_id(agent_context.get("agent_name", "unknown"))
+        item = {
+            "session_id": session_id,
+            "agent_context": agent_context,
+            "conversation_log": conversation_log,
+            "queued_at": time.time(),
+        }
+
+        if self.spool_dir is not None:
+            self._spool_write(item)
+
+        self._ensure_worker()
+        try:
+            self._queue.put(item, timeout=self.put_timeout)
+        except queue.Full:
+            self._handle_full(item)
+        else:
+            self._bump("submitted")
+
+        return session_id
+
+    def _handle_full(self, item: Dict) -> None:
+        """Apply the on_full policy to a capture that did not fit."""
+        session_id = item["session_id"]
+        if self.on_full == "sync":
+            logger.warning(f"Capture queue full, saving {session_id} synchronously")
+            self._bump("sync_fallbacks")
+            self._write_batch([item])
+        elif self.on_full == "spool":
+            logger.warning(f"Capture queue full, {session_id} left in spool")
+        else:
+            logger.warning(f"Capture queue full, dropping {session_id}")
+            self._bump("dropped")
+
+    # Worker
+
+    def _ensure_worker(self) -> None:
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stopping.clear()
+                self._worker = threading.Thread(
+                    target=self._run, name="bmad-capture-queue", daemon=True
+                )
+                self._worker.start()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self._write_batch(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_batch(self, batch: List[Dict]) -> None:
+        """Preprocess and save a batch of captures, recording lag and failures."""
+        try:
+            db = SessionDB(db_path=self.db_path)
+        except Exception as e:
+            logger.error(f"Capture worker cannot open database: {e}", exc_info=True)
+            self._bump("failed", len(batch))
+            return
+
+        records, written_items = [], []
+        for item in batch:
+            session_kwargs = prepare_session(
+                item["agent_context"], item["conversation_log"]
+            )
+            if session_kwargs is None:
+                self._bump("failed")
+                self._spool_remove(item["session_id"])
+                continue
+            records.append({"session_id": item["session_id"], **session_kwargs})
+            written_items.append(item)
+
+        if not records:
+            return
+
+        try:
+            db.save_sessions(records, batch_size=len(records))
+        except Exception as e:
+            # Spool files (if any) are kept so the batch is retried on next start
+            logger.error(f"Background capture batch of {len(records)} failed: {e}")
+            self._bump("failed", len(records))
+            return
+
+        now = time.time()
+        with self._lock:
+            self._stats["written"] += len(written_items)
+            self._stats["batches"] += 1
+            for item in written_items:
+                lag = now - item["queued_at"]
+                self._stats["last_lag_seconds"] = lag
+                self._stats["max_lag_seconds"] = max(self._stats["max_lag_seconds"], lag)
+        for item in written_items:
+            self._spool_remove(item["session_id"])
+
+    # Draining
+
+    def flush(self, timeout: float = None) -> bool:
+        """Block until every queued capture has been processed.
+
+        Args:
+            timeout: Maximum seconds to wait (None waits forever)
+
+        Returns:
+            True if the queue drained, False on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def close(self, timeout: float = DEFAULT_EXIT_TIMEOUT) -> bool:
+        """Flush pending captures and stop the worker thread."""
+        drained = self.flush(timeout)
+        self._stopping.set()
+        if self._worker is not None:
+            self._worker.join(timeout=1.0)
+        return drained
+
+    def _drain_at_exit(self) -> None:
+        if self._queue.unfinished_tasks:
+            logger.info(f"Draining {self._queue.unfinished_tasks} pending capture(s) at exit")
+            if not self.close(DEFAULT_EXIT_TIMEOUT):
+                logger.warning("Capture queue not drained before exit; spooled items will be recovered")
+
+    # Spool
+
+    def _spool_path(self, session_id: str) -> Path:
+        return self.spool_dir / f"{session_id}.json"
+
+    def _spool_write(self, item: Dict) -> None:
+        path = self._spool_path(item["session_id"])
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(_to_json(item), f)
+        os.replace(tmp_path, path)
+
+    def _spool_remove(self, session_id: str) -> None:
+        if self.spool_dir is not None:
+            try:
+                self._spool_path(session_id).unlink()
+            except FileNotFoundError:
+                pass
+
+    def _recover_spool(self) -> None:
+        """Re-queue captures left in the spool by a previous process."""
+        for path in sorted(self.spool_dir.glob("*.json")):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    item = _from_json(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable spool file {path.name}: {e}")
+                continue
+            self._ensure_worker()
+            try:
+                self._queue.put(item, timeout=self.put_timeout)
+            except queue.Full:
+                break  # Remaining files stay spooled for the next start
+            self._bump("recovered")
+        if self._stats["recovered"]:
+            logger.info(f"Recovered {self._stats['recovered']} spooled capture(s)")
+
+    # Stats
+
+    def _bump(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self._stats[key] += amount
+
+    def stats(self) -> Dict:
+        """Return queue depth, throughput counters and write lag.
+
+        Returns:
+            Dict with depth, pending (queued + in flight), spooled, counters
+            and last/max lag in seconds between submit and write
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats["depth"] = self._queue.qsize()
+        stats["pending"] = self._queue.unfinished_tasks
+        stats["spooled"] = (
+            len(list(self.spool_dir.glob("*.json"))) if self.spool_dir is not None else 0
+        )
+        return stats
+
+
+# Process-wide queues, one per database path
+_queues: Dict[Optional[str], CaptureQueue] = {}
+_queues_lock = threading.Lock()
+
+
+def get_capture_queue(db_path: str = None, **kwargs) -> CaptureQueue:
+    """Return the process-wide capture queue for db_path, creating it once.
+
+    Keyword arguments are passed to CaptureQueue on first creation only.
+    """
+    with _queues_lock:
+        capture_queue = _queues.get(db_path)
+        if capture_queue is None:
+            capture_queue = CaptureQueue(db_path=db_path, **kwargs)
+            _queues[db_path] = capture_queue
+        return capture_queue
+
+
+def flush_captures(timeout: float = None) -> bool:
+    """Flush every process-wide capture queue.
+
+    Returns:
+        True if all queues drained within timeout
+    """
+    with _queues_lock:
+        queues = list(_queues.values())
+    return all(q.flush(timeout) for q in queues)
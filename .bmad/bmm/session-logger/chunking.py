@@ -0,0 +1,106 @@
+"""
+BMAD Session Logger - Chunking Module
+Split long conversations into overlapping windows for multi-vector indexing.
+
+all-MiniLM-L6-v2 truncates input at 256 word-pieces (roughly 1,000
+characters of English), so a whole 10-50 KB session embedded as one document
+only represents its opening paragraphs. Chunks keep every part searchable.
+"""
+
+import re
+from typing import Dict, List
+
+
+# Constants
+DEFAULT_CHUNK_CHARS = 1000
+DEFAULT_CHUNK_OVERLAP = 200
+
+# Segment boundaries: a speaker turn or a markdown header at line start
+_BOUNDARY_PATTERN = re.compile(r'^(?=(?:User|Assistant):|#{1,3}\s)', re.MULTILINE)
+
+
+def split_segments(conversation_text: str) -> List[str]:
+    """Split conversation on User:/Assistant: turns and markdown headers.
+
+    Args:
+        conversation_text: Full conversation text
+
+    Returns:
+        List of non-empty segments in original order
+    """
+    parts = _BOUNDARY_PATTERN.split(conversation_text)
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _split_long_segment(segment: str, max_chars: int, overlap: int) -> List[str]:
+    """Hard-split a single segment that is longer than max_chars."""
+    step = max(1, max_chars - overlap)
+    return [segment[i:i + max_chars] for i in range(0, len(segment), step)
+            if segment[i:i + max_chars].strip()]
+
+
+def chunk_conversation(
+    conversation_text: str,
+    max_chars: int = DEFAULT_CHUNK_CHARS,
+    overlap: int = DEFAULT_CHUNK_OVERLAP
+) -> List[Dict]:
+    """Pack conversation segments into overlapping windows.
+
+    Segments are appended to the current window until it would exceed
+    max_chars. The next window starts with the trailing segments of the
+    previous one (up to ``overlap`` characters) so that context spanning a
+    boundary is kept together.
+
+    Args:
+        conversation_text: Full conversation text
+        max_chars: Maximum characters per chunk
+        overlap: Characters of trailing context repeated in the next chunk
+
+    Returns:
+        List of dicts with keys:
+            - chunk_index: int
+            - text: str
+    """
+    if not conversation_text or not conversation_text.strip():
+        return []
+
+    overlap = min(overlap, max_chars // 2)
+
+    segments = []
+    for segment in split_segments(conversation_text):
+        if len(segment) > max_chars:
+            segments.extend(_split_long_segment(segment, max_chars, overlap))
+        else:
+            segments.append(segment)
+
+    windows = []
+    current: List[str] = []
+    current_len = 0
+    for segment in segments:
+        if current and current_len + len(segment) + 1 > max_chars:
+            windows.append("\n".join(current))
+
+            # Carry trailing segments forward as overlap
+            carried: List[str] = []
+            carried_len = 0
+            for prev in reversed(current):
+                if carried_len + len(prev) > overlap:
+                    break
+                carried.insert(0, prev)
+                carried_len += len(prev) + 1
+            if carried_len + len(segment) + 1 > max_chars:
+                carried, carried_len = [], 0
+            current, current_len = carried, carried_len
+
+        current.append(segment)
+        current_len += len(segment) + 1
+
+    if current:
+        windows.append("\n".join(current))
+
+    return [{"chunk_index": i, "text": text} for i, text in enumerate(windows)]
+
+
+def chunk_id(session_id: str, chunk_index: int) -> str:
+    """Build the ChromaDB id of one chunk of a session."""
+    return f"{session_id}#chunk-{chunk_index:04d}"
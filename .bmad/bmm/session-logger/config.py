@@ -0,0 +1,263 @@
+"""
+BMAD Session Logger - Configuration
+Loads config.yaml once per process and applies environment overrides.
+
+Lookup order for every key (later wins):
+    1. Built-in defaults (DEFAULTS)
+    2. config.yaml next to this module, or the file named by
+       BMAD_SESSION_LOGGER_CONFIG
+    3. Environment variables BMAD_SESSION_LOGGER_<KEY>, e.g.
+       BMAD_SESSION_LOGGER_DATABASE_PATH or BMAD_SESSION_LOGGER_HNSW_EF_SEARCH
+
+"{project-root}" in string values is replaced by BMAD_PROJECT_ROOT, or by
+the directory that contains the .bmad folder this package is installed in.
+
+Earlier versions always stored sessions in ~/.bmad/data/session-db. While
+the configured default location does not exist yet and that directory
+does, it keeps being used (see LEGACY_DATABASE_PATH).
+"""
+
+import os
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from chunking import DEFAULT_CHUNK_CHARS, DEFAULT_CHUNK_OVERLAP
+from engine import DEFAULT_EMBEDDING_MODEL
+
+
+# Configure logging
+logger = logging.getLogger("bmad.session_logger.config")
+
+
+# Constants
+CONFIG_FILENAME = "config.yaml"
+CONFIG_PATH_ENV = "BMAD_SESSION_LOGGER_CONFIG"
+PROJECT_ROOT_ENV = "BMAD_PROJECT_ROOT"
+ENV_PREFIX = "BMAD_SESSION_LOGGER_"
+PROJECT_ROOT_PLACEHOLDER = "{project-root}"
+LEGACY_DATABASE_PATH = "~/.bmad/data/session-db"  # default before config.yaml was honored
+
+DEFAULTS: Dict[str, Any] = {
+    # Database settings
+    "database_path": "{project-root}/.bmad/data/session-db",
+    "collection_name": "bmad_sessions",
+    "backend": "chroma",
+
+    # Embedding settings
+    "embedding_model": DEFAULT_EMBEDDING_MODEL,
+    "embedding_device": "cpu",
+    "embedding_batch_size": 32,
+    "num_threads": 0,
+
+    # Capture settings
+    "auto_capture_on_exit": True,
+    "preprocess_conversations": True,
+    "dedup_policy": "none",
+    "dedup_threshold": 0.9,
+
+    # Daemon settings
+    "use_daemon": False,
+    "daemon_socket_path": "{project-root}/.bmad/data/session-logger.sock",
+    "daemon_timeout_seconds": 60.0,
+
+    # Write settings
+    "write_lock": True,
+    "write_lock_wait_seconds": 10.0,
+
+    # Query settings
+    "context_on_start": False,
+    "max_context_sessions": 3,
+    "min_relevance_threshold": 0.3,
+    "default_query_results": 5,
+    "context_budget_tokens": 1200,
+    "context_mmr_lambda": 0.7,
+    "session_mmr_lambda": 1.0,
+    "context_split_sessions": False,
+
+    # Performance settings
+    "model_cache_dir": "{project-root}/.bmad/data/models",
+    "chunking": False,
+    "chunk_chars": DEFAULT_CHUNK_CHARS,
+    "chunk_overlap": DEFAULT_CHUNK_OVERLAP,
+    "embedding_cache_items": 2048,
+    "embedding_cache_disk_mb": 256,
+    "query_cache_items": 256,
+    "query_cache_ttl_seconds": 300.0,
+    "hnsw_m": 16,
+    "hnsw_ef_construction": 100,
+    "hnsw_ef_search": 100,
+    "quantization": "int8",
+    "quantized_rescore_factor": 0,
+
+    # Metrics settings
+    "metrics": False,
+    "metrics_dump_path": "",
+    "metrics_dump_interval_seconds": 60.0,
+    "slow_query_ms": 0.0,
+    "slow_query_log_path": "",
+    "trace_path": "",
+    "trace_format": "",
+
+    # Logging settings
+    "log_level": "INFO",
+}
+
+_TRUE_STRINGS = ("1", "true", "yes", "on")
+_FALSE_STRINGS = ("0", "false", "no", "off")
+
+_lock = threading.Lock()
+_cache: Dict[str, Dict[str, Any]] = {}
+
+
+def find_project_root() -> Path:
+    """Return the project root used for "{project-root}".
+
+    BMAD_PROJECT_ROOT wins; otherwise the parent of the ``.bmad`` directory
+    containing this module; otherwise the current working directory.
+    """
+    if os.environ.get(PROJECT_ROOT_ENV):
+        return Path(os.environ[PROJECT_ROOT_ENV]).expanduser()
+    for parent in Path(__file__).resolve().parents:
+        if parent.name == ".bmad":
+            return parent.parent
+    return Path.cwd()
+
+
+def default_config_path() -> Path:
+    """Return the config file path (BMAD_SESSION_LOGGER_CONFIG or config.yaml here)."""
+    if os.environ.get(CONFIG_PATH_ENV):
+        return Path(os.environ[CONFIG_PATH_ENV]).expanduser()
+    return Path(__file__).parent / CONFIG_FILENAME
+
+
+def _coerce(key: str, value: Any) -> Any:
+    """Convert value to the type of the key's default.
+
+    Raises:
+        ValueError: If the value cannot be converted
+    """
+    default = DEFAULTS.get(key)
+    if default is None or value is None or isinstance(value, type(default)):
+        return value
+    if isinstance(default, bool):
+        text = str(value).strip().lower()
+        if text in _TRUE_STRINGS:
+            return True
+        if text in _FALSE_STRINGS:
+            return False
+        raise ValueError(f"{key}: expected a boolean, got {value!r}")
+    if isinstance(default, int):
+        return int(value)
+    if isinstance(default, float):
+        return float(value)
+    return str(value)
+
+
+def _read_yaml(path: Path) -> Dict[str, Any]:
+    if not path.exists():
+        logger.debug(f"No config file at {path}, using defaults")
+        return {}
+    try:
+        import yaml
+    except ImportError:
+        logger.warning(f"pyyaml is not installed, ignoring {path}")
+        return {}
+    with open(path, encoding="utf-8") as f:
+        try:
+            data = yaml.safe_load(f) or {}
+        except yaml.YAMLError as e:
+            raise ValueError(f"{path}: {e}")
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: expected a mapping at the top level")
+    return data
+
+
+def load_config(path: Optional[str] = None) -> Dict[str, Any]:
+    """Read configuration without caching (see get_config).
+
+    Args:
+        path: Config file (default: see default_config_path)
+
+    Returns:
+        Dict of every DEFAULTS key (plus any extra keys in the file), with
+        environment overrides applied and "{project-root}" resolved
+
+    Raises:
+        ConfigurationError: If the file or an override has an invalid value
+    """
+    config_path = Path(path) if path else default_config_path()
+    try:
+        config = dict(DEFAULTS)
+        config.update(_read_yaml(config_path))
+
+        for key in list(config):
+            env_value = os.environ.get(ENV_PREFIX + key.upper())
+            if env_value is not None:
+                config[key] = env_value
+
+        config = {key: _coerce(key, value) for key, value in config.items()}
+    except (OSError, ValueError) as e:
+        from session_db import ConfigurationError
+        raise ConfigurationError(f"Invalid session logger configuration: {e}")
+
+    project_root = str(find_project_root())
+    for key, value in config.items():
+        if isinstance(value, str) and PROJECT_ROOT_PLACEHOLDER in value:
+            value = value.replace(PROJECT_ROOT_PLACEHOLDER, project_root)
+        if isinstance(value, str) and key.endswith(("_path", "_dir")):
+            value = os.path.expanduser(value)
+        config[key] = value
+
+    if ENV_PREFIX + "DATABASE_PATH" not in os.environ:
+        config["database_path"] = _legacy_database_fallback(config["database_path"], project_root)
+    return config
+
+
+def _legacy_database_fallback(database_path: str, project_root: str) -> str:
+    """Keep using ~/.bmad/data/session-db until the default location exists.
+
+    Only the default database_path falls back, and only while it has not
+    been created; an explicitly chosen path is returned unchanged.
+    """
+    default_path = DEFAULTS["database_path"].replace(PROJECT_ROOT_PLACEHOLDER, project_root)
+    legacy_path = os.path.expanduser(LEGACY_DATABASE_PATH)
+    if (
+        Path(database_path) == Path(default_path)
+        and not Path(default_path).exists()
+        and Path(legacy_path).is_dir()
+    ):
+        logger.info(
+            f"Using the existing database at {legacy_path}; set database_path "
+            f"(or move it to {default_path}) to silence this"
+        )
+        return legacy_path
+    return database_path
+
+
+def get_config(path: Optional[str] = None) -> Dict[str, Any]:
+    """Return the process-wide configuration, loading it on first use.
+
+    Also applies log_level to the "bmad.session_logger" logger.
+
+    Returns:
+        A copy of the cached config dict
+    """
+    key = str(path) if path else str(default_config_path())
+    with _lock:
+        config = _cache.get(key)
+        if config is None:
+            config = load_config(path)
+            _cache[key] = config
+            level = logging.getLevelName(str(config.get("log_level", "INFO")).upper())
+            if isinstance(level, int):
+                logging.getLogger("bmad.session_logger").setLevel(level)
+            logger.debug(f"Configuration loaded from {key}")
+        return dict(config)
+
+
+def reload_config() -> None:
+    """Drop the cached configuration so the next get_config() re-reads it."""
+    with _lock:
+        _cache.clear()
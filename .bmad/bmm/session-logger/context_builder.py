@@ -0,0 +1,165 @@
+"""
+BMAD Session Logger - Context Builder
+Packs the most query-relevant passages of retrieved sessions into a size budget.
+
+Instead of the first N characters of every hit, the retrieved sessions are
+split into passages scored against the query (SessionDB.score_passages).
+Passages are then picked by maximal marginal relevance (mmr.py) until the
+budget is spent, so near-duplicate passages do not crowd out new
+information. Selected passages are grouped under their session header in
+session rank order, and kept in conversation order within a session.
+"""
+
+import math
+import logging
+from typing import Dict, List, Optional
+
+from mmr import mmr_select, DEFAULT_MMR_LAMBDA
+
+
+# Configure logging
+logger = logging.getLogger("bmad.session_logger.context_builder")
+
+
+# Constants
+CHARS_PER_TOKEN = 4          # rough chars/token ratio for English prose and code
+DEFAULT_BUDGET_TOKENS = 1200
+CONTEXT_TITLE = "## Relevant Past Discussions\n"
+PASSAGE_SEPARATOR = "\n...\n"
+MIN_PASSAGE_CHARS = 80       # smaller leftovers are not worth a truncated passage
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of text (CHARS_PER_TOKEN characters per token)."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def format_session_header(metadata: Dict, relevance_score: float) -> str:
+    """Session heading shared by every context format."""
+    return (
+        f"\n### Session: {metadata['start_time'][:10]} - {metadata['agent_persona']} "
+        f"({metadata['agent_name']}) - {metadata['workflow']}\n"
+        f"Relevance: {relevance_score * 100:.0f}%\n\n"
+    )
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    """Cut text to at most max_chars, at a word boundary when possible."""
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max(0, max_chars - 3)]
+    if " " in cut[len(cut) // 2:]:
+        cut = cut[:cut.rindex(" ")]
+    return cut.rstrip() + "..."
+
+
+def build_context(
+    db,
+    queries: List[str],
+    hits: List[Dict],
+    budget_tokens: Optional[int] = None,
+    budget_chars: Optional[int] = None,
+    lambda_: float = DEFAULT_MMR_LAMBDA,
+    use_passages: bool = True
+) -> str:
+    """Assemble a context block from retrieved sessions within a size budget.
+
+    Args:
+        db: SessionDB the hits came from
+        queries: Query texts the hits were retrieved for
+        hits: Session results (with metadata and relevance_score), best first
+        budget_tokens: Size budget in estimated tokens
+            (default: DEFAULT_BUDGET_TOKENS)
+        budget_chars: Size budget in characters (overrides budget_tokens)
+        lambda_: MMR trade-off between relevance (1.0) and diversity (0.0)
+        use_passages: Score passages with embeddings; False splits the
+            budget over each hit's stored excerpt instead, without loading
+            the embedding model (used for keyword-only queries)
+
+    Returns:
+        Context string of at most about the budget, or "" if nothing fits
+    """
+    if not hits:
+        return ""
+    if budget_chars is None:
+        budget_chars = (DEFAULT_BUDGET_TOKENS if budget_tokens is None else budget_tokens) * CHARS_PER_TOKEN
+
+    headers = {
+        hit["session_id"]: format_session_header(hit["metadata"], hit["relevance_score"])
+        for hit in hits
+    }
+    passages = (
+        db.score_passages(queries, [hit["session_id"] for hit in hits])
+        if use_passages else []
+    )
+    if not passages:
+        return _pack_excerpts(hits, headers, budget_chars)
+
+    # Select whole passages by MMR while they fit; a session's header is
+    # paid for with its first passage
+    used = len(CONTEXT_TITLE)
+    selected: Dict[str, List[Dict]] = {}
+
+    def fits(index: int) -> bool:
+        nonlocal used
+        passage = passages[index]
+        session_id = passage["session_id"]
+        overhead = len(PASSAGE_SEPARATOR) if session_id in selected else len(headers[session_id]) + 1
+        if used + overhead + len(passage["text"]) > budget_chars:
+            return False
+        used += overhead + len(passage["text"])
+        selected.setdefault(session_id, []).append(passage)
+        return True
+
+    mmr_select(
+        [passage["relevance"] for passage in passages],
+        [passage["embedding"] for passage in passages],
+        lambda_=lambda_,
+        accept=fits
+    )
+    if not selected:
+        # Budget smaller than any passage: show the start of the best one
+        best = passages[0]
+        room = budget_chars - used - len(headers[best["session_id"]]) - 1
+        if room < MIN_PASSAGE_CHARS:
+            return ""
+        selected[best["session_id"]] = [dict(best, text=_truncate(best["text"], room))]
+
+    context_parts = [CONTEXT_TITLE]
+    for hit in hits:
+        chosen = selected.get(hit["session_id"])
+        if not chosen:
+            continue
+        chosen.sort(key=lambda passage: passage["chunk_index"])
+        context_parts.append(
+            headers[hit["session_id"]]
+            + PASSAGE_SEPARATOR.join(passage["text"] for passage in chosen)
+            + "\n"
+        )
+
+    context = "".join(context_parts)
+    logger.debug(
+        f"Context: {sum(len(chosen) for chosen in selected.values())} passages from "
+        f"{len(selected)} sessions, ~{estimate_tokens(context)} tokens"
+    )
+    return context
+
+
+def _pack_excerpts(hits: List[Dict], headers: Dict[str, str], budget_chars: int) -> str:
+    """Fallback: share the budget evenly over each hit's excerpt."""
+    used = len(CONTEXT_TITLE)
+    context_parts = [CONTEXT_TITLE]
+    for position, hit in enumerate(hits):
+        header = headers[hit["session_id"]]
+        share = (budget_chars - used) // (len(hits) - position) - len(header)
+        excerpt = (
+            hit.get("best_chunk")
+            or hit.get("excerpt")
+            or hit.get("conversation", "")
+        )
+        if share < MIN_PASSAGE_CHARS or not excerpt:
+            continue
+        part = header + _truncate(excerpt, share - 1) + "\n"
+        used += len(part)
+        context_parts.append(part)
+    return "".join(context_parts) if len(context_parts) > 1 else ""
@@ -0,0 +1,243 @@
+"""
+BMAD Session Logger - Daemon
+Long-lived local server that owns the databases, the embedding model and
+the caches, and serves agent processes over a Unix domain socket.
+
+Agents keep calling the usual helpers (on_agent_start, on_agent_exit,
+get_relevant_context, ...); while the daemon runs they are forwarded to it
+by daemon_client.py, so hooks skip the ChromaDB and model start-up and the
+machine holds one model instead of one per agent process. Without the
+daemon everything runs in-process as before.
+
+Usage:
+    python daemon.py [--socket PATH] [--no-warmup]
+
+The daemon serves until SIGINT/SIGTERM and removes its socket on exit.
+Database paths come from the clients; every other setting (collection,
+backend, model, caches) from the daemon's own config.
+"""
+
+import os
+import sys
+import time
+import signal
+import socket
+import logging
+import argparse
+import threading
+import socketserver
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+from config import get_config
+from metrics import get_metrics
+from daemon_client import (
+    disable_daemon_client, encode_message, read_message, CONNECT_TIMEOUT_SECONDS
+)
+
+
+# Configure logging
+logger = logging.getLogger("bmad.session_logger.daemon")
+
+
+# Constants
+# Module-level helpers served under their own name
+FUNCTIONS = {
+    "capture_session_on_exit": "capture",
+    "open_session_capture": "capture",
+    "capture_turns": "capture",
+    "close_session_capture": "capture",
+    "get_relevant_context": "query",
+    "search_sessions": "query",
+    "get_recent_sessions": "query",
+}
+# SessionDB methods served as "db.<method>" (db_path selects the database)
+DB_METHODS = (
+    "save_session", "save_sessions", "query_sessions", "query_sessions_batch",
+    "get_session_by_id", "list_sessions", "list_sessions_page", "sessions_touching",
+    "delete_session", "open_session", "append_turns", "close_session", "flush_write_spool",
+    "stats",
+)
+
+
+class SessionLoggerDaemon:
+    """Dispatches requests to SessionDB instances and query/capture helpers.
+
+    Args:
+        socket_path: Unix socket to listen on
+    """
+
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._databases: Dict[str, Any] = {}
+        self._counters = {"requests": 0, "errors": 0, "connections": 0}
+        self._server = None
+
+    def database(self, db_path: str = None):
+        """SessionDB for db_path (the engine registry keeps it warm)."""
+        from session_db import SessionDB
+
+        key = db_path or ""
+        with self._lock:
+            db = self._databases.get(key)
+            if db is None:
+                db = SessionDB(db_path=db_path)
+                self._databases[key] = db
+            return db
+
+    def resolve(self, method: str) -> Callable:
+        """Callable for a request method.
+
+        Raises:
+            ValueError: If the method is not served
+        """
+        if method == "ping":
+            return lambda **params: "pong"
+        if method == "stats":
+            return lambda **params: self.stats()
+        if method in FUNCTIONS:
+            import importlib
+            return getattr(importlib.import_module(FUNCTIONS[method]), method)
+        if method.startswith("db.") and method[3:] in DB_METHODS:
+            def call_db(db_path: str = None, **params):
+                return getattr(self.database(db_path), method[3:])(**params)
+            return call_db
+        raise ValueError(f"Unknown daemon method: {method}")
+
+    def handle(self, request: Dict) -> Dict:
+        """Run one request and build its response."""
+        with self._lock:
+            self._counters["requests"] += 1
+        try:
+            function = self.resolve(request.get("method", ""))
+            return {"result": function(**(request.get("params") or {}))}
+        except Exception as e:
+            with self._lock:
+                self._counters["errors"] += 1
+            logger.debug(f"Request {request.get('method')} failed: {e}", exc_info=True)
+            return {"error": {"type": type(e).__name__, "message": str(e)}}
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                **self._counters,
+                "pid": os.getpid(),
+                "uptime_seconds": round(time.time() - self.started_at, 1),
+                "databases": sorted(self._databases),
+                "metrics": get_metrics().snapshot(),
+            }
+
+    def warm_up(self) -> None:
+        """Open the default database and load the model before the first request."""
+        started = time.perf_counter()
+        db = self.database()
+        db.collection.count()
+        db.embedding_function(["warm up"])
+        logger.info(f"Warm-up done in {time.perf_counter() - started:.1f}s")
+
+    # Serving
+
+    def serve_forever(self) -> None:
+        """Listen on the socket until shutdown() is called.
+
+        Raises:
+            RuntimeError: If another daemon is already listening on the socket
+        """
+        daemon = self
+        path = Path(self.socket_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.exists():
+            if _socket_alive(self.socket_path):
+                raise RuntimeError(f"A daemon is already listening on {self.socket_path}")
+            path.unlink()
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                with daemon._lock:
+                    daemon._counters["connections"] += 1
+                while True:
+                    try:
+                        request = read_message(self.request)
+                    except (OSError, ValueError) as e:
+                        logger.debug(f"Dropping connection: {e}")
+                        return
+                    if request is None:
+                        return
+                    try:
+                        self.request.sendall(encode_message(daemon.handle(request)))
+                    except (OSError, TypeError) as e:
+                        logger.warning(f"Cannot send response to {request.get('method')}: {e}")
+                        return
+
+        class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+
+        old_umask = os.umask(0o077)
+        try:
+            self._server = Server(self.socket_path, Handler)
+        finally:
+            os.umask(old_umask)
+        logger.info(f"Session logger daemon listening on {self.socket_path} (pid {os.getpid()})")
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            self._server = None
+            if path.exists():
+                path.unlink()
+            logger.info("Session logger daemon stopped")
+
+    def shutdown(self) -> None:
+        """Stop serve_forever (from another thread or a signal handler)."""
+        if self._server is not None:
+            threading.Thread(target=self._server.shutdown, daemon=True).start()
+
+
+def _socket_alive(socket_path: str) -> bool:
+    """Whether something accepts connections on the socket."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(CONNECT_TIMEOUT_SECONDS)
+    try:
+        sock.connect(socket_path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Serve the BMAD session logger to local agent processes."
+    )
+    parser.add_argument("--socket", default=None,
+                        help="Unix socket path (default: daemon_socket_path from config.yaml)")
+    parser.add_argument("--no-warmup", action="store_true",
+                        help="Load the database and model on the first request instead of at start")
+    args = parser.parse_args(argv)
+
+    if not hasattr(socket, "AF_UNIX"):
+        print("[ERROR] Unix domain sockets are not available on this platform")
+        return 1
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    disable_daemon_client()
+    daemon = SessionLoggerDaemon(args.socket or get_config()["daemon_socket_path"])
+
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: daemon.shutdown())
+
+    if not args.no_warmup:
+        daemon.warm_up()
+    try:
+        daemon.serve_forever()
+    except RuntimeError as e:
+        print(f"[ERROR] {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+"""
+BMAD Session Logger - Daemon Client
+Thin client for the session logger daemon (daemon.py), with in-process fallback.
+
+Every agent process that saves or queries sessions in-process pays the
+ChromaDB and embedding model start-up, and keeps its own copy of the model.
+When use_daemon is on and a daemon is running, capture_session_on_exit,
+get_relevant_context and the other query/capture helpers send their arguments over the daemon's Unix
+socket instead and return its result, so a hook costs a round-trip.
+
+If the socket does not exist or cannot be connected to, daemon_call reports
+the call as not handled and the caller runs it in-process as before. A failed
+connection is remembered for RETRY_AFTER_SECONDS so an absent daemon does not
+cost a connect per call. Once a request has been sent, a missing response
+raises DaemonTimeoutError instead: the daemon may have run it, so running it
+again in-process could save a session or append turns twice.
+
+Protocol: each message is a 4-byte big-endian length followed by that many
+bytes of UTF-8 JSON. Requests are {"method": str, "params": {...}},
+responses {"result": ...} or {"error": {"type": str, "message": str}}.
+datetime values travel as {"$datetime": "<ISO 8601>"}.
+"""
+
+import json
+import time
+import socket
+import struct
+import logging
+import threading
+from pathlib import Path
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from config import get_config
+
+
+# Configure logging
+logger = logging.getLogger("bmad.session_logger.daemon_client")
+
+
+# Constants
+HEADER = struct.Struct(">I")
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+CONNECT_TIMEOUT_SECONDS = 0.5
+RETRY_AFTER_SECONDS = 5.0
+DATETIME_KEY = "$datetime"
+
+
+class DaemonUnavailableError(ConnectionError):
+    """The daemon cannot be reached; the request was not delivered."""
+    pass
+
+
+class DaemonTimeoutError(TimeoutError):
+    """A request was sent but no response came back (timed out or the
+    connection was lost); the daemon may or may not have run it."""
+    pass
+
+
+# Protocol
+
+def _default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {DATETIME_KEY: value.isoformat()}
+    if hasattr(value, "tolist"):
+        # numpy arrays and scalars
+        return value.tolist()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Cannot send {type(value).__name__} to the daemon")
+
+
+def _object_hook(obj: Dict) -> Any:
+    if len(obj) == 1 and DATETIME_KEY in obj:
+        return datetime.fromisoformat(obj[DATETIME_KEY])
+    return obj
+
+
+def encode_message(message: Dict) -> bytes:
+    """Frame a message: length header plus JSON payload."""
+    payload = json.dumps(message, default=_default, separators=(",", ":")).encode("utf-8")
+    return HEADER.pack(len(payload)) + payload
+
+
+def _recv_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def read_message(sock: socket.socket) -> Optional[Dict]:
+    """Read one framed message, or None if the peer closed the connection.
+
+    Raises:
+        ValueError: If the frame is larger than MAX_FRAME_BYTES
+    """
+    header = _recv_exact(sock, HEADER.size)
+    if header is None:
+        return None
+    (size,) = HEADER.unpack(header)
+    if size > MAX_FRAME_BYTES:
+        raise ValueError(f"Frame of {size} bytes exceeds {MAX_FRAME_BYTES}")
+    payload = _recv_exact(sock, size)
+    if payload is None:
+        return None
+    return json.loads(payload.decode("utf-8"), object_hook=_object_hook)
+
+
+def remote_exception(error: Dict) -> Exception:
+    """Rebuild an exception raised by the daemon."""
+    import session_db
+
+    error_type = error.get("type", "")
+    message = error.get("message", "")
+    cls = getattr(session_db, error_type, None)
+    if isinstance(cls, type) and issubclass(cls, session_db.SessionDBError):
+        return cls(message)
+    if error_type in ("ValueError", "KeyError", "TypeError"):
+        return {"ValueError": ValueError, "KeyError": KeyError, "TypeError": TypeError}[error_type](message)
+    return session_db.SessionDBError(f"{error_type}: {message}")
+
+
+# Client
+
+class DaemonClient:
+    """Connection to a running daemon, reused across calls.
+
+    Args:
+        socket_path: Daemon's Unix socket
+        timeout: Seconds to wait for a response
+    """
+
+    def __init__(self, socket_path: str, timeout: float):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._sock: Optional[socket.socket] = None
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(CONNECT_TIMEOUT_SECONDS)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        sock.settimeout(self.timeout)
+        return sock
+
+    def call(self, method: str, **params) -> Any:
+        """Run a method on the daemon and return its result.
+
+        Raises:
+            DaemonUnavailableError: If the request could not be delivered
+            DaemonTimeoutError: If the request was sent but no response came
+                back; it may or may not have run
+            SessionDBError (or subclass), ValueError, ...: Raised by the
+                method on the daemon side
+        """
+        request = encode_message({"method": method, "params": params})
+        with self._lock:
+            for attempt in range(2):
+                fresh = self._sock is None
+                try:
+                    if fresh:
+                        self._sock = self._connect()
+                    self._sock.sendall(request)
+                    break
+                except OSError as e:
+                    self.close()
+                    # A reused connection may have been closed by a restarted
+                    # daemon: retry once on a fresh one. A frame cut short by a
+                    # failed send is never run, so resending is safe.
+                    if fresh or attempt:
+                        raise DaemonUnavailableError(f"Session logger daemon unavailable: {e}")
+
+            # The request is out: from here on it must not be sent again
+            try:
+                response = read_message(self._sock)
+            except (OSError, ValueError) as e:
+                self.close()
+                raise DaemonTimeoutError(f"No response from session logger daemon: {e}")
+            if response is None:
+                self.close()
+                raise DaemonTimeoutError("Session logger daemon closed the connection before responding")
+
+        if "error" in response:
+            raise remote_exception(response["error"])
+        return response.get("result")
+
+    def close(self) -> None:
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = None
+
+
+_client: Optional[DaemonClient] = None
+_client_lock = threading.Lock()
+_unavailable_until = 0.0
+_disabled = False
+
+
+def disable_daemon_client() -> None:
+    """Always run in-process (used by the daemon itself)."""
+    global _disabled
+    _disabled = True
+
+
+def get_daemon_client() -> Optional[DaemonClient]:
+    """Client for the configured daemon, or None if none is usable.
+
+    None when use_daemon is off, AF_UNIX is unavailable, the socket file
+    does not exist, or a connection failed in the last RETRY_AFTER_SECONDS.
+    """
+    global _client
+    if _disabled or not hasattr(socket, "AF_UNIX") or time.monotonic() < _unavailable_until:
+        return None
+    config = get_config()
+    if not config["use_daemon"]:
+        return None
+    socket_path = config["daemon_socket_path"]
+    if not Path(socket_path).exists():
+        return None
+
+    with _client_lock:
+        if _client is None or _client.socket_path != socket_path:
+            if _client is not None:
+                _client.close()
+            _client = DaemonClient(socket_path, timeout=config["daemon_timeout_seconds"])
+        return _client
+
+
+def daemon_call(method: str, **params) -> Tuple[bool, Any]:
+    """Run a helper on the daemon if one is running.
+
+    Args:
+        method: Daemon method (see daemon.FUNCTIONS and daemon.DB_METHODS)
+        **params: Keyword arguments of the method
+
+    Returns:
+        (True, result) if the daemon ran the call, (False, None) if the
+        caller should run it in-process
+
+    Raises:
+        DaemonTimeoutError: If the request was sent but not answered; the
+            caller must not run it in-process as well
+        Exceptions raised by the method on the daemon side
+    """
+    global _unavailable_until
+    client = get_daemon_client()
+    if client is None:
+        return False, None
+    if "db_path" in params and params["db_path"] is None:
+        # Resolve the default here: the daemon's own config may differ
+        params["db_path"] = get_config()["database_path"]
+    try:
+        return True, client.call(method, **params)
+    except DaemonUnavailableError as e:
+        logger.debug(f"{e}; running {method} in-process")
+        _unavailable_until = time.monotonic() + RETRY_AFTER_SECONDS
+        return False, None
@@ -0,0 +1,301 @@
+"""
+BMAD Session Logger - Deduplication
+Exact and near-duplicate detection for stored sessions.
+
+Re-captured conversations, resumed sessions saved twice and backfills of
+overlapping logs store (almost) the same transcript several times. Every
+copy costs a vector, a document and chunk vectors, and crowds distinct
+sessions out of search results.
+
+Exact duplicates are found by a SHA-256 hash of the whitespace-normalized
+text. Near duplicates are found with MinHash over word shingles: the share
+of equal signature values estimates the Jaccard similarity of two sessions'
+shingle sets. Signatures are bucketed by LSH bands, so a lookup only
+compares the few sessions sharing a bucket instead of the whole collection.
+MinHash was preferred over SimHash because its similarity estimate is
+directly a Jaccard threshold, which is easier to configure than a Hamming
+distance.
+
+Command line (offline pass over an existing database):
+    python dedup.py [--db-path PATH] [--policy merge] [--threshold 0.9] [--apply]
+"""
+
+import sys
+import zlib
+import json
+import sqlite3
+import hashlib
+import logging
+import argparse
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+from backends import BACKENDS
+
+
+# Configure logging
+logger = logging.getLogger("bmad.session_logger.dedup")
+
+
+# Constants
+DEDUP_POLICIES = ("none", "skip", "merge", "revision")
+DEFAULT_POLICY = "none"
+DEFAULT_THRESHOLD = 0.9      # estimated Jaccard similarity of shingle sets
+SHINGLE_WORDS = 5
+NUM_PERM = 64                # signature length (estimate error ~ 1/sqrt(NUM_PERM))
+LSH_BANDS = 16               # NUM_PERM = LSH_BANDS * rows per band
+MINHASH_PRIME = 4294967311   # smallest prime above 2**32
+MINHASH_SEED = 1
+SHINGLE_MIX = (31, 0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D, 0x27D4EB2F, 0x165667B1)  # combiner, then one per word position
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text before hashing so whitespace-only edits still hit."""
+    return " ".join(text.split())
+
+
+def content_hash(text: str) -> str:
+    """SHA-256 hex digest of the normalized text."""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+_permutations = None
+
+
+def _get_permutations():
+    """(a, b) coefficients of the NUM_PERM hash permutations, fixed by MINHASH_SEED."""
+    global _permutations
+    if _permutations is None:
+        import numpy as np
+
+        rng = np.random.RandomState(MINHASH_SEED)
+        a = rng.randint(1, 2 ** 32, size=NUM_PERM, dtype=np.uint64)
+        b = rng.randint(0, 2 ** 32, size=NUM_PERM, dtype=np.uint64)
+        _permutations = (a, b)
+    return _permutations
+
+
+def shingle_hashes(text: str, size: int = SHINGLE_WORDS):
+    """32-bit hashes of the overlapping word n-grams of the lowercased text.
+
+    Words are hashed once (CRC-32) and each n-gram hash is combined from its
+    words' hashes with array operations, instead of building and hashing
+    every n-gram string.
+    """
+    import numpy as np
+
+    words = text.lower().split() or [""]
+    word_hashes = np.fromiter(
+        map(zlib.crc32, map(str.encode, words)), dtype=np.uint32, count=len(words)
+    )
+    size = min(size, len(words))
+    count = len(words) - size + 1
+    hashes = np.zeros(count, dtype=np.uint32)
+    for offset in range(size):
+        hashes = (hashes * np.uint32(SHINGLE_MIX[0])) ^ (
+            word_hashes[offset:offset + count] * np.uint32(SHINGLE_MIX[offset + 1])
+        )
+    return hashes
+
+
+def minhash(text: str) -> bytes:
+    """MinHash signature of the text's shingles (NUM_PERM uint32 values).
+
+    Each permutation is h(x) = (a * x + b) mod MINHASH_PRIME over 32-bit
+    shingle hashes; a * x + b stays below 2**64, so it is computed in uint64
+    for all shingles and permutations at once.
+    """
+    import numpy as np
+
+    hashes = shingle_hashes(text).astype(np.uint64)
+    a, b = _get_permutations()
+    values = (np.outer(hashes, a) + b) % np.uint64(MINHASH_PRIME)
+    return values.min(axis=0).astype("<u4").tobytes()
+
+
+def signature_similarity(first: bytes, second: bytes) -> float:
+    """Estimated Jaccard similarity: share of equal signature values."""
+    import numpy as np
+
+    return float(np.mean(np.frombuffer(first, "<u4") == np.frombuffer(second, "<u4")))
+
+
+def lsh_buckets(signature: bytes) -> List[Tuple[int, bytes]]:
+    """(band, bucket) keys of a signature; similar signatures share a bucket."""
+    width = len(signature) // LSH_BANDS
+    return [
+        (band, hashlib.blake2b(signature[band * width:(band + 1) * width], digest_size=8).digest())
+        for band in range(LSH_BANDS)
+    ]
+
+
+def merge_session_metadata(existing: Dict, duplicate: Dict) -> Dict:
+    """Fold a duplicate's metadata into the kept session's.
+
+    Topics and artifacts are unioned, the time span widened, and the
+    number of merged copies counted in "duplicates_merged".
+    """
+    def union(first: str, second: str) -> str:
+        items = [s.strip() for s in f"{first or ''},{second or ''}".split(",") if s.strip()]
+        return ",".join(dict.fromkeys(items))
+
+    merged = dict(existing)
+    merged["topics"] = union(existing.get("topics"), duplicate.get("topics"))
+    merged["artifacts_created"] = union(
+        existing.get("artifacts_created"), duplicate.get("artifacts_created")
+    )
+    if duplicate.get("start_time"):
+        merged["start_time"] = min(existing.get("start_time") or duplicate["start_time"],
+                                   duplicate["start_time"])
+    if duplicate.get("end_time"):
+        merged["end_time"] = max(existing.get("end_time") or "", duplicate["end_time"])
+    merged["duplicates_merged"] = (
+        existing.get("duplicates_merged", 0) + duplicate.get("duplicates_merged", 0) + 1
+    )
+    return merged
+
+
+class DedupIndex:
+    """Content hashes and MinHash LSH buckets of one collection's sessions.
+
+    Args:
+        path: SQLite file for the index (":memory:" for a scratch index)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                signature BLOB NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_sessions_hash ON sessions(content_hash);
+
+            CREATE TABLE IF NOT EXISTS buckets (
+                band INTEGER NOT NULL,
+                bucket BLOB NOT NULL,
+                session_id TEXT NOT NULL,
+                PRIMARY KEY (band, bucket, session_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_buckets_session ON buckets(session_id);
+            """
+        )
+        self._conn.commit()
+        self.synced = False
+
+    # Maintenance
+
+    def add_many(self, entries: Iterable[Tuple[str, str, bytes]]) -> None:
+        """Insert or replace (session_id, content_hash, signature) entries."""
+        entries = list(entries)
+        if not entries:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM buckets WHERE session_id = ?", [(sid,) for sid, _, _ in entries]
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO sessions (session_id, content_hash, signature) VALUES (?, ?, ?)",
+                entries
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO buckets (band, bucket, session_id) VALUES (?, ?, ?)",
+                [(band, bucket, session_id)
+                 for session_id, _, signature in entries
+                 for band, bucket in lsh_buckets(signature)]
+            )
+            self._conn.commit()
+
+    def add(self, session_id: str, digest: str, signature: bytes) -> None:
+        self.add_many([(session_id, digest, signature)])
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM buckets WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions")
+            self._conn.execute("DELETE FROM buckets")
+            self._conn.commit()
+
+    # Lookups
+
+    def find_exact(self, digest: str) -> List[str]:
+        """IDs of sessions with exactly this content hash."""
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                "SELECT session_id FROM sessions WHERE content_hash = ? ORDER BY session_id",
+                (digest,)
+            )]
+
+    def find_near(self, signature: bytes, threshold: float = DEFAULT_THRESHOLD) -> List[Tuple[str, float]]:
+        """Sessions whose estimated similarity to signature is at least threshold.
+
+        Returns:
+            (session_id, similarity) pairs, most similar first
+        """
+        buckets = lsh_buckets(signature)
+        clause = " OR ".join("(band = ? AND bucket = ?)" for _ in buckets)
+        params = [value for key in buckets for value in key]
+        with self._lock:
+            rows = self._conn.execute(
+                f"""SELECT s.session_id, s.signature FROM sessions s
+                    WHERE s.session_id IN (SELECT session_id FROM buckets WHERE {clause})""",
+                params
+            ).fetchall()
+        matches = [
+            (session_id, signature_similarity(signature, other))
+            for session_id, other in rows
+        ]
+        matches = [(sid, sim) for sid, sim in matches if sim >= threshold]
+        matches.sort(key=lambda match: (-match[1], match[0]))
+        return matches
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Find (and optionally remove) duplicate sessions in the BMAD session database."
+    )
+    parser.add_argument("--db-path", default=None, help="Database path (default: database_path from config.yaml)")
+    parser.add_argument("--collection", default=None, help="Collection name (default: collection_name from config.yaml)")
+    parser.add_argument("--backend", choices=BACKENDS, default=None, help="Storage backend (default: backend from config.yaml)")
+    parser.add_argument("--policy", choices=("skip", "merge", "revision"), default="merge",
+                        help="skip: delete copies; merge: fold their metadata into the kept "
+                             "session, then delete; revision: only link near duplicates "
+                             "(exact copies are deleted)")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help="Near-duplicate similarity (default: dedup_threshold from config.yaml)")
+    parser.add_argument("--apply", action="store_true", help="Modify the database (default: report only)")
+    args = parser.parse_args(argv)
+
+    from session_db import SessionDB
+
+    db = SessionDB(db_path=args.db_path, collection_name=args.collection, backend=args.backend)
+    report = db.deduplicate(policy=args.policy, threshold=args.threshold, dry_run=not args.apply)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
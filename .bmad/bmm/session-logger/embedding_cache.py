@@ -0,0 +1,268 @@
+"""
+BMAD Session Logger - Embedding Cache
+Content-addressed cache of embeddings keyed by (model name, text hash).
+
+Two tiers: an in-memory LRU for the current process and a SQLite file on
+disk that survives restarts. Re-saving a conversation, re-running a backfill
+or repeating a default start-hook query costs a lookup instead of a
+transformer forward pass.
+
+The disk tier's total size is kept in a one-row table by triggers, so the
+eviction check is a single-row read even when several processes share the
+file. last_used is only rewritten once it is LAST_USED_RESOLUTION old, so
+repeated hits are plain reads.
+"""
+
+import time
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from dedup import content_hash
+
+
+# Configure logging
+logger = logging.getLogger("bmad.session_logger.embedding_cache")
+
+
+# Constants
+DEFAULT_MEMORY_ITEMS = 2048
+DEFAULT_DISK_MAX_MB = 256
+EVICTION_FRACTION = 0.1   # share of disk entries dropped per round while over budget
+LAST_USED_RESOLUTION = 600.0  # seconds; LRU order is only this precise
+CACHE_FILENAME = "embedding_cache.sqlite3"
+
+
+class EmbeddingCache:
+    """Two-tier (memory LRU + SQLite) embedding cache for one model.
+
+    Args:
+        model_name: Embedding model the vectors belong to
+        path: SQLite file for the disk tier (None keeps memory only)
+        memory_items: Maximum vectors held in the in-memory LRU
+        disk_max_mb: Disk tier size budget; least recently used entries are
+            evicted when it is exceeded
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        path: Optional[str] = None,
+        memory_items: int = DEFAULT_MEMORY_ITEMS,
+        disk_max_mb: int = DEFAULT_DISK_MAX_MB
+    ):
+        self.model_name = model_name
+        self.path = path
+        self.memory_items = memory_items
+        self.disk_max_bytes = disk_max_mb * 1024 * 1024
+
+        self._lock = threading.RLock()
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+        }
+
+        self._conn = None
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS embeddings (
+                       model TEXT NOT NULL,
+                       hash TEXT NOT NULL,
+                       vector BLOB NOT NULL,
+                       last_used REAL NOT NULL,
+                       PRIMARY KEY (model, hash)
+                   )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)"
+            )
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS cache_size (
+                       id INTEGER PRIMARY KEY CHECK (id = 0),
+                       bytes INTEGER NOT NULL
+                   )"""
+            )
+            self._conn.execute(
+                """CREATE TRIGGER IF NOT EXISTS embeddings_size_insert AFTER INSERT ON embeddings
+                   BEGIN UPDATE cache_size SET bytes = bytes + LENGTH(NEW.vector); END"""
+            )
+            self._conn.execute(
+                """CREATE TRIGGER IF NOT EXISTS embeddings_size_delete AFTER DELETE ON embeddings
+                   BEGIN UPDATE cache_size SET bytes = bytes - LENGTH(OLD.vector); END"""
+            )
+            # Files written before the size table existed are measured once
+            self._conn.execute(
+                "INSERT OR IGNORE INTO cache_size (id, bytes) "
+                "SELECT 0, COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+            )
+            self._conn.commit()
+
+    # Memory tier
+
+    def _memory_get(self, key: str) -> Optional[np.ndarray]:
+        vector = self._memory.get(key)
+        if vector is not None:
+            self._memory.move_to_end(key)
+        return vector
+
+    def _memory_put(self, key: str, vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    # Disk tier
+
+    def _disk_get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        if self._conn is None or not keys:
+            return {}
+        found = {}
+        stale = []
+        now = time.time()
+        # SQLite limits bound parameters; query in slices
+        for start in range(0, len(keys), 500):
+            part = keys[start:start + 500]
+            placeholders = ",".join("?" * len(part))
+            rows = self._conn.execute(
+                f"SELECT hash, vector, last_used FROM embeddings WHERE model = ? AND hash IN ({placeholders})",
+                [self.model_name, *part]
+            ).fetchall()
+            for key, blob, last_used in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+                if now - last_used >= LAST_USED_RESOLUTION:
+                    stale.append(key)
+        if stale:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE model = ? AND hash = ?",
+                [(now, self.model_name, key) for key in stale]
+            )
+            self._conn.commit()
+        return found
+
+    def _disk_put_many(self, items: Dict[str, np.ndarray]) -> None:
+        if self._conn is None or not items:
+            return
+        now = time.time()
+        # Keys are content hashes: a stored vector never changes, and keeping
+        # the row lets the size triggers count every byte exactly once
+        self._conn.executemany(
+            "INSERT INTO embeddings (model, hash, vector, last_used) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (model, hash) DO UPDATE SET last_used = excluded.last_used",
+            [(self.model_name, key, vector.astype(np.float32).tobytes(), now)
+             for key, vector in items.items()]
+        )
+        self._conn.commit()
+        self._evict_if_needed()
+
+    def _disk_bytes(self) -> int:
+        return self._conn.execute("SELECT bytes FROM cache_size").fetchone()[0]
+
+    def _evict_if_needed(self) -> None:
+        # A large batch can overshoot by more than one round's share
+        while self._disk_bytes() > self.disk_max_bytes:
+            total = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if not total:
+                break
+            to_drop = max(1, int(total * EVICTION_FRACTION))
+            self._conn.execute(
+                """DELETE FROM embeddings WHERE rowid IN (
+                       SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?
+                   )""",
+                (to_drop,)
+            )
+            self._conn.commit()
+            self._counters["evictions"] += to_drop
+            logger.debug(f"Embedding cache evicted {to_drop} entries")
+
+    # Public API
+
+    def embed(self, texts: List[str], compute: Callable[[List[str]], List]) -> List[np.ndarray]:
+        """Return embeddings for texts, computing only the cache misses.
+
+        Misses are computed with a single call to ``compute`` (deduplicated),
+        then stored in both tiers.
+
+        Args:
+            texts: Texts to embed
+            compute: Embedding function taking a list of texts
+
+        Returns:
+            List of float32 vectors in the same order as texts
+        """
+        keys = [content_hash(text) for text in texts]
+        results: Dict[str, np.ndarray] = {}
+
+        with self._lock:
+            for key in keys:
+                if key not in results:
+                    vector = self._memory_get(key)
+                    if vector is not None:
+                        results[key] = vector
+                        self._counters["memory_hits"] += 1
+
+            disk_keys = [key for key in dict.fromkeys(keys) if key not in results]
+            for key, vector in self._disk_get_many(disk_keys).items():
+                results[key] = vector
+                self._memory_put(key, vector)
+                self._counters["disk_hits"] += 1
+
+        missing = {}
+        for text, key in zip(texts, keys):
+            if key not in results and key not in missing:
+                missing[key] = text
+
+        if missing:
+            computed = compute(list(missing.values()))
+            new_items = {
+                key: np.asarray(vector, dtype=np.float32)
+                for key, vector in zip(missing.keys(), computed)
+            }
+            with self._lock:
+                self._counters["misses"] += len(new_items)
+                for key, vector in new_items.items():
+                    self._memory_put(key, vector)
+                self._disk_put_many(new_items)
+            results.update(new_items)
+
+        return [results[key] for key in keys]
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters, hit ratio and tier sizes."""
+        with self._lock:
+            stats = dict(self._counters)
+            lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+            stats["hit_ratio"] = (
+                (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+            )
+            stats["memory_items"] = len(self._memory)
+            if self._conn is not None:
+                stats["disk_items"] = self._conn.execute(
+                    "SELECT COUNT(*) FROM embeddings WHERE model = ?", (self.model_name,)
+                ).fetchone()[0]
+                stats["disk_bytes"] = self._disk_bytes()
+            return stats
+
+    def clear(self) -> None:
+        """Drop every cached vector for this model from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM embeddings WHERE model = ?", (self.model_name,))
+                self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
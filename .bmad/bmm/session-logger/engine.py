@@ -0,0 +1,566 @@
+"""
+BMAD Session Logger - Engine Registry
+Process-wide cache of ChromaDB clients, collections and embedding models.
+
+Creating a ``chromadb.PersistentClient`` and loading the sentence-transformers
+model costs seconds and hundreds of MB. The registry keeps one warm instance
+of each per process so that every ``SessionDB`` after the first one is cheap.
+
+Everything is deferred until it is actually used: ``chromadb`` is imported
+when the first collection is opened, and the embedding model is loaded on
+the first embedding call. Listing sessions from the side indexes touches
+neither.
+
+Collections are accessed through a StorageBackend (see backends.py): the
+"chroma" backend wraps a ChromaDB collection, the "numpy" and "quantized"
+backends need neither chromadb nor its client.
+"""
+
+import weakref
+import logging
+import threading
+import importlib.util
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+from backends import BACKENDS, DEFAULT_BACKEND, ChromaBackend, StorageBackend
+
+
+# Configure logging
+logger = logging.getLogger("bmad.session_logger.engine")
+
+
+# Constants
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+CHROMADB_INSTALL_HINT = (
+    "chromadb is not installed. "
+    "Run: pip install chromadb==1.0.15 sentence-transformers pyyaml"
+)
+
+
+def chromadb_available() -> bool:
+    """Check that chromadb is installed without importing it."""
+    return importlib.util.find_spec("chromadb") is not None
+
+
+def import_chromadb():
+    """Import chromadb on first use (the import alone takes about a second).
+
+    Raises:
+        ImportError: If chromadb is not installed
+    """
+    try:
+        import chromadb
+    except ImportError as e:
+        raise ImportError(CHROMADB_INSTALL_HINT) from e
+    return chromadb
+
+
+def embedding_key(model_name: str, device: Optional[str] = None,
+                  cache_folder: Optional[str] = None) -> Tuple[str, str, Optional[str]]:
+    """Cache key of a loaded model: name, torch device and download folder."""
+    return (model_name, device or "cpu", str(cache_folder) if cache_folder else None)
+
+
+def options_embedding_key(model_name: str, options: Optional[Dict] = None) -> Tuple:
+    """embedding_key for the embedding_device / model_cache_dir config keys."""
+    options = options or {}
+    return embedding_key(model_name, options.get("embedding_device"), options.get("model_cache_dir"))
+
+
+class LazySentenceTransformer:
+    """Sentence-transformers embedding function that loads the model on first call.
+
+    Args:
+        model_name: Sentence-transformers model name
+        device: Torch device ("cpu", "cuda", ...)
+        normalize_embeddings: L2-normalize the model output
+        batch_size: Texts per forward pass
+        num_threads: Torch CPU threads set before loading (0 = default)
+        **kwargs: Extra SentenceTransformer arguments (e.g. cache_folder)
+    """
+
+    # Loaded models by cache_key, shared by every instance in the process
+    models: Dict[Tuple[str, str, Optional[str]], object] = {}
+
+    def __init__(self, model_name: str = DEFAULT_EMBEDDING_MODEL, device: str = "cpu",
+                 normalize_embeddings: bool = False, batch_size: int = 32,
+                 num_threads: int = 0, **kwargs):
+        self.model_name = model_name
+        self.device = device
+        self.normalize_embeddings = normalize_embeddings
+        self.kwargs = kwargs
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self._load_lock = threading.Lock()
+
+    def __call__(self, input):
+        import numpy as np
+
+        embeddings = self._model.encode(
+            list(input),
+            convert_to_numpy=True,
+            normalize_embeddings=self.normalize_embeddings,
+            batch_size=self.batch_size
+        )
+        return [np.array(embedding, dtype=np.float32) for embedding in embeddings]
+
+    @property
+    def cache_key(self) -> Tuple[str, str, Optional[str]]:
+        """(model_name, device, cache_folder): what the loaded model depends on."""
+        return embedding_key(self.model_name, self.device, self.kwargs.get("cache_folder"))
+
+    @property
+    def loaded(self) -> bool:
+        return self.cache_key in self.models
+
+    @property
+    def _model(self):
+        key = self.cache_key
+        model = self.models.get(key)
+        if model is None:
+            with self._load_lock:
+                model = self.models.get(key)
+                if model is None:
+                    if self.num_threads > 0:
+                        import torch
+                        torch.set_num_threads(self.num_threads)
+                    from sentence_transformers import SentenceTransformer
+                    model = SentenceTransformer(
+                        model_name_or_path=self.model_name, device=self.device, **self.kwargs
+                    )
+                    self.models[key] = model
+                    logger.debug(f"Loaded embedding model: {self.model_name} ({self.device})")
+        return model
+
+
+def lazy_embedding_function(model_name: str, options: Optional[Dict] = None):
+    """Build a sentence-transformers embedding function that loads on first call.
+
+    Every backend gets the same plain function: ChromaDB collections are
+    opened without an embedding function (SessionDB always passes
+    precomputed embeddings), and the configuration chromadb persisted for
+    older collections is rebuilt lazily (see register_lazy_chroma_function),
+    so chromadb never loads a model of its own.
+
+    Args:
+        model_name: Sentence-transformers model name
+        options: Optional config keys embedding_device, model_cache_dir,
+            embedding_batch_size and num_threads (see config.py)
+    """
+    options = options or {}
+    kwargs = {}
+    if options.get("model_cache_dir"):
+        kwargs["cache_folder"] = str(options["model_cache_dir"])
+    return LazySentenceTransformer(
+        model_name=model_name,
+        device=options.get("embedding_device") or "cpu",
+        batch_size=options.get("embedding_batch_size") or 32,
+        num_threads=options.get("num_threads") or 0,
+        **kwargs
+    )
+
+
+_chroma_function_registered = False
+
+
+def register_lazy_chroma_function() -> None:
+    """Make chromadb rebuild persisted sentence-transformer configs lazily.
+
+    Collections created by earlier versions carry a "sentence_transformer"
+    embedding function configuration. chromadb rebuilds it when it loads
+    the configuration (e.g. after collection.modify()), and its own class
+    loads a second copy of the model right away. The class registered here
+    under the same name is a LazySentenceTransformer sharing
+    LazySentenceTransformer.models instead.
+    """
+    global _chroma_function_registered
+    if _chroma_function_registered:
+        return
+    from chromadb.utils.embedding_functions import register_embedding_function
+    from chromadb.utils.embedding_functions.sentence_transformer_embedding_function import (
+        SentenceTransformerEmbeddingFunction
+    )
+
+    class ChromaLazySentenceTransformer(LazySentenceTransformer, SentenceTransformerEmbeddingFunction):
+        @staticmethod
+        def build_from_config(config: Dict) -> "ChromaLazySentenceTransformer":
+            return ChromaLazySentenceTransformer(
+                model_name=config.get("model_name", DEFAULT_EMBEDDING_MODEL),
+                device=config.get("device") or "cpu",
+                normalize_embeddings=bool(config.get("normalize_embeddings")),
+                **config.get("kwargs", {})
+            )
+
+    register_embedding_function(ChromaLazySentenceTransformer)
+    _chroma_function_registered = True
+
+
+class Engine:
+    """Warm resources shared by every SessionDB bound to one collection.
+
+    The client, embedding function and storage backends are resolved on
+    first access, so creating an engine (and a SessionDB) is cheap.
+
+    Attributes:
+        db_path: Database directory
+        collection_name: Collection name
+        model_name: Sentence-transformers model name
+        backend: Storage backend name ("chroma", "numpy" or "quantized")
+        client: chromadb.PersistentClient for db_path (chroma backend)
+        embedding_function: Embedding function for model_name (loads on first call)
+        collection: StorageBackend for collection_name
+        options: Tuning keys from config.py (embedding, cache and HNSW settings)
+        lock: Re-entrant lock for callers that need to serialize writes
+        generation: Write counter, bumped after every save or delete so
+            cached query results can tell they are stale
+
+    Users (SessionDB instances) are tracked weakly; EngineRegistry.release
+    closes the engine when the last one lets go of it.
+    """
+
+    def __init__(self, registry: "EngineRegistry", db_path: str,
+                 collection_name: str, model_name: str, options: Optional[Dict] = None):
+        self.db_path = db_path
+        self.collection_name = collection_name
+        self.model_name = model_name
+        self.options = dict(options or {})
+        self.backend = self.options.get("backend") or DEFAULT_BACKEND
+        self.lock = threading.RLock()
+        self._registry = registry
+        self._backends: Dict[str, StorageBackend] = {}
+        self._resources: Dict[str, object] = {}
+        self._users = weakref.WeakSet()
+        self.generation = 0
+
+    @property
+    def client(self):
+        return self._registry.get_client(self.db_path)
+
+    @property
+    def embedding_function(self):
+        return self._registry.get_embedding_function(self.model_name, self.options)
+
+    @property
+    def embedding_key(self) -> Tuple[str, str, Optional[str]]:
+        return options_embedding_key(self.model_name, self.options)
+
+    @property
+    def connected(self) -> bool:
+        """Whether the main collection has been opened."""
+        return self.collection_name in self._backends
+
+    @property
+    def collection(self) -> StorageBackend:
+        return self.get_backend(self.collection_name)
+
+    def get_companion_collection(self, suffix: str) -> StorageBackend:
+        """Return a sibling collection (e.g. chunk vectors) sharing this model.
+
+        The collection is named ``{collection_name}_{suffix}`` and created once.
+        """
+        return self.get_backend(f"{self.collection_name}_{suffix}")
+
+    def get_backend(self, name: str) -> StorageBackend:
+        """Return the storage backend of collection name, opened once."""
+        backend = self._backends.get(name)
+        if backend is None:
+            if self.backend == "chroma":
+                # Resolve the shared client before taking the engine lock; the
+                # registry lock is always taken first (see EngineRegistry.close)
+                client = self.client
+            with self.lock:
+                backend = self._backends.get(name)
+                if backend is None:
+                    if self.backend == "numpy":
+                        from numpy_backend import NumpyBackend
+                        backend = NumpyBackend(str(Path(self.db_path) / f"{name}.numpy"))
+                    elif self.backend == "quantized":
+                        from quantized_backend import QuantizedBackend
+                        backend = QuantizedBackend(
+                            str(Path(self.db_path) / f"{name}.quantized"),
+                            quantization=self.options.get("quantization") or "int8",
+                            rescore_factor=self.options.get("quantized_rescore_factor") or 0
+                        )
+                    else:
+                        backend = ChromaBackend(self._open_collection(client, name))
+                    self._backends[name] = backend
+                    logger.debug(f"Opened {self.backend} collection: {self.db_path} / {name}")
+        return backend
+
+    def hnsw_configuration(self) -> Dict[str, int]:
+        """HNSW settings from options, in ChromaDB configuration terms."""
+        mapping = {
+            "hnsw_m": "max_neighbors",
+            "hnsw_ef_construction": "ef_construction",
+            "hnsw_ef_search": "ef_search",
+        }
+        return {
+            chroma_key: int(self.options[key])
+            for key, chroma_key in mapping.items()
+            if self.options.get(key)
+        }
+
+    def _open_collection(self, client, name: str):
+        """Open or create a ChromaDB collection with the configured HNSW parameters.
+
+        M and ef_construction only take effect when the collection is
+        created; ef_search is updated on existing collections too.
+
+        No embedding function is attached: every write and query passes
+        embeddings computed by the shared LazySentenceTransformer, and an
+        attached function would make chromadb build (and load) its own copy
+        of the model while serializing the collection configuration.
+        """
+        hnsw = self.hnsw_configuration()
+        collection = client.get_or_create_collection(
+            name=name,
+            embedding_function=None,
+            configuration={"hnsw": hnsw} if hnsw else None
+        )
+        if "ef_search" in hnsw:
+            current = (collection.configuration_json or {}).get("hnsw") or {}
+            if current.get("ef_search") != hnsw["ef_search"]:
+                collection.modify(configuration={"hnsw": {"ef_search": hnsw["ef_search"]}})
+                logger.info(f"Collection {name}: ef_search set to {hnsw['ef_search']}")
+        return collection
+
+    def get_resource(self, name: str, factory: Callable[[], object]):
+        """Return a named per-engine resource (cache, side index), created once.
+
+        Resources with a ``close()`` method are closed when the engine is
+        evicted from the registry.
+        """
+        with self.lock:
+            resource = self._resources.get(name)
+            if resource is None:
+                resource = factory()
+                self._resources[name] = resource
+            return resource
+
+    def get_embedding_cache(self):
+        """Return the embedding cache stored next to this database, opened once."""
+        from embedding_cache import (
+            EmbeddingCache, CACHE_FILENAME, DEFAULT_MEMORY_ITEMS, DEFAULT_DISK_MAX_MB
+        )
+
+        return self.get_resource("embedding_cache", lambda: EmbeddingCache(
+            model_name=self.model_name,
+            path=str(Path(self.db_path) / CACHE_FILENAME),
+            memory_items=self.options.get("embedding_cache_items") or DEFAULT_MEMORY_ITEMS,
+            disk_max_mb=self.options.get("embedding_cache_disk_mb") or DEFAULT_DISK_MAX_MB
+        ))
+
+    def get_query_cache(self):
+        """Return the in-memory query result cache of this collection, created once."""
+        from query_cache import QueryCache, DEFAULT_MAX_ITEMS, DEFAULT_TTL_SECONDS
+
+        return self.get_resource("query_cache", lambda: QueryCache(
+            max_items=self.options.get("query_cache_items", DEFAULT_MAX_ITEMS),
+            ttl_seconds=self.options.get("query_cache_ttl_seconds", DEFAULT_TTL_SECONDS)
+        ))
+
+    def bump_generation(self) -> int:
+        """Mark the collection as changed; returns the new generation."""
+        with self.lock:
+            self.generation += 1
+            return self.generation
+
+    def close(self) -> None:
+        """Release resources owned by this engine (caches, side indexes, backends)."""
+        with self.lock:
+            for resource in [*self._resources.values(), *self._backends.values()]:
+                close = getattr(resource, "close", None)
+                if close is not None:
+                    close()
+            self._resources.clear()
+            self._backends.clear()
+
+    @property
+    def users(self) -> int:
+        """Number of live users bound to this engine."""
+        return len(self._users)
+
+    @property
+    def key(self) -> Tuple[str, str, str, str]:
+        return (self.db_path, self.collection_name, self.model_name, self.backend)
+
+
+class EngineRegistry:
+    """Thread-safe registry of clients, models and engines.
+
+    Clients are shared per db_path and models per model_name, so two
+    collections in the same database reuse one client and one model.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._clients: Dict[str, object] = {}
+        self._models: Dict[Tuple[str, str, Optional[str]], LazySentenceTransformer] = {}
+        self._engines: Dict[Tuple[str, str, str, str], Engine] = {}
+
+    def get_client(self, db_path: str):
+        """Return the shared PersistentClient for db_path, creating it once."""
+        with self._lock:
+            client = self._clients.get(db_path)
+            if client is None:
+                chromadb = import_chromadb()
+                register_lazy_chroma_function()
+                client = chromadb.PersistentClient(path=db_path)
+                self._clients[db_path] = client
+                logger.debug(f"Created ChromaDB client: {db_path}")
+            return client
+
+    def get_embedding_function(self, model_name: str, options: Optional[Dict] = None):
+        """Return the shared embedding function for model_name.
+
+        One function (and model) per model name, embedding_device and
+        model_cache_dir; the model itself is loaded on the first embedding
+        call. The other options (batch size, threads) apply when the
+        function is first created.
+        """
+        key = options_embedding_key(model_name, options)
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                model = lazy_embedding_function(model_name, options)
+                self._models[key] = model
+            return model
+
+    def get_engine(
+        self,
+        db_path: str,
+        collection_name: str,
+        model_name: str = DEFAULT_EMBEDDING_MODEL,
+        options: Optional[Dict] = None,
+        user: object = None
+    ) -> Engine:
+        """Return the engine for (db_path, collection_name, model_name, backend).
+
+        The backend comes from options["backend"] (default "chroma").
+        Nothing is connected or loaded yet; see Engine. Other options only
+        apply when the engine is first created.
+
+        A user (e.g. a SessionDB) is registered with the engine, weakly,
+        and keeps it open until it calls release().
+
+        Raises:
+            ValueError: If the backend is unknown
+            ImportError: If the chroma backend is selected and chromadb is
+                not installed
+        """
+        backend = (options or {}).get("backend") or DEFAULT_BACKEND
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown storage backend {backend!r}, expected one of {BACKENDS}")
+        if backend == "chroma" and not chromadb_available():
+            raise ImportError(CHROMADB_INSTALL_HINT)
+
+        key = (db_path, collection_name, model_name, backend)
+        with self._lock:
+            engine = self._engines.get(key)
+            if engine is None:
+                engine = Engine(self, db_path, collection_name, model_name, options)
+                self._engines[key] = engine
+                logger.info(f"Engine created: {db_path} / {collection_name} ({model_name}, {backend})")
+            if user is not None:
+                engine._users.add(user)
+            return engine
+
+    def release(self, engine: Engine, user: object) -> bool:
+        """Unregister a user; close and evict the engine if it was the last one.
+
+        Users that were garbage collected without releasing no longer
+        count, so a transient SessionDB does not keep the engine open.
+
+        Returns:
+            True if the engine was closed
+        """
+        with self._lock:
+            engine._users.discard(user)
+            if engine.users or self._engines.get(engine.key) is not engine:
+                return False
+            self._engines.pop(engine.key).close()
+            self._release_unused()
+            logger.info(f"Engine closed by its last user: {engine.db_path} / {engine.collection_name}")
+            return True
+
+    def close(
+        self,
+        db_path: Optional[str] = None,
+        collection_name: Optional[str] = None,
+        model_name: Optional[str] = None
+    ) -> int:
+        """Evict engines matching the given key parts (None matches anything).
+
+        Evicted engines are closed even if SessionDB instances still use
+        them (those must not be used afterwards); SessionDB.close() only
+        closes an engine once its last user releases it. Clients and models
+        that are no longer used by any remaining engine are released as
+        well.
+
+        Returns:
+            Number of engines evicted
+        """
+        with self._lock:
+            evicted = [
+                key for key in self._engines
+                if (db_path is None or key[0] == db_path)
+                and (collection_name is None or key[1] == collection_name)
+                and (model_name is None or key[2] == model_name)
+            ]
+            for key in evicted:
+                self._engines.pop(key).close()
+            self._release_unused()
+
+            if evicted:
+                logger.info(f"Evicted {len(evicted)} engine(s)")
+            return len(evicted)
+
+    def _release_unused(self) -> None:
+        """Drop clients and models no remaining engine uses (caller holds the lock).
+
+        Models are also removed from LazySentenceTransformer.models, which
+        holds the loaded weights, so their memory can actually be freed.
+        """
+        used_paths = {key[0] for key in self._engines if key[3] == "chroma"}
+        used_models = {engine.embedding_key for engine in self._engines.values()}
+        for path in [p for p in self._clients if p not in used_paths]:
+            del self._clients[path]
+        for key in [m for m in self._models if m not in used_models]:
+            del self._models[key]
+            if LazySentenceTransformer.models.pop(key, None) is not None:
+                logger.debug(f"Released embedding model: {key[0]} ({key[1]})")
+
+    def stats(self) -> Dict[str, int]:
+        """Return counts of cached clients, models (and loaded models) and engines."""
+        with self._lock:
+            return {
+                "clients": len(self._clients),
+                "models": len(self._models),
+                "models_loaded": sum(1 for m in self._models.values() if m.loaded),
+                "engines": len(self._engines),
+            }
+
+
+# Process-wide registry
+_registry = EngineRegistry()
+
+
+def get_registry() -> EngineRegistry:
+    """Return the process-wide engine registry."""
+    return _registry
+
+
+def get_engine(
+    db_path: str,
+    collection_name: str,
+    model_name: str = DEFAULT_EMBEDDING_MODEL,
+    options: Optional[Dict] = None
+) -> Engine:
+    """Shortcut for ``get_registry().get_engine(...)``."""
+    return _registry.get_engine(db_path, collection_name, model_name, options)
+
+
+def close_engines(db_path: str = None, collection_name: str = None) -> int:
+    """Release cached engines (all of them when called without arguments)."""
+    return _registry.close(db_path=db_path, collection_name=collection_name)
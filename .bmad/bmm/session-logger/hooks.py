@@ -4,11 +4,16 @@ Integration points for BMAD agent start and exit events.
 """
 
 import logging
-from typing import Optional
+from typing import List, Optional, Union
 from datetime import datetime
 
-from capture import capture_session_on_exit
+from config import get_config
+from capture import (
+    capture_session_on_exit, capture_turns, close_session_capture, open_session_capture
+)
+from capture_queue import get_capture_queue
 from query import get_relevant_context
+from tracing import span
 
 
 # Configure logging
@@ -23,12 +28,23 @@ def on_agent_exit(
     conversation: str,
     artifacts: list = None,
     topics: list = None,
-    start_time: datetime = None
+    start_time: datetime = None,
+    background: bool = False,
+    session_id: str = None
 ) -> Optional[str]:
     """Standard exit hook for all agents.
 
     Called from agent exit step. Orchestrates session capture.
 
+    With background=True the capture is handed to the process-wide capture
+    queue and the hook returns at once; embedding and the database write
+    happen on a worker thread (see capture_queue.flush_captures()).
+
+    For a session streamed with open_agent_session/on_agent_turns, pass its
+    session_id: the hook only marks it completed, since its turns are
+    already indexed. If that session is not open (or has no turns), the
+    conversation is captured whole under the same ID.
+
     Args:
         agent_name: Agent identifier (e.g., "architect")
         persona: Agent persona name (e.g., "Winston")
@@ -38,12 +54,19 @@ def on_agent_exit(
         artifacts: List of files created (optional)
         topics: List of topics discussed (optional)
         start_time: When agent started (optional)
+        background: Queue the capture instead of saving synchronously
+        session_id: Session opened with open_agent_session (optional)
 
     Returns:
-        session_id if saved successfully, None if failed
+        session_id if saved successfully (provisional in background mode),
+        None if failed or auto_capture_on_exit is disabled in config
     """
     logger.info(f"Agent exit hook triggered: {agent_name} ({persona})")
 
+    if not get_config()["auto_capture_on_exit"]:
+        logger.info("Session capture disabled (auto_capture_on_exit: false)")
+        return None
+
     agent_context = {
         "agent_name": agent_name,
         "agent_persona": persona,
@@ -55,22 +78,90 @@ def on_agent_exit(
         "end_time": datetime.utcnow()
     }
 
-    session_id = capture_session_on_exit(agent_context, conversation)
+    with span("on_agent_exit", agent_name=agent_name, workflow=workflow,
+              background=background, streamed=session_id is not None) as current:
+        if current:
+            current.set(doc_bytes=len((conversation or "").encode("utf-8")))
+        if session_id is not None:
+            closed = close_session_capture(session_id, agent_context)
+            if closed:
+                logger.info(f"Streamed session completed: {closed}")
+                return closed
+
+        if background:
+            session_id = get_capture_queue().submit(agent_context, conversation, session_id=session_id)
+            logger.info(f"Session queued for background capture: {session_id}")
+            return session_id
+
+        session_id = capture_session_on_exit(agent_context, conversation, session_id=session_id)
+
+        if session_id:
+            logger.info(f"Session captured successfully: {session_id}")
+            return session_id
+        else:
+            logger.warning("Session capture failed (see previous errors)")
+            return None
 
-    if session_id:
-        logger.info(f"Session captured successfully: {session_id}")
-        return session_id
-    else:
-        logger.warning("Session capture failed (see previous errors)")
+
+def open_agent_session(
+    agent_name: str,
+    persona: str,
+    workflow: str,
+    project_name: str,
+    start_time: datetime = None
+) -> Optional[str]:
+    """Start hook for incremental capture.
+
+    Opens a session that on_agent_turns appends to as the conversation
+    goes, so a crash loses at most the last turns and the exit hook
+    (on_agent_exit with session_id) has nothing left to embed.
+
+    Args:
+        agent_name: Agent identifier (e.g., "architect")
+        persona: Agent persona name (e.g., "Winston")
+        workflow: Workflow identifier or "none"
+        project_name: Project name
+        start_time: When agent started (optional, default: now)
+
+    Returns:
+        session_id of the open session, or None if failed or
+        auto_capture_on_exit is disabled in config
+    """
+    if not get_config()["auto_capture_on_exit"]:
+        logger.info("Session capture disabled (auto_capture_on_exit: false)")
         return None
 
+    return open_session_capture({
+        "agent_name": agent_name,
+        "agent_persona": persona,
+        "project_name": project_name,
+        "workflow": workflow,
+        "start_time": start_time,
+    })
+
+
+def on_agent_turns(session_id: str, turns: List[Union[str, dict]]) -> bool:
+    """Append turns to a session opened with open_agent_session.
+
+    Args:
+        session_id: Open session
+        turns: Strings (e.g. "User: ...") or dicts with role and content
+
+    Returns:
+        True if the turns were stored
+    """
+    if not session_id:
+        return False
+    return capture_turns(session_id, turns)
+
 
 def on_agent_start(
     agent_name: str,
     workflow: str = None,
     project_name: str = None,
-    context_query: str = None,
-    max_sessions: int = 3
+    context_query: Union[str, List[str]] = None,
+    max_sessions: int = None,
+    enabled: bool = None
 ) -> str:
     """Optional start hook for context loading.
 
@@ -80,14 +171,22 @@ def on_agent_start(
         agent_name: Current agent name
         workflow: Current workflow (optional)
         project_name: Current project (optional)
-        context_query: Custom query for context (optional, default: workflow-based)
-        max_sessions: Maximum past sessions to load
+        context_query: Custom query for context, or a list of queries (one per
+            facet) searched together (optional, default: workflow-based)
+        max_sessions: Maximum past sessions to load (config: max_context_sessions)
+        enabled: Load context regardless of config (None: config context_on_start)
 
     Returns:
         Formatted context string or empty string if disabled/no results
     """
     logger.info(f"Agent start hook triggered: {agent_name}")
 
+    if enabled is None:
+        enabled = get_config()["context_on_start"]
+    if not enabled:
+        logger.debug("Context loading disabled (context_on_start: false)")
+        return ""
+
     # Default query if not provided
     if not context_query:
         if workflow:
@@ -96,12 +195,14 @@ def on_agent_start(
             context_query = f"past sessions with {agent_name}"
 
     # Get relevant context
-    context = get_relevant_context(
-        query=context_query,
-        current_agent=agent_name,
-        current_workflow=workflow,
-        max_sessions=max_sessions
-    )
+    with span("on_agent_start", agent_name=agent_name, workflow=workflow) as current:
+        context = get_relevant_context(
+            query=context_query,
+            current_agent=agent_name,
+            current_workflow=workflow,
+            max_sessions=max_sessions
+        )
+        current.set(context_chars=len(context))
 
     if context:
         logger.info(f"Loaded context from {context.count('### Session:')} past sessions")
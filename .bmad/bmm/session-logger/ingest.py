@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+BMAD Session Logger - Bulk Ingest
+Backfill many conversations into the vector database in large batches.
+
+Sources:
+    - A JSONL file, one session per line. Each object needs a conversation
+      ("conversation" or "conversation_text") and may carry agent_name,
+      agent_persona/persona, project_name, workflow, topics, artifacts,
+      start_time, end_time (ISO 8601) and session_id.
+    - A directory of .txt/.md transcripts (one session per file, metadata
+      from the command line, end_time from file mtime) and/or .json files
+      with the same fields as a JSONL line.
+
+Progress is recorded in a checkpoint file after every batch, so an
+interrupted run continues where it stopped when started again.
+
+Usage:
+    python ingest.py transcripts.jsonl --agent architect --project myproject
+    python ingest.py ./transcripts/ --batch-size 128 --checkpoint ingest.ckpt
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+from pathlib import Path
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, Iterator, Optional, Tuple
+
+# Setup paths
+sys.path.insert(0, str(Path(__file__).parent))
+
+from backends import BACKENDS
+from session_db import SessionDB, DEFAULT_BATCH_SIZE
+from capture import prepare_session
+
+
+# Configure logging
+logger = logging.getLogger("bmad.session_logger.ingest")
+
+
+# Constants
+TRANSCRIPT_SUFFIXES = (".txt", ".md")
+
+
+def _parse_time(value) -> Optional[datetime]:
+    """Parse an ISO 8601 timestamp into a naive UTC datetime."""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _stable_session_id(agent_name: str, source_key: str, end_time: Optional[datetime]) -> str:
+    """Derive a deterministic session ID so resumed batches stay idempotent."""
+    date_str = (end_time or datetime.utcnow()).strftime("%Y-%m-%d")
+    digest = hashlib.sha1(source_key.encode("utf-8")).hexdigest()[:6]
+    return f"{date_str}-{agent_name}-{digest}"
+
+
+def iter_source(source: Path) -> Iterator[Tuple[str, Dict]]:
+    """Stream (source_key, raw_record) pairs from a JSONL file or directory.
+
+    Order is deterministic (file order / sorted paths) so a checkpointed
+    position identifies the same record across runs.
+    """
+    if source.is_dir():
+        for path in sorted(p for p in source.rglob("*") if p.is_file()):
+            if path.suffix == ".json":
+                with open(path, encoding="utf-8") as f:
+                    yield str(path), json.load(f)
+            elif path.suffix in TRANSCRIPT_SUFFIXES:
+                mtime = datetime.utcfromtimestamp(path.stat().st_mtime)
+                yield str(path), {
+                    "conversation": path.read_text(encoding="utf-8", errors="replace"),
+                    "end_time": mtime.isoformat(),
+                }
+    else:
+        with open(source, encoding="utf-8") as f:
+            for line_no, line in enumerate(f, start=1):
+                if line.strip():
+                    yield f"{source}:{line_no}", json.loads(line)
+
+
+def to_session_record(source_key: str, raw: Dict, defaults: Dict) -> Optional[Dict]:
+    """Turn a raw source record into save_sessions keyword arguments.
+
+    Applies the same validation, preprocessing and topic extraction as the
+    exit hook. Returns None for records that should be skipped.
+    """
+    agent_context = {
+        "agent_name": raw.get("agent_name", defaults["agent_name"]),
+        "agent_persona": raw.get("agent_persona", raw.get("persona", defaults["agent_persona"])),
+        "project_name": raw.get("project_name", defaults["project_name"]),
+        "workflow": raw.get("workflow", defaults["workflow"]),
+        "topics": raw.get("topics"),
+        "artifacts": raw.get("artifacts", []),
+        "start_time": _parse_time(raw.get("start_time")),
+        "end_time": _parse_time(raw.get("end_time")),
+    }
+    conversation = raw.get("conversation", raw.get("conversation_text", ""))
+
+    record = prepare_session(agent_context, conversation)
+    if record is None:
+        return None
+
+    record["session_id"] = raw.get("session_id") or _stable_session_id(
+        record["agent_name"], source_key, record["end_time"]
+    )
+    return record
+
+
+class Checkpoint:
+    """Number of source records already ingested, persisted atomically."""
+
+    def __init__(self, path: Path, source: Path):
+        self.path = path
+        self.source = str(source.resolve())
+        self.position = 0
+        if path.exists():
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("source") == self.source:
+                self.position = state.get("position", 0)
+            else:
+                logger.warning(f"Checkpoint {path} belongs to {state.get('source')}, starting over")
+
+    def save(self, position: int) -> None:
+        self.position = position
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"source": self.source, "position": position,
+                       "updated": datetime.utcnow().isoformat() + "Z"}, f)
+        os.replace(tmp_path, self.path)
+
+
+def ingest(
+    source: Path,
+    db: SessionDB,
+    defaults: Dict,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    checkpoint: Checkpoint = None,
+    report=print
+) -> Dict:
+    """Stream a source into the database and report throughput.
+
+    Returns:
+        Dict with sessions, skipped, tokens, seconds, sessions_per_sec and
+        tokens_per_sec for this run (resumed records are not counted)
+    """
+    start_position = checkpoint.position if checkpoint else 0
+    totals = {"sessions": 0, "skipped": 0, "tokens": 0}
+    # (source position, token count) of each yielded record, in order
+    pending = deque()
+    started = time.perf_counter()
+
+    def records():
+        for index, (source_key, raw) in enumerate(iter_source(source)):
+            if index < start_position:
+                continue
+            record = to_session_record(source_key, raw, defaults)
+            if record is None:
+                totals["skipped"] += 1
+                continue
+            # Whitespace tokens: a cheap, model-independent throughput measure
+            pending.append((index + 1, len(record["conversation_text"].split())))
+            yield record
+
+    def on_batch(ids, batch):
+        position = start_position
+        for _ in ids:
+            position, tokens = pending.popleft()
+            totals["tokens"] += tokens
+        totals["sessions"] += len(ids)
+        if checkpoint:
+            checkpoint.save(position)
+        elapsed = time.perf_counter() - started
+        report(f"  {totals['sessions']} sessions  "
+               f"{totals['sessions'] / elapsed:.1f} sessions/s  "
+               f"{totals['tokens'] / elapsed:.0f} tokens/s")
+
+    db.save_sessions(records(), batch_size=batch_size, on_batch=on_batch)
+
+    elapsed = time.perf_counter() - started
+    return {
+        **totals,
+        "seconds": round(elapsed, 3),
+        "sessions_per_sec": round(totals["sessions"] / elapsed, 2) if elapsed else 0.0,
+        "tokens_per_sec": round(totals["tokens"] / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Bulk-ingest conversations into the BMAD session database."
+    )
+    parser.add_argument("source", help="JSONL file or directory of transcripts")
+    parser.add_argument("--db-path", default=None, help="Database path (default: database_path from config.yaml)")
+    parser.add_argument("--collection", default=None, help="Collection name (default: collection_name from config.yaml)")
+    parser.add_argument("--backend", choices=BACKENDS, default=None, help="Storage backend (default: backend from config.yaml)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Sessions per batch")
+    parser.add_argument("--checkpoint", default=None,
+                        help="Checkpoint file (default: <source>.ingest-checkpoint.json)")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+    parser.add_argument("--chunking", action="store_true", help="Also index chunk vectors (default: chunking from config.yaml)")
+    parser.add_argument("--agent", default="unknown", help="Default agent_name")
+    parser.add_argument("--persona", default=None, help="Default agent_persona")
+    parser.add_argument("--project", default="default", help="Default project_name")
+    parser.add_argument("--workflow", default="none", help="Default workflow")
+    args = parser.parse_args(argv)
+
+    source = Path(args.source)
+    if not source.exists():
+        print(f"[ERROR] Source not found: {source}")
+        return 1
+
+    checkpoint_path = Path(args.checkpoint) if args.checkpoint else Path(
+        str(source).rstrip("/\\") + ".ingest-checkpoint.json"
+    )
+    if args.restart and checkpoint_path.exists():
+        checkpoint_path.unlink()
+    checkpoint = Checkpoint(checkpoint_path, source)
+    if checkpoint.position:
+        print(f"Resuming after {checkpoint.position} records ({checkpoint_path})")
+
+    defaults = {
+        "agent_name": args.agent,
+        "agent_persona": args.persona or args.agent.title(),
+        "project_name": args.project,
+        "workflow": args.workflow,
+    }
+
+    db = SessionDB(
+        db_path=args.db_path,
+        collection_name=args.collection,
+        backend=args.backend,
+        chunking=args.chunking or None
+    )
+    print(f"Ingesting {source} (batch size {args.batch_size})...")
+    summary = ingest(source, db, defaults, batch_size=args.batch_size, checkpoint=checkpoint)
+
+    print()
+    print(f"[SUCCESS] Ingested {summary['sessions']} sessions "
+          f"({summary['skipped']} skipped) in {summary['seconds']}s")
+    print(f"  {summary['sessions_per_sec']} sessions/s, {summary['tokens_per_sec']} tokens/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
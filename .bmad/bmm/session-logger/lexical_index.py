@@ -0,0 +1,209 @@
+"""
+BMAD Session Logger - Lexical Index
+Local SQLite FTS5 (BM25) keyword index kept alongside the ChromaDB data.
+
+Dense vectors rank exact identifiers poorly: file paths, error strings such
+as "Cannot coerce result to single JSON object", or story numbers. The
+lexical index answers those lookups without touching the embedding model and
+is fused with vector results through reciprocal-rank fusion.
+"""
+
+import re
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# Configure logging
+logger = logging.getLogger("bmad.session_logger.lexical_index")
+
+
+# Constants
+RRF_K = 60   # standard reciprocal-rank fusion constant
+FILTER_COLUMNS = ("agent_name", "workflow", "project_name")
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def build_match_query(query_text: str) -> Optional[str]:
+    """Turn free text into a safe FTS5 MATCH expression.
+
+    Every word is quoted (so FTS5 operators in user input are inert) and the
+    words are OR-ed; BM25 then ranks documents matching more and rarer
+    words first.
+
+    Returns:
+        MATCH expression, or None if the query has no searchable words
+    """
+    tokens = list(dict.fromkeys(t.lower() for t in _TOKEN_PATTERN.findall(query_text)))
+    if not tokens:
+        return None
+    return " OR ".join(f'"{token}"' for token in tokens)
+
+
+def reciprocal_rank_fusion(ranked_lists: Iterable[List[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """Fuse several best-first lists of IDs with reciprocal-rank fusion.
+
+    score(id) = sum over lists of 1 / (k + rank), with rank starting at 1.
+
+    Returns:
+        List of (id, fused_score) sorted best-first
+    """
+    scores: Dict[str, float] = {}
+    for ranked in ranked_lists:
+        for rank, item_id in enumerate(ranked, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class LexicalIndex:
+    """BM25 full-text index of session conversations.
+
+    Args:
+        path: SQLite file for the index
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE VIRTUAL TABLE IF NOT EXISTS sessions_fts USING fts5(
+                   session_id UNINDEXED,
+                   agent_name UNINDEXED,
+                   workflow UNINDEXED,
+                   project_name UNINDEXED,
+                   content,
+                   tokenize = 'unicode61 remove_diacritics 2'
+               )"""
+        )
+        # session_id -> FTS rowid, so replace/delete never scan the FTS table
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS fts_ids (
+                   fts_rowid INTEGER PRIMARY KEY,
+                   session_id TEXT NOT NULL UNIQUE
+               )"""
+        )
+        self._conn.execute(
+            """INSERT OR IGNORE INTO fts_ids (fts_rowid, session_id)
+               SELECT rowid, session_id FROM sessions_fts
+               WHERE rowid NOT IN (SELECT fts_rowid FROM fts_ids)"""
+        )
+        self._conn.commit()
+        self.synced = False
+
+    def _rowid(self, session_id: str, create: bool = False) -> Optional[int]:
+        """Look up (or allocate) the FTS rowid of a session."""
+        if create:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO fts_ids (session_id) VALUES (?)", (session_id,)
+            )
+        row = self._conn.execute(
+            "SELECT fts_rowid FROM fts_ids WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def add_many(self, entries: Iterable[Tuple[str, str, Dict]]) -> None:
+        """Index (session_id, text, metadata) entries, replacing existing ones."""
+        entries = list(entries)
+        if not entries:
+            return
+        with self._lock:
+            rows = []
+            for session_id, text, metadata in entries:
+                rowid = self._rowid(session_id, create=True)
+                self._conn.execute("DELETE FROM sessions_fts WHERE rowid = ?", (rowid,))
+                rows.append((rowid, session_id, metadata.get("agent_name", ""),
+                             metadata.get("workflow", ""), metadata.get("project_name", ""), text))
+            self._conn.executemany(
+                "INSERT INTO sessions_fts (rowid, session_id, agent_name, workflow, project_name, content) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+
+    def add(self, session_id: str, text: str, metadata: Dict) -> None:
+        """Index one session."""
+        self.add_many([(session_id, text, metadata)])
+
+    def delete(self, session_id: str) -> None:
+        """Remove a session from the index."""
+        with self._lock:
+            rowid = self._rowid(session_id)
+            if rowid is not None:
+                self._conn.execute("DELETE FROM sessions_fts WHERE rowid = ?", (rowid,))
+                self._conn.execute("DELETE FROM fts_ids WHERE fts_rowid = ?", (rowid,))
+            self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions_fts").fetchone()[0]
+
+    def search(
+        self,
+        query_text: str,
+        limit: int = 10,
+        session_ids: Iterable[str] = None,
+        **filters
+    ) -> List[Tuple[str, float]]:
+        """BM25 keyword search.
+
+        Args:
+            query_text: Free-text query
+            limit: Maximum hits
+            session_ids: Restrict hits to these sessions (optional)
+            **filters: Equality filters on agent_name, workflow, project_name
+
+        Returns:
+            List of (session_id, score) best-first; score is the negated BM25
+            rank, so higher is better
+
+        Raises:
+            sqlite3.Error: If the index cannot be searched (not reported as
+                "no hits")
+        """
+        match = build_match_query(query_text)
+        if match is None:
+            return []
+
+        sql = "SELECT session_id, -bm25(sessions_fts) AS score FROM sessions_fts WHERE sessions_fts MATCH ?"
+        params: List = [match]
+        for column in FILTER_COLUMNS:
+            if filters.get(column):
+                sql += f" AND {column} = ?"
+                params.append(filters[column])
+        if session_ids is not None:
+            # Candidates go through a temp table: an IN (?, ...) list fails
+            # past SQLite's bound-variable limit
+            sql += " AND session_id IN (SELECT session_id FROM temp.search_candidates)"
+        sql += " ORDER BY bm25(sessions_fts) LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            if session_ids is not None:
+                self._conn.execute(
+                    "CREATE TEMP TABLE IF NOT EXISTS search_candidates (session_id TEXT PRIMARY KEY)"
+                )
+                self._conn.execute("DELETE FROM temp.search_candidates")
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO temp.search_candidates (session_id) VALUES (?)",
+                    ((session_id,) for session_id in session_ids)
+                )
+                self._conn.commit()
+            return [(row[0], row[1]) for row in self._conn.execute(sql, params)]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions_fts")
+            self._conn.execute("DELETE FROM fts_ids")
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
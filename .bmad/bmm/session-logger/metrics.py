@@ -0,0 +1,277 @@
+"""
+BMAD Session Logger - Metrics
+Per-stage timing histograms and counters for the save, query and capture
+paths, with Prometheus-text/JSON dumps and a slow-query log.
+
+Stages (seconds, one histogram each):
+    capture      capture_session_on_exit end to end (in-process part)
+    preprocess   conversation cleanup before saving
+    topics       topic extraction
+    save         save_session / one save_sessions batch end to end
+    dedup        duplicate fingerprinting and lookup
+    embed        embedding (cache lookups plus model forward pass)
+    store_write  vector store add/upsert
+    index        lexical, session and dedup index updates
+    query        query_sessions_batch end to end (cache misses)
+    prefilter    topic/artifact candidate lookup in the session index
+    store_query  vector store query
+    lexical      keyword (BM25) search
+    format       result formatting and projection
+    context      get_relevant_context end to end (cache misses)
+
+With tracing on (see tracing.py) every stage timer is also a span.
+
+Counters: saves, duplicates, queries, query_cache_hits, captures,
+slow_queries and errors.<save|query|capture|context>. Metrics are per
+process (the daemon's are the interesting ones when it runs) and off by
+default; disabled, a timer is a shared no-op context manager and a counter
+update a single attribute check.
+
+The slow-query log is independent of the metrics switch: queries slower
+than slow_query_ms are logged as warnings, and appended as JSON lines to
+slow_query_log_path when it is set.
+"""
+
+import os
+import json
+import time
+import bisect
+import atexit
+import logging
+import threading
+from pathlib import Path
+from datetime import datetime
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Optional
+
+from config import get_config
+from tracing import get_tracer
+
+
+# Configure logging
+logger = logging.getLogger("bmad.session_logger.metrics")
+slow_query_logger = logging.getLogger("bmad.session_logger.slow_query")
+
+
+# Constants
+BUCKETS_SECONDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROMETHEUS_PREFIX = "bmad_session_logger"
+SLOW_QUERY_TEXT_CHARS = 200  # query text kept per slow-query log entry
+_NULL_TIMER = nullcontext()
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram (Prometheus layout)."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_SECONDS) + 1)  # last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS_SECONDS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (max for +Inf)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS_SECONDS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self) -> Dict:
+        return {
+            "count": self.count,
+            "sum_ms": round(self.sum * 1000, 3),
+            "mean_ms": round(self.sum * 1000 / self.count, 3) if self.count else 0.0,
+            "p50_ms": round(self.quantile(0.5) * 1000, 3),
+            "p95_ms": round(self.quantile(0.95) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class Metrics:
+    """Process-wide counters and stage histograms.
+
+    Args:
+        enabled: Record anything at all
+        dump_path: File rewritten with the metrics at most every
+            dump_interval_seconds and at exit ("" or None: no file).
+            ".json" files get JSON, anything else Prometheus text.
+        dump_interval_seconds: Minimum time between two dumps
+        slow_query_ms: Log queries slower than this (0 disables)
+        slow_query_log_path: JSON-lines file for slow queries (optional)
+    """
+
+    def __init__(self, enabled: bool = False, dump_path: Optional[str] = None,
+                 dump_interval_seconds: float = 60.0, slow_query_ms: float = 0.0,
+                 slow_query_log_path: Optional[str] = None):
+        self.enabled = enabled
+        self.dump_path = dump_path or None
+        self.dump_interval_seconds = dump_interval_seconds
+        self.slow_query_ms = slow_query_ms
+        self.slow_query_log_path = slow_query_log_path or None
+        self.started_at = time.time()
+
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._stages: Dict[str, Histogram] = {}
+        self._next_dump = time.monotonic() + dump_interval_seconds
+        self._tracer = get_tracer()
+
+    # Recording
+
+    def count(self, name: str, value: int = 1) -> None:
+        """Add value to a counter."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """Record one duration of a stage."""
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = Histogram()
+            histogram.observe(seconds)
+            due = self.dump_path is not None and time.monotonic() >= self._next_dump
+            if due:
+                self._next_dump = time.monotonic() + self.dump_interval_seconds
+        if due:
+            self.dump()
+
+    def timer(self, stage: str):
+        """Context manager timing a stage and tracing it as a span.
+
+        A shared no-op when neither metrics nor tracing are on.
+        """
+        if not self.enabled and not self._tracer.enabled:
+            return _NULL_TIMER
+        return self._timed(stage)
+
+    @contextmanager
+    def _timed(self, stage: str):
+        with self._tracer.span(stage):
+            started = time.perf_counter()
+            try:
+                yield
+            finally:
+                self.observe(stage, time.perf_counter() - started)
+
+    def slow_query(self, seconds: float, queries, **details) -> None:
+        """Log a query if it took longer than slow_query_ms."""
+        if not self.slow_query_ms or seconds * 1000 < self.slow_query_ms:
+            return
+        self.count("slow_queries")
+        entry = {
+            "time": datetime.utcnow().isoformat() + "Z",
+            "ms": round(seconds * 1000, 1),
+            "queries": [text[:SLOW_QUERY_TEXT_CHARS] for text in queries],
+            **details,
+        }
+        slow_query_logger.warning(f"Slow query ({entry['ms']}ms): {json.dumps(entry, default=str)}")
+        if self.slow_query_log_path is not None:
+            try:
+                Path(self.slow_query_log_path).parent.mkdir(parents=True, exist_ok=True)
+                with open(self.slow_query_log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, default=str) + "\n")
+            except OSError as e:
+                logger.warning(f"Cannot write slow-query log {self.slow_query_log_path}: {e}")
+
+    # Reporting
+
+    def snapshot(self) -> Dict:
+        """Counters and per-stage summaries (count, sum, mean, p50, p95, max in ms)."""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "uptime_seconds": round(time.time() - self.started_at, 1),
+                "counters": dict(sorted(self._counters.items())),
+                "stages": {stage: histogram.summary() for stage, histogram in sorted(self._stages.items())},
+            }
+
+    def to_prometheus(self) -> str:
+        """Metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, value in sorted(self._counters.items()):
+                metric = f"{PROMETHEUS_PREFIX}_{name.replace('.', '_')}_total"
+                lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+            metric = f"{PROMETHEUS_PREFIX}_stage_seconds"
+            if self._stages:
+                lines.append(f"# TYPE {metric} histogram")
+            for stage, histogram in sorted(self._stages.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS_SECONDS, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{metric}_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+                lines.append(f'{metric}_count{{stage="{stage}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: Optional[str] = None) -> Optional[str]:
+        """Write the metrics to path (default: dump_path), replacing the file atomically.
+
+        Returns:
+            The path written, or None if there is no path
+        """
+        path = path or self.dump_path
+        if path is None:
+            return None
+        if path.endswith(".json"):
+            content = json.dumps(self.snapshot(), indent=2)
+        else:
+            content = self.to_prometheus()
+        try:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Cannot write metrics to {path}: {e}")
+            return None
+        return path
+
+    def reset(self) -> None:
+        """Drop all recorded values."""
+        with self._lock:
+            self._counters.clear()
+            self._stages.clear()
+
+
+_metrics: Optional[Metrics] = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> Metrics:
+    """Process-wide Metrics configured from config.yaml, created once."""
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                config = get_config()
+                metrics = Metrics(
+                    enabled=config["metrics"],
+                    dump_path=config["metrics_dump_path"],
+                    dump_interval_seconds=config["metrics_dump_interval_seconds"],
+                    slow_query_ms=config["slow_query_ms"],
+                    slow_query_log_path=config["slow_query_log_path"]
+                )
+                if metrics.enabled and metrics.dump_path:
+                    atexit.register(metrics.dump)
+                _metrics = metrics
+    return _metrics
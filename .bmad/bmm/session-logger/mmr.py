@@ -0,0 +1,71 @@
+"""
+BMAD Session Logger - Maximal Marginal Relevance
+Greedy selection of items that are relevant to the query but not redundant
+with the items already selected.
+
+Each step picks the candidate maximizing
+
+    lambda * relevance - (1 - lambda) * max similarity to the selected items
+
+with all pairwise similarities computed up front in one matrix product.
+NumPy is imported on first use, keeping package import light.
+"""
+
+import logging
+from typing import Callable, List, Optional, Sequence
+
+
+# Configure logging
+logger = logging.getLogger("bmad.session_logger.mmr")
+
+
+# Constants
+DEFAULT_MMR_LAMBDA = 0.7
+
+
+def mmr_select(
+    relevances: Sequence[float],
+    embeddings: Sequence,
+    k: Optional[int] = None,
+    lambda_: float = DEFAULT_MMR_LAMBDA,
+    accept: Optional[Callable[[int], bool]] = None
+) -> List[int]:
+    """Order candidates by maximal marginal relevance.
+
+    Args:
+        relevances: Query relevance of each candidate (higher is better)
+        embeddings: Unit-length candidate vectors, one per candidate
+        k: Maximum number of candidates to select (None: all)
+        lambda_: 1.0 ranks by relevance only, 0.0 by diversity only
+        accept: Optional callback for the candidate about to be selected;
+            returning False skips it (e.g. when it does not fit a budget)
+            without counting it towards redundancy
+
+    Returns:
+        Indexes of the selected candidates, in selection order
+    """
+    import numpy as np
+
+    relevance = np.asarray(relevances, dtype=np.float32)
+    n = len(relevance)
+    if n == 0:
+        return []
+    if k is None:
+        k = n
+
+    vectors = np.asarray(embeddings, dtype=np.float32).reshape(n, -1)
+    similarity = vectors @ vectors.T
+
+    redundancy = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    selected: List[int] = []
+    while len(selected) < k and available.any():
+        scores = lambda_ * relevance - (1.0 - lambda_) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        available[best] = False
+        if accept is not None and not accept(best):
+            continue
+        selected.append(best)
+        np.maximum(redundancy, similarity[best], out=redundancy)
+    return selected
@@ -0,0 +1,426 @@
+"""
+BMAD Session Logger - NumPy Backend
+Zero-dependency vector storage: a memory-mapped float32 matrix plus a SQLite
+record table, searched exactly with vectorized matrix-vector products.
+
+Layout of ``{db_path}/{collection_name}.numpy/``:
+    embeddings.npy   float32 matrix (capacity x dim), rows L2-normalized
+    records.sqlite3  row -> id, document, metadata (JSON)
+
+Only IDs are loaded at open; metadata columns used in ``where`` filters are
+loaded on first use and kept up to date in memory. Exact search over
+N x 384 floats stays in the low milliseconds up to ~100K sessions, which
+also makes this backend a recall reference for the Chroma (HNSW) backend.
+
+Several processes may open the same directory (writes are serialized by the
+collection's writer lock, see write_lock.py). Every operation first checks
+SQLite's data_version and reloads the row map and the matrix mapping when
+another process has committed since, so each process sees the others' writes.
+"""
+
+import os
+import json
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from backends import StorageBackend, GET_INCLUDE, QUERY_INCLUDE
+
+
+# Configure logging
+logger = logging.getLogger("bmad.session_logger.numpy_backend")
+
+
+# Constants
+MATRIX_FILENAME = "embeddings.npy"
+RECORDS_FILENAME = "records.sqlite3"
+INITIAL_CAPACITY = 1024
+FANCY_INDEX_FRACTION = 0.25   # below this share of rows, score only the candidates
+SQL_BATCH = 500               # bound parameters per IN (...) query
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize each row (zero rows stay zero)."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k(rows: np.ndarray, scores: np.ndarray, k: int) -> tuple:
+    """The k highest-scoring rows and their scores, best first."""
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return rows[top], scores[top]
+
+
+class NumpyBackend(StorageBackend):
+    """Exact-search StorageBackend on a memory-mapped NumPy matrix.
+
+    Args:
+        path: Directory holding the matrix and record table
+    """
+
+    name = "numpy"
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.path / RECORDS_FILENAME), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS records (
+                   row INTEGER PRIMARY KEY,
+                   id TEXT NOT NULL UNIQUE,
+                   document TEXT,
+                   metadata TEXT NOT NULL
+               )"""
+        )
+        self._conn.commit()
+        self._matrix = None
+        self._load()
+
+        logger.debug(f"NumPy backend opened: {self.path} ({len(self._rows)} records)")
+
+    # Storage helpers
+
+    def _load(self) -> None:
+        """(Re)load the matrix mapping and the row map from disk."""
+        matrix_path = self.path / MATRIX_FILENAME
+        # Release a previous mapping first: the file may have been replaced
+        self._matrix = None
+        self._matrix = np.load(matrix_path, mmap_mode="r+") if matrix_path.exists() else None
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+        rows = self._conn.execute("SELECT row, id FROM records ORDER BY row").fetchall()
+        self._size = rows[-1][0] + 1 if rows else 0
+        if self._size > self._capacity():
+            raise ValueError(f"{matrix_path} is missing or shorter than {RECORDS_FILENAME}")
+        capacity = self._capacity()
+        self._ids: List[Optional[str]] = [None] * capacity
+        self._valid = np.zeros(capacity, dtype=bool)
+        self._rows: Dict[str, int] = {}
+        for row, record_id in rows:
+            self._ids[row] = record_id
+            self._valid[row] = True
+            self._rows[record_id] = row
+        self._free = [row for row in range(self._size - 1, -1, -1) if not self._valid[row]]
+        # metadata key -> object array indexed by row, loaded on first filter
+        self._columns: Dict[str, np.ndarray] = {}
+
+    def _sync(self) -> None:
+        """Reload if another process committed to the record table."""
+        if self._conn.execute("PRAGMA data_version").fetchone()[0] != self._data_version:
+            logger.debug(f"NumPy backend changed on disk, reloading: {self.path}")
+            self._load()
+
+    def _capacity(self) -> int:
+        return self._matrix.shape[0] if self._matrix is not None else 0
+
+    def _ensure_capacity(self, needed: int, dim: int) -> None:
+        """Grow the matrix file (doubling) so it holds at least needed rows."""
+        matrix_path = self.path / MATRIX_FILENAME
+        if self._matrix is None:
+            capacity = max(INITIAL_CAPACITY, needed)
+            self._matrix = np.lib.format.open_memmap(
+                matrix_path, mode="w+", dtype=np.float32, shape=(capacity, dim)
+            )
+        elif needed > self._matrix.shape[0]:
+            capacity = max(needed, 2 * self._matrix.shape[0])
+            tmp_path = self.path / (MATRIX_FILENAME + ".tmp")
+            grown = np.lib.format.open_memmap(
+                tmp_path, mode="w+", dtype=np.float32, shape=(capacity, dim)
+            )
+            grown[:self._size] = self._matrix[:self._size]
+            grown.flush()
+            del grown
+            # Release the old mapping before replacing the file
+            self._matrix = None
+            os.replace(tmp_path, matrix_path)
+            self._matrix = np.load(matrix_path, mmap_mode="r+")
+        else:
+            return
+
+        grow = self._capacity() - len(self._ids)
+        self._ids.extend([None] * grow)
+        self._valid = np.concatenate([self._valid, np.zeros(grow, dtype=bool)])
+        for key, column in self._columns.items():
+            self._columns[key] = np.concatenate([column, np.full(grow, None, dtype=object)])
+        logger.debug(f"NumPy backend capacity: {self._capacity()} rows")
+
+    def _fetch_records(self, rows: Sequence[int]) -> Dict[int, tuple]:
+        """Load (document, metadata) for rows from the record table."""
+        found = {}
+        rows = [int(row) for row in rows]
+        for start in range(0, len(rows), SQL_BATCH):
+            part = rows[start:start + SQL_BATCH]
+            placeholders = ",".join("?" * len(part))
+            for row, document, metadata in self._conn.execute(
+                f"SELECT row, document, metadata FROM records WHERE row IN ({placeholders})", part
+            ):
+                found[row] = (document, json.loads(metadata))
+        return found
+
+    def _column(self, key: str) -> np.ndarray:
+        """Metadata values of key for every row (None where missing)."""
+        column = self._columns.get(key)
+        if column is None:
+            column = np.full(self._capacity(), None, dtype=object)
+            path = '$."' + key.replace('"', '""') + '"'
+            for row, value in self._conn.execute(
+                "SELECT row, json_extract(metadata, ?) FROM records", (path,)
+            ):
+                column[row] = value
+            self._columns[key] = column
+        return column
+
+    # Filters
+
+    def _mask(self, where: Optional[Dict]) -> np.ndarray:
+        """Boolean row mask for a Chroma-style where filter."""
+        size = self._size
+        if not where:
+            return self._valid[:size].copy()
+        mask = np.ones(size, dtype=bool)
+        for key, condition in where.items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self._mask(clause)
+            elif key == "$or":
+                any_mask = np.zeros(size, dtype=bool)
+                for clause in condition:
+                    any_mask |= self._mask(clause)
+                mask &= any_mask
+            else:
+                mask &= self._match(self._column(key)[:size], condition)
+        return mask & self._valid[:size]
+
+    @staticmethod
+    def _match(values: np.ndarray, condition) -> np.ndarray:
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        mask = np.ones(len(values), dtype=bool)
+        for op, operand in condition.items():
+            if op == "$eq":
+                mask &= np.asarray(values == operand, dtype=bool)
+            elif op == "$ne":
+                mask &= np.asarray(values != operand, dtype=bool)
+            elif op in ("$in", "$nin"):
+                members = set(operand)
+                hits = np.fromiter((v in members for v in values), bool, len(values))
+                mask &= hits if op == "$in" else ~hits
+            elif op in ("$gt", "$gte", "$lt", "$lte"):
+                compare = {
+                    "$gt": lambda v: v > operand,
+                    "$gte": lambda v: v >= operand,
+                    "$lt": lambda v: v < operand,
+                    "$lte": lambda v: v <= operand,
+                }[op]
+                mask &= np.fromiter(
+                    (v is not None and compare(v) for v in values), bool, len(values)
+                )
+            else:
+                raise ValueError(f"Unsupported where operator: {op}")
+        return mask
+
+    # StorageBackend
+
+    def _write(self, ids, embeddings, documents, metadatas, replace: bool) -> None:
+        if not ids:
+            return
+        vectors = normalize_rows(np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1))
+        dim = vectors.shape[1]
+
+        with self._lock:
+            self._sync()
+            if self._matrix is not None and self._matrix.shape[1] != dim:
+                raise ValueError(
+                    f"Embedding dimension {dim} does not match collection dimension "
+                    f"{self._matrix.shape[1]}"
+                )
+
+            # Last occurrence of an ID in the batch wins
+            positions = {record_id: i for i, record_id in enumerate(ids)}
+            assignments = []
+            free = list(self._free)
+            next_row = self._size
+            for record_id, i in positions.items():
+                row = self._rows.get(record_id)
+                if row is not None:
+                    if not replace:
+                        continue
+                elif free:
+                    row = free.pop()
+                else:
+                    row = next_row
+                    next_row += 1
+                assignments.append((row, record_id, i))
+            if not assignments:
+                return
+
+            self._ensure_capacity(next_row, dim)
+            rows = np.array([row for row, _, _ in assignments])
+            self._store_vectors(rows, vectors[[i for _, _, i in assignments]])
+
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO records (row, id, document, metadata) VALUES (?, ?, ?, ?)",
+                [(row, record_id, documents[i], json.dumps(metadatas[i]))
+                 for row, record_id, i in assignments]
+            )
+            self._conn.commit()
+
+            self._free = free
+            self._size = next_row
+            for row, record_id, i in assignments:
+                self._ids[row] = record_id
+                self._valid[row] = True
+                self._rows[record_id] = row
+                for key, column in self._columns.items():
+                    column[row] = metadatas[i].get(key)
+
+    def _store_vectors(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        """Write normalized vectors to matrix rows (capacity already ensured)."""
+        self._matrix[rows] = vectors
+        self._matrix.flush()
+
+    def add(self, ids, embeddings, documents, metadatas) -> None:
+        self._write(ids, embeddings, documents, metadatas, replace=False)
+
+    def upsert(self, ids, embeddings, documents, metadatas) -> None:
+        self._write(ids, embeddings, documents, metadatas, replace=True)
+
+    def update_metadata(self, ids, metadatas) -> None:
+        with self._lock:
+            self._sync()
+            updates = [
+                (self._rows[record_id], metadata)
+                for record_id, metadata in zip(ids, metadatas) if record_id in self._rows
+            ]
+            if not updates:
+                return
+            self._conn.executemany(
+                "UPDATE records SET metadata = ? WHERE row = ?",
+                [(json.dumps(metadata), row) for row, metadata in updates]
+            )
+            self._conn.commit()
+            for row, metadata in updates:
+                for key, column in self._columns.items():
+                    column[row] = metadata.get(key)
+
+    def _select_rows(self, ids, where) -> np.ndarray:
+        """Rows matching ids (request order) and/or where (storage order)."""
+        if ids is None:
+            return np.flatnonzero(self._mask(where))
+        rows = np.array([self._rows[i] for i in dict.fromkeys(ids) if i in self._rows], dtype=int)
+        if where and len(rows):
+            rows = rows[self._mask(where)[rows]]
+        return rows
+
+    def get(self, ids=None, where=None, include=None, limit=None, offset=None) -> Dict:
+        include = list(include) if include is not None else list(GET_INCLUDE)
+        with self._lock:
+            self._sync()
+            rows = self._select_rows(ids, where)
+            start = offset or 0
+            rows = rows[start:start + limit] if limit is not None else rows[start:]
+
+            result = {"ids": [self._ids[row] for row in rows], "included": include}
+            if "documents" in include or "metadatas" in include:
+                records = self._fetch_records(rows)
+                if "documents" in include:
+                    result["documents"] = [records[row][0] for row in rows]
+                if "metadatas" in include:
+                    result["metadatas"] = [records[row][1] for row in rows]
+            if "embeddings" in include:
+                result["embeddings"] = np.array(self._matrix[rows]) if len(rows) else np.empty((0, 0))
+            return result
+
+    def query(self, query_embeddings, n_results=10, where=None, include=None) -> Dict:
+        include = list(include) if include is not None else list(QUERY_INCLUDE)
+        queries = normalize_rows(np.asarray(query_embeddings, dtype=np.float32).reshape(
+            len(query_embeddings), -1
+        ))
+        result = {"ids": [], "included": include}
+        for field in ("documents", "metadatas", "distances", "embeddings"):
+            if field in include:
+                result[field] = []
+
+        with self._lock:
+            self._sync()
+            size = self._size
+            candidates = np.flatnonzero(self._mask(where)) if size else np.empty(0, dtype=int)
+            k = min(n_results, len(candidates))
+            if k == 0:
+                hits_per_query = [([], [])] * len(queries)
+            else:
+                hits_per_query = self._search(queries, candidates, k)
+
+            all_rows = [row for rows, _ in hits_per_query for row in rows]
+            needs_records = "documents" in include or "metadatas" in include
+            records = self._fetch_records(all_rows) if needs_records else {}
+
+            for rows, similarities in hits_per_query:
+                result["ids"].append([self._ids[row] for row in rows])
+                if "documents" in include:
+                    result["documents"].append([records[row][0] for row in rows])
+                if "metadatas" in include:
+                    result["metadatas"].append([records[row][1] for row in rows])
+                if "distances" in include:
+                    # Squared L2 between unit vectors, as in Chroma's "l2" space
+                    result["distances"].append(
+                        [float(max(0.0, 2.0 - 2.0 * s)) for s in similarities]
+                    )
+                if "embeddings" in include:
+                    result["embeddings"].append(np.array(self._matrix[list(rows)]))
+        return result
+
+    def _search(self, queries: np.ndarray, candidates: np.ndarray, k: int) -> List[tuple]:
+        """Exact top k of candidates per query: [(rows, similarities), ...], best first."""
+        if len(candidates) < FANCY_INDEX_FRACTION * self._size:
+            scores = queries @ self._matrix[candidates].T
+        else:
+            # Full matrix-vector product streams the mmap; mask the rest
+            full = queries @ self._matrix[:self._size].T
+            scores = full[:, candidates]
+        return [top_k(candidates, scores[q], k) for q in range(len(queries))]
+
+    def delete(self, ids=None, where=None) -> None:
+        with self._lock:
+            if ids is None and not where:
+                return
+            self._sync()
+            rows = [int(row) for row in self._select_rows(ids, where)]
+            if not rows:
+                return
+            for start in range(0, len(rows), SQL_BATCH):
+                part = rows[start:start + SQL_BATCH]
+                self._conn.execute(
+                    f"DELETE FROM records WHERE row IN ({','.join('?' * len(part))})", part
+                )
+            self._conn.commit()
+            for row in rows:
+                del self._rows[self._ids[row]]
+                self._ids[row] = None
+                self._valid[row] = False
+                for column in self._columns.values():
+                    column[row] = None
+            # Freed slots are reused by later inserts, lowest row first
+            self._free = sorted(set(self._free) | set(rows), reverse=True)
+
+    def count(self) -> int:
+        with self._lock:
+            self._sync()
+            return len(self._rows)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._matrix is not None:
+                self._matrix.flush()
+                self._matrix = None
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,145 @@
+"""
+BMAD Session Logger - Open Session Store
+SQLite state of sessions being captured incrementally (see
+SessionDB.open_session / append_turns / close_session).
+
+For each open session it keeps its metadata, how many chunks are complete,
+the text of the still-growing last chunk, the running sum of the complete
+chunks' embeddings and the current session vector. The appended text is
+stored as one row per append, so an append writes only its own turns and
+the bounded state; the conversation is put together once, by
+close_session. An append then only embeds the chunks its turns completed
+plus the still-growing last chunk, without re-embedding the whole
+conversation. The state survives process restarts, so a session opened by
+one process can be appended to or closed by another, and a crash loses at
+most the turns not yet appended.
+"""
+
+import json
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+# Configure logging
+logger = logging.getLogger("bmad.session_logger.open_sessions")
+
+
+class OpenSessionStore:
+    """Capture state of one collection's open sessions.
+
+    Args:
+        path: SQLite file for the store
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS session_state (
+                   session_id TEXT PRIMARY KEY,
+                   metadata TEXT NOT NULL,
+                   text_chars INTEGER NOT NULL,
+                   chunks_done INTEGER NOT NULL,
+                   tail TEXT NOT NULL,
+                   vector_sum BLOB,
+                   session_vector BLOB
+               )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS session_text (
+                   session_id TEXT NOT NULL,
+                   seq INTEGER NOT NULL,
+                   text TEXT NOT NULL,
+                   PRIMARY KEY (session_id, seq)
+               )"""
+        )
+        self._conn.commit()
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        """State of an open session, or None if it is not open.
+
+        Returns:
+            Dict with metadata, text_chars (0 before the first append),
+            chunks_done, tail (text of the last chunk), vector_sum (float32
+            bytes, None before the first complete chunk) and session_vector
+            (float32 bytes, None before the first append)
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT metadata, text_chars, chunks_done, tail, vector_sum, session_vector "
+                "FROM session_state WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        metadata, text_chars, chunks_done, tail, vector_sum, session_vector = row
+        return {
+            "metadata": json.loads(metadata),
+            "text_chars": text_chars,
+            "chunks_done": chunks_done,
+            "tail": tail,
+            "vector_sum": vector_sum,
+            "session_vector": session_vector,
+        }
+
+    def open(self, session_id: str, metadata: Dict) -> None:
+        """Start (or restart) the state of a session, without text."""
+        with self._lock:
+            self._conn.execute("DELETE FROM session_text WHERE session_id = ?", (session_id,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO session_state "
+                "(session_id, metadata, text_chars, chunks_done, tail, vector_sum, session_vector) "
+                "VALUES (?, ?, 0, 0, '', NULL, NULL)",
+                (session_id, json.dumps(metadata))
+            )
+            self._conn.commit()
+
+    def append(self, session_id: str, text: str, metadata: Dict, chunks_done: int, tail: str,
+               vector_sum: Optional[bytes], session_vector: bytes) -> None:
+        """Store appended text and the updated state in one transaction."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO session_text (session_id, seq, text) VALUES (?, "
+                "(SELECT COALESCE(MAX(seq), -1) + 1 FROM session_text WHERE session_id = ?), ?)",
+                (session_id, session_id, text)
+            )
+            self._conn.execute(
+                "UPDATE session_state SET metadata = ?, text_chars = text_chars + ?, chunks_done = ?, "
+                "tail = ?, vector_sum = ?, session_vector = ? WHERE session_id = ?",
+                (json.dumps(metadata), len(text), chunks_done, tail, vector_sum, session_vector, session_id)
+            )
+            self._conn.commit()
+
+    def document(self, session_id: str) -> str:
+        """Conversation appended so far ("" if none)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT text FROM session_text WHERE session_id = ? ORDER BY seq",
+                (session_id,)
+            ).fetchall()
+        return "\n".join(row[0] for row in rows)
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM session_text WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM session_state WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def ids(self) -> List[str]:
+        """IDs of all open sessions."""
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                "SELECT session_id FROM session_state ORDER BY session_id"
+            )]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
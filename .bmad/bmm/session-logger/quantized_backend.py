@@ -0,0 +1,247 @@
+"""
+BMAD Session Logger - Quantized Backend
+Compact variant of the NumPy backend: the first search pass scans int8 or
+binary codes of the embeddings, and only the best candidates are rescored
+against the full-precision vectors.
+
+Layout of ``{db_path}/{collection_name}.quantized/`` (as numpy_backend.py,
+plus the codes):
+    embeddings.npy     float32 matrix, memory-mapped, read only for rescoring
+    records.sqlite3    row -> id, document, metadata (JSON)
+    int8.npy           int8 codes (capacity x dim), one scale per row in
+    int8-scales.npy    float32 (code * scale ~= vector component)
+    binary.npy         sign bits (capacity x dim/8), compared by Hamming distance
+
+A 384-dimension vector costs 388 bytes as int8 codes and 48 bytes as
+binary codes, against 1536 as float32. A query scans the codes of every
+candidate row, keeps rescore_factor x n_results of them (at least
+MIN_RESCORE_CANDIDATES) and computes their exact cosine similarity from
+the float matrix, so the float pages touched per query are a few hundred
+rows instead of the whole collection. Returned distances are exact; the
+approximation can only cost recall, when a true neighbour misses the
+shortlist. int8 codes rarely do, binary codes need a larger rescore factor.
+
+Opening the directory with a different quantization builds its codes from
+the float matrix and deletes the other ones, which writes would leave
+stale; every process sharing the directory must use the same setting.
+"""
+
+import os
+import logging
+from typing import Dict, List
+
+import numpy as np
+
+from numpy_backend import NumpyBackend, top_k
+
+
+# Configure logging
+logger = logging.getLogger("bmad.session_logger.quantized_backend")
+
+
+# Constants
+QUANTIZATIONS = ("int8", "binary")
+DEFAULT_QUANTIZATION = "int8"
+DEFAULT_RESCORE_FACTORS = {"int8": 4, "binary": 16}  # shortlist size per result
+MIN_RESCORE_CANDIDATES = 32
+SCAN_BLOCK_ROWS = 16384      # codes decoded per step of the first pass
+INT8_MAX = 127
+
+# Set bits per byte value (np.bitwise_count needs NumPy 2)
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def quantize_int8(vectors: np.ndarray) -> tuple:
+    """Symmetric per-row int8 quantization.
+
+    Returns:
+        (codes, scales): int8 codes and the float32 scale of each row
+    """
+    peaks = np.abs(vectors).max(axis=1) if len(vectors) else np.zeros(0, dtype=np.float32)
+    scales = (np.where(peaks > 0, peaks, 1.0) / INT8_MAX).astype(np.float32)
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales
+
+
+def quantize_binary(vectors: np.ndarray) -> np.ndarray:
+    """Sign bits of each component, packed eight per byte."""
+    return np.packbits(vectors > 0, axis=1)
+
+
+def _popcount(bits: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(bits)
+    return _POPCOUNT[bits]
+
+
+class QuantizedBackend(NumpyBackend):
+    """NumpyBackend with a quantized first pass and exact rescoring.
+
+    Args:
+        path: Directory holding the matrix, codes and record table
+        quantization: "int8" or "binary"
+        rescore_factor: Candidates rescored per requested result (0: the
+            quantization's default, see DEFAULT_RESCORE_FACTORS)
+
+    Raises:
+        ValueError: If the quantization is unknown
+    """
+
+    name = "quantized"
+
+    def __init__(self, path: str, quantization: str = DEFAULT_QUANTIZATION, rescore_factor: int = 0):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization '{quantization}', expected one of {QUANTIZATIONS}")
+        self.quantization = quantization
+        self.rescore_factor = rescore_factor or DEFAULT_RESCORE_FACTORS[quantization]
+        self._codes = None
+        self._scales = None
+        super().__init__(path)
+
+    # Codes
+
+    def _code_files(self, quantization: str = None) -> List[str]:
+        if (quantization or self.quantization) == "int8":
+            return ["int8.npy", "int8-scales.npy"]
+        return ["binary.npy"]
+
+    def _encode(self, vectors: np.ndarray) -> List[np.ndarray]:
+        """Code arrays of vectors, one per file of _code_files()."""
+        if self.quantization == "int8":
+            return list(quantize_int8(vectors))
+        return [quantize_binary(vectors)]
+
+    def _code_shapes(self, capacity: int, dim: int) -> List[tuple]:
+        if self.quantization == "int8":
+            return [((capacity, dim), np.int8), ((capacity,), np.float32)]
+        return [((capacity, (dim + 7) // 8), np.uint8)]
+
+    def _open_codes(self) -> None:
+        """Map the code files, rebuilding them if they do not match the matrix."""
+        self._codes = self._scales = None
+        for quantization in QUANTIZATIONS:
+            if quantization != self.quantization:
+                for name in self._code_files(quantization):
+                    (self.path / name).unlink(missing_ok=True)
+        if self._matrix is None:
+            return
+        capacity = self._capacity()
+        paths = [self.path / name for name in self._code_files()]
+        if all(path.exists() for path in paths):
+            arrays = [np.load(path, mmap_mode="r+") for path in paths]
+            if all(array.shape[0] == capacity for array in arrays):
+                self._set_codes(arrays)
+                return
+            del arrays
+        logger.info(f"Building {self.quantization} codes for {self._size} rows: {self.path}")
+        source = self._encode(np.asarray(self._matrix[:self._size]))
+        self._write_codes(capacity, self._matrix.shape[1], source, self._size)
+
+    def _write_codes(self, capacity: int, dim: int, source: List[np.ndarray], copy_rows: int) -> None:
+        """Replace the code files with ones of capacity rows holding source[:copy_rows].
+
+        source is emptied: it may hold the current mappings, which are
+        released before their files are replaced.
+        """
+        replacements = []
+        shapes = self._code_shapes(capacity, dim)
+        for name, (shape, dtype), values in zip(self._code_files(), shapes, source):
+            tmp_path = self.path / (name + ".tmp")
+            array = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=shape)
+            array[:copy_rows] = values[:copy_rows]
+            array.flush()
+            del array
+            replacements.append((tmp_path, self.path / name))
+        source.clear()
+        self._codes = self._scales = None
+        for tmp_path, path in replacements:
+            os.replace(tmp_path, path)
+        self._set_codes([np.load(path, mmap_mode="r+") for _, path in replacements])
+
+    def _set_codes(self, arrays: List[np.ndarray]) -> None:
+        self._codes = arrays[0]
+        self._scales = arrays[1] if len(arrays) > 1 else None
+
+    # NumpyBackend storage hooks
+
+    def _load(self) -> None:
+        # Release the old code mappings too: their files may have been replaced
+        self._codes = self._scales = None
+        super()._load()
+        self._open_codes()
+
+    def _ensure_capacity(self, needed: int, dim: int) -> None:
+        super()._ensure_capacity(needed, dim)
+        capacity = self._capacity()
+        if self._codes is not None and self._codes.shape[0] == capacity:
+            return
+        if self._codes is None:
+            self._write_codes(capacity, dim, self._encode(np.zeros((0, dim), dtype=np.float32)), 0)
+        else:
+            source = [self._codes] + ([self._scales] if self._scales is not None else [])
+            self._write_codes(capacity, dim, source, self._size)
+
+    def _store_vectors(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        codes = self._encode(vectors)
+        self._codes[rows] = codes[0]
+        self._codes.flush()
+        if self._scales is not None:
+            self._scales[rows] = codes[1]
+            self._scales.flush()
+        super()._store_vectors(rows, vectors)
+
+    def _search(self, queries: np.ndarray, candidates: np.ndarray, k: int) -> List[tuple]:
+        shortlist_size = max(k * self.rescore_factor, MIN_RESCORE_CANDIDATES)
+        if shortlist_size >= len(candidates):
+            return super()._search(queries, candidates, k)
+
+        approximate = self._approximate_scores(queries, candidates)
+        hits = []
+        for q, query in enumerate(queries):
+            shortlist = np.sort(top_k(candidates, approximate[q], shortlist_size)[0])
+            hits.append(top_k(shortlist, self._matrix[shortlist] @ query, k))
+        return hits
+
+    def _approximate_scores(self, queries: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+        """First-pass scores (higher is closer) of candidates for each query."""
+        scores = np.empty((len(queries), len(candidates)), dtype=np.float32)
+        if self.quantization == "binary":
+            query_bits = quantize_binary(queries)
+            # Whole 64-bit words popcount much faster than single bytes
+            wide = hasattr(np, "bitwise_count") and query_bits.shape[1] % 8 == 0
+            if wide:
+                query_bits = query_bits.view(np.uint64)
+        for start in range(0, len(candidates), SCAN_BLOCK_ROWS):
+            rows = candidates[start:start + SCAN_BLOCK_ROWS]
+            codes = self._codes[rows]
+            if self.quantization == "int8":
+                block = (queries @ codes.astype(np.float32).T) * self._scales[rows]
+            else:
+                if wide:
+                    codes = codes.view(np.uint64)
+                distances = _popcount(query_bits[:, None, :] ^ codes[None, :, :]).sum(axis=2)
+                block = -distances.astype(np.float32)
+            scores[:, start:start + len(rows)] = block
+        return scores
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Bytes of the stored rows: codes scanned per query and float vectors."""
+        with self._lock:
+            self._sync()
+            if self._matrix is None:
+                return {"codes_bytes": 0, "float_bytes": 0}
+            per_row = self._codes.itemsize * int(np.prod(self._codes.shape[1:]))
+            if self._scales is not None:
+                per_row += self._scales.itemsize
+            return {
+                "codes_bytes": per_row * self._size,
+                "float_bytes": self._matrix.itemsize * self._matrix.shape[1] * self._size,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            for array in (self._codes, self._scales):
+                if array is not None:
+                    array.flush()
+            self._codes = self._scales = None
+        super().close()
@@ -3,9 +3,15 @@ BMAD Session Logger - Query Module
 Simplified query interface for agents to retrieve relevant context.
 """
 
+import time
 import logging
-from typing import List, Optional
+from typing import List, Optional, Union
 
+from config import get_config
+from daemon_client import daemon_call
+from metrics import get_metrics
+from tracing import span
+from context_builder import build_context, format_session_header, CONTEXT_TITLE
 from session_db import SessionDB
 
 
@@ -17,49 +23,62 @@ def format_session_for_context(session_data: dict, max_chars: int = 500) -> str:
     """Format a single session result for context display.
 
     Args:
-        session_data: Session dict with conversation, metadata, relevance_score
+        session_data: Session dict with metadata, relevance_score and either
+            an excerpt/best_chunk or the full conversation
         max_chars: Maximum characters to include from conversation
 
     Returns:
         Formatted string for display
     """
-    metadata = session_data["metadata"]
-    relevance = session_data["relevance_score"] * 100  # Convert to percentage
-
-    # Extract conversation excerpt
-    conversation = session_data["conversation"]
+    # Extract conversation excerpt (best-matching chunk when available)
+    conversation = (
+        session_data.get("best_chunk")
+        or session_data.get("excerpt")
+        or session_data.get("conversation", "")
+    )
     if len(conversation) > max_chars:
         excerpt = conversation[:max_chars] + "..."
     else:
         excerpt = conversation
 
     # Format output
-    output = f"""
-### Session: {metadata['start_time'][:10]} - {metadata['agent_persona']} ({metadata['agent_name']}) - {metadata['workflow']}
-Relevance: {relevance:.0f}%
-
-{excerpt}
-"""
-    return output
+    return format_session_header(session_data["metadata"], session_data["relevance_score"]) + excerpt + "\n"
 
 
 def get_relevant_context(
-    query: str,
+    query: Union[str, List[str]],
     current_agent: str = None,
     current_workflow: str = None,
-    max_sessions: int = 3,
-    min_relevance: float = 0.3,
-    db_path: str = None
+    max_sessions: int = None,
+    min_relevance: float = None,
+    db_path: str = None,
+    mode: str = "vector",
+    budget_tokens: int = None,
+    mmr_lambda: float = None
 ) -> str:
     """Simplified query interface for agents to get context.
 
+    The retrieved sessions are condensed into their most query-relevant,
+    mutually non-redundant passages within a token budget (see
+    context_builder.py), rather than showing the opening of each session.
+
     Args:
-        query: Natural language question
+        query: Natural language question, or a list of questions (one per
+            facet, e.g. workflow, current story, open files) searched in one
+            batch and merged into a single deduplicated ranking
         current_agent: Current agent name (optional filter)
         current_workflow: Current workflow (optional filter)
-        max_sessions: Maximum sessions to return
+        max_sessions: Maximum sessions to return (config: max_context_sessions)
         min_relevance: Minimum relevance threshold (0.0-1.0)
+            (config: min_relevance_threshold)
         db_path: Database path (optional)
+        mode: "vector", "lexical" (keyword only, skips the embedding model)
+            or "hybrid" (both, rank-fused)
+        budget_tokens: Approximate size limit of the returned context
+            (config: context_budget_tokens; 0 shows the first 500
+            characters of each session instead)
+        mmr_lambda: Diversity of the sessions picked, 1.0 = by relevance
+            only (config: session_mmr_lambda; see SessionDB.query_sessions)
 
     Returns:
         Formatted context string ready to inject into agent prompt.
@@ -71,66 +90,142 @@ def get_relevant_context(
         ### Session: 2025-01-15 - Architect (Winston) - create-architecture
         Relevance: 85%
 
-        [Conversation excerpt...]
+        [Most relevant passage...]
+        ...
+        [Another relevant passage...]
 
         ### Session: 2025-01-10 - PM (Morgan) - prd
         Relevance: 72%
 
-        [Conversation excerpt...]
+        [Most relevant passage...]
         ```
 
         Returns empty string if no relevant sessions found.
     """
-    try:
-        # Initialize database
-        db = SessionDB(db_path=db_path)
-
-        # Query for relevant sessions
-        results = db.query_sessions(
-            query_text=query,
-            n_results=max_sessions,
-            agent_name=current_agent,
-            workflow=current_workflow,
-            min_relevance=min_relevance
-        )
-
-        if not results:
-            logger.info(f"No relevant sessions found for query: {query[:50]}...")
+    with span("get_relevant_context", db_path=db_path, n_results=max_sessions, mode=mode,
+              queries=1 if isinstance(query, str) else len(query),
+              filters={"agent_name": current_agent, "workflow": current_workflow}) as current:
+        try:
+            handled, context = daemon_call(
+                "get_relevant_context", query=query, current_agent=current_agent,
+                current_workflow=current_workflow, max_sessions=max_sessions,
+                min_relevance=min_relevance, db_path=db_path, mode=mode,
+                budget_tokens=budget_tokens, mmr_lambda=mmr_lambda
+            )
+            if handled:
+                current.set(daemon=True)
+                return context
+
+            config = get_config()
+            if max_sessions is None:
+                max_sessions = config["max_context_sessions"]
+            if min_relevance is None:
+                min_relevance = config["min_relevance_threshold"]
+            if budget_tokens is None:
+                budget_tokens = config["context_budget_tokens"]
+            if mmr_lambda is None:
+                mmr_lambda = config["session_mmr_lambda"]
+
+            # Initialize database
+            db = SessionDB(db_path=db_path)
+            queries = [query] if isinstance(query, str) else list(query)
+
+            # Formatted context is cached alongside raw results, until the next write
+            cache = db.query_cache
+            cache_key = ("context", tuple(queries), current_agent, current_workflow,
+                         max_sessions, min_relevance, mode, budget_tokens, mmr_lambda)
+            generation = db.engine.generation
+            if cache is not None:
+                cached = cache.get(cache_key, generation)
+                if cached is not None:
+                    current.set(cache_hit=True)
+                    return cached
+            started = time.perf_counter()
+
+            # Query for relevant sessions (all facets in one batch)
+            results = db.query_sessions_batch(
+                queries,
+                n_results=max_sessions,
+                agent_name=current_agent,
+                workflow=current_workflow,
+                min_relevance=min_relevance,
+                mode=mode,
+                include=["metadata", "excerpt"],
+                mmr_lambda=mmr_lambda if mmr_lambda < 1.0 else None,
+                merge=True
+            )
+
+            metrics = get_metrics()
+            with metrics.timer("format"):
+                if not results:
+                    logger.info(f"No relevant sessions found for query: {' | '.join(queries)[:50]}...")
+                    formatted_context = ""
+                elif budget_tokens > 0:
+                    # Pack the best passages into the budget
+                    formatted_context = build_context(
+                        db, queries, results,
+                        budget_tokens=budget_tokens,
+                        lambda_=config["context_mmr_lambda"],
+                        # Without chunk vectors, passages would mean fetching
+                        # and embedding whole sessions on every call
+                        use_passages=mode != "lexical" and (
+                            db.chunking or config["context_split_sessions"]
+                        )
+                    )
+                    logger.info(f"Retrieved {len(results)} relevant sessions for context")
+                else:
+                    # Format results
+                    context_parts = [CONTEXT_TITLE]
+                    for session in results:
+                        context_parts.append(format_session_for_context(session))
+
+                    formatted_context = "\n".join(context_parts)
+                    logger.info(f"Retrieved {len(results)} relevant sessions for context")
+
+            current.set(results=len(results), context_chars=len(formatted_context))
+            elapsed = time.perf_counter() - started
+            metrics.observe("context", elapsed)
+            if cache is not None:
+                cache.put(cache_key, formatted_context, generation, elapsed)
+            return formatted_context
+
+        except Exception as e:
+            get_metrics().count("errors.context")
+            logger.error(f"Failed to get relevant context: {e}", exc_info=True)
             return ""
 
-        # Format results
-        context_parts = ["## Relevant Past Discussions\n"]
-        for session in results:
-            context_parts.append(format_session_for_context(session))
-
-        formatted_context = "\n".join(context_parts)
-
-        logger.info(f"Retrieved {len(results)} relevant sessions for context")
-        return formatted_context
-
-    except Exception as e:
-        logger.error(f"Failed to get relevant context: {e}", exc_info=True)
-        return ""
-
 
 def search_sessions(
     query: str,
     filters: dict = None,
-    max_results: int = 5,
-    db_path: str = None
+    max_results: int = None,
+    db_path: str = None,
+    mode: str = "vector"
 ) -> List[dict]:
     """Direct search interface returning raw session data.
 
     Args:
         query: Search query
-        filters: Dict with optional keys: agent_name, workflow, project_name
-        max_results: Maximum results
+        filters: Dict with optional keys: agent_name, workflow, project_name,
+            topics_any, artifacts_any
+        max_results: Maximum results (config: default_query_results)
         db_path: Database path (optional)
+        mode: "vector", "lexical" or "hybrid"
 
     Returns:
         List of session dicts with full data
     """
     try:
+        handled, results = daemon_call(
+            "search_sessions", query=query, filters=filters, max_results=max_results,
+            db_path=db_path, mode=mode
+        )
+        if handled:
+            return results
+
+        if max_results is None:
+            max_results = get_config()["default_query_results"]
+
         db = SessionDB(db_path=db_path)
 
         filters = filters or {}
@@ -139,7 +234,10 @@ def search_sessions(
             n_results=max_results,
             agent_name=filters.get("agent_name"),
             workflow=filters.get("workflow"),
-            project_name=filters.get("project_name")
+            project_name=filters.get("project_name"),
+            mode=mode,
+            topics_any=filters.get("topics_any"),
+            artifacts_any=filters.get("artifacts_any")
         )
 
         return results
@@ -152,27 +250,43 @@ def search_sessions(
 def get_recent_sessions(
     agent_name: str = None,
     workflow: str = None,
-    limit: int = 5,
-    db_path: str = None
+    limit: int = None,
+    db_path: str = None,
+    since=None,
+    until=None
 ) -> List[dict]:
-    """Get recent sessions without semantic search.
+    """Get the most recent sessions (newest first) without semantic search.
 
     Args:
         agent_name: Filter by agent (optional)
         workflow: Filter by workflow (optional)
-        limit: Maximum results
+        limit: Maximum results (config: default_query_results)
         db_path: Database path (optional)
+        since: Only sessions that ended at or after this time (optional)
+        until: Only sessions that ended before this time (optional)
 
     Returns:
         List of session metadata (without full conversation text)
     """
     try:
+        handled, sessions = daemon_call(
+            "get_recent_sessions", agent_name=agent_name, workflow=workflow, limit=limit,
+            db_path=db_path, since=since, until=until
+        )
+        if handled:
+            return sessions
+
+        if limit is None:
+            limit = get_config()["default_query_results"]
+
         db = SessionDB(db_path=db_path)
 
         sessions = db.list_sessions(
             agent_name=agent_name,
             workflow=workflow,
-            limit=limit
+            limit=limit,
+            since=since,
+            until=until
         )
 
         return sessions
@@ -0,0 +1,121 @@
+"""
+BMAD Session Logger - Query Cache
+In-memory LRU/TTL cache of query results, invalidated by writes.
+
+Agents repeat identical context queries within a session, and the start
+hook builds deterministic default queries. Entries are tagged with the
+collection generation (Engine.generation) current when the query started;
+save_session, save_sessions and delete_session bump the generation, so any
+entry computed before a write is treated as a miss. The TTL bounds
+staleness from writers in other processes, which do not bump this
+process's counter.
+"""
+
+import copy
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+# Configure logging
+logger = logging.getLogger("bmad.session_logger.query_cache")
+
+
+# Constants
+DEFAULT_MAX_ITEMS = 256
+DEFAULT_TTL_SECONDS = 300.0
+
+
+class QueryCache:
+    """LRU cache of query results with TTL and generation checks.
+
+    Values are deep-copied in and out, so callers may modify what they get.
+
+    Args:
+        max_items: Maximum cached results (least recently used are evicted)
+        ttl_seconds: Entry lifetime; 0 keeps entries until invalidated
+    """
+
+    def __init__(self, max_items: int = DEFAULT_MAX_ITEMS, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        # key -> (value, generation, stored_at, compute_seconds)
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int, float, float]]" = OrderedDict()
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "stale": 0,
+            "expired": 0,
+            "evictions": 0,
+        }
+        self._saved_seconds = 0.0
+
+    def get(self, key: Hashable, generation: int) -> Optional[Any]:
+        """Return a copy of the cached value, or None on a miss.
+
+        Args:
+            key: Cache key (query text, filters, limits, ...)
+            generation: Current collection generation; entries from an
+                older generation are dropped
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+
+            value, entry_generation, stored_at, compute_seconds = entry
+            if entry_generation != generation:
+                del self._entries[key]
+                self._counters["stale"] += 1
+                self._counters["misses"] += 1
+                return None
+            if self.ttl_seconds and time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self._counters["expired"] += 1
+                self._counters["misses"] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            self._saved_seconds += compute_seconds
+        return copy.deepcopy(value)
+
+    def put(self, key: Hashable, value: Any, generation: int, compute_seconds: float = 0.0) -> None:
+        """Store a value computed at the given generation.
+
+        Args:
+            key: Cache key
+            value: Result to cache (copied)
+            generation: Collection generation read before computing the value
+            compute_seconds: Time the value took to compute, credited to
+                saved_seconds on every hit
+        """
+        if self.max_items <= 0:
+            return
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._entries[key] = (value, generation, time.monotonic(), compute_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters, hit ratio, items and latency saved by hits."""
+        with self._lock:
+            stats = dict(self._counters)
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+            stats["items"] = len(self._entries)
+            stats["saved_seconds"] = self._saved_seconds
+            return stats
+
+    def clear(self) -> None:
+        """Drop every cached result."""
+        with self._lock:
+            self._entries.clear()
@@ -3,24 +3,56 @@ BMAD Session Logger - ChromaDB Interface
 Core vector database operations for session storage and retrieval.
 """
 
+import re
+import json
+import time
 import uuid
 import logging
-from datetime import datetime
-from typing import Dict, List, Optional
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Union
 from pathlib import Path
 
-try:
-    import chromadb
-    from chromadb.utils import embedding_functions
-except ImportError:
-    chromadb = None
-    embedding_functions = None
+from backends import BACKENDS, StorageBackend, distance_to_relevance
+from config import get_config
+from engine import get_registry
+from lexical_index import LexicalIndex, reciprocal_rank_fusion, RRF_K
+from session_index import SessionIndex
+from chunking import chunk_conversation, chunk_id
+from open_sessions import OpenSessionStore
+from metrics import get_metrics
+from tracing import span
+from write_lock import WriterLock, WriteSpool
+from dedup import (
+    DedupIndex, DEDUP_POLICIES, content_hash, merge_session_metadata, minhash,
+    signature_similarity
+)
 
 
 # Configure logging
 logger = logging.getLogger("bmad.session_logger")
 
 
+# Constants
+CHUNK_COLLECTION_SUFFIX = "chunks"
+CHUNK_OVERFETCH = 8          # chunk hits fetched per requested session
+CHUNK_WIDEN_FACTOR = 4       # chunk fetch growth per widening round
+CHUNK_MAX_FETCH = 2048       # chunk hits fetched per query at most
+CHUNK_TOPK_MEAN = 3          # chunks averaged by the "topk_mean" aggregation
+AGGREGATIONS = ("max", "topk_mean")
+DEFAULT_BATCH_SIZE = 64      # sessions per save_sessions embedding batch
+QUERY_MODES = ("vector", "lexical", "hybrid")
+INCLUDE_FIELDS = ("conversation", "metadata", "excerpt")
+DEFAULT_INCLUDE = ("conversation", "metadata")
+EXCERPT_CHARS = 500          # bounded excerpt stored in metadata at save time
+HYBRID_OVERFETCH = 4         # candidates per list fetched for fusion
+MMR_OVERFETCH = 3            # candidates per result fetched for diversity reranking
+PASSAGE_CHARS = 400          # passage size when sessions are split on the fly
+PASSAGE_MAX_CANDIDATES = 64  # passages scored per score_passages call
+PREFILTER_SLICE_IDS = 10000  # candidate IDs per vector query (SQLite variable limit)
+TURN_ROLES = {"user": "User", "assistant": "Assistant"}
+
+
 # Custom Exceptions
 class SessionDBError(Exception):
     """Base exception for session database errors."""
@@ -73,6 +105,121 @@ def csv_to_list(csv_str: str) -> List[str]:
     return [s.strip() for s in csv_str.split(",") if s.strip()]
 
 
+def count_messages(conversation_text: str) -> int:
+    """Count User:/Assistant: turns (rough estimate)."""
+    return conversation_text.count("\nUser:") + conversation_text.count("\nAssistant:")
+
+
+def format_turns(turns: Iterable[Union[str, Dict]]) -> str:
+    """Render turns as conversation text.
+
+    Args:
+        turns: Strings (used as-is, e.g. "User: ...") or dicts with "role"
+            ("user", "assistant", ...) and "content"
+
+    Returns:
+        One line block per turn, newline-separated
+    """
+    lines = []
+    for turn in turns:
+        if isinstance(turn, dict):
+            role = TURN_ROLES.get(turn.get("role", "").lower(), turn.get("role", "").title())
+            turn = f"{role}: {turn.get('content', '')}"
+        if turn.strip():
+            lines.append(turn.strip())
+    return "\n".join(lines)
+
+
+def build_session_metadata(
+    session_id: str,
+    conversation_text: str,
+    agent_name: str,
+    agent_persona: str,
+    project_name: str,
+    workflow: str = "none",
+    topics: List[str] = None,
+    artifacts: List[str] = None,
+    start_time: datetime = None,
+    end_time: datetime = None,
+    session_status: str = "completed"
+) -> Dict:
+    """Build the ChromaDB metadata dict for a session.
+
+    ChromaDB requires str, int, float only, so lists are flattened to CSV.
+    """
+    # Handle timestamps
+    if end_time is None:
+        end_time = datetime.utcnow()
+    if start_time is None:
+        # Estimate start time (assume 30 min conversation)
+        start_time = end_time - timedelta(minutes=30)
+
+    return {
+        "session_id": session_id,
+        "agent_name": agent_name,
+        "agent_persona": agent_persona,
+        "workflow": workflow,
+        "project_name": project_name,
+        "start_time": start_time.isoformat() + "Z",
+        "end_time": end_time.isoformat() + "Z",
+        "message_count": count_messages(conversation_text),
+        "topics": list_to_csv(topics),
+        "artifacts_created": list_to_csv(artifacts),
+        "session_status": session_status,
+        "excerpt": conversation_text[:EXCERPT_CHARS]
+    }
+
+
+def build_where(**filters) -> Optional[Dict]:
+    """Build a ChromaDB where clause from equality filters.
+
+    None/empty values are ignored. ChromaDB requires an explicit "$and" when
+    more than one field is filtered.
+
+    Returns:
+        Where clause dict, or None if no filters apply
+    """
+    clauses = [{key: value} for key, value in filters.items() if value]
+    if not clauses:
+        return None
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
+
+
+def merge_ranked_results(results_per_query: List[List[Dict]], n_results: int) -> List[Dict]:
+    """Merge per-query result lists into one deduplicated ranking.
+
+    Each session keeps the result of the query that scored it highest, plus
+    "matched_queries" (indexes of every query that returned it). Ranked by
+    relevance_score; sessions found by more queries win ties.
+
+    Args:
+        results_per_query: Result lists as returned by query_sessions_batch
+        n_results: Maximum results to return
+
+    Returns:
+        List of at most n_results result dicts (copies), best first
+    """
+    merged: Dict[str, Dict] = {}
+    for index, results in enumerate(results_per_query):
+        for result in results:
+            session_id = result["session_id"]
+            best = merged.get(session_id)
+            if best is None:
+                best = merged[session_id] = dict(result, matched_queries=[])
+            elif result["relevance_score"] > best["relevance_score"]:
+                best = merged[session_id] = dict(result, matched_queries=best["matched_queries"])
+            best["matched_queries"].append(index)
+
+    ranked = sorted(
+        merged.values(),
+        key=lambda result: (result["relevance_score"], len(result["matched_queries"])),
+        reverse=True
+    )
+    return ranked[:n_results]
+
+
 class SessionDB:
     """ChromaDB interface for BMAD session logging.
 
@@ -80,53 +227,201 @@ class SessionDB:
     in a vector database for semantic search.
     """
 
-    def __init__(self, db_path: str = None, collection_name: str = None):
+    def __init__(
+        self,
+        db_path: str = None,
+        collection_name: str = None,
+        embedding_model: str = None,
+        backend: str = None,
+        chunking: bool = None,
+        chunk_chars: int = None,
+        chunk_overlap: int = None,
+        embedding_cache: bool = True,
+        query_cache: bool = True,
+        lexical_index: bool = True,
+        session_index: bool = True,
+        dedup_policy: str = None,
+        dedup_threshold: float = None,
+        write_lock: bool = None
+    ):
         """Initialize persistent ChromaDB client.
 
+        The client, collection and embedding model come from the process-wide
+        engine registry, so only the first SessionDB for a given
+        (db_path, collection_name, embedding_model) pays the load cost. That
+        cost is deferred as well: ChromaDB is opened on first collection
+        access and the model is loaded on the first save or vector query, so
+        listing sessions from the session index needs neither.
+
+        Arguments left as None take their value from config.yaml (see
+        config.py), as do the embedding device, batch size, thread count,
+        cache sizes and HNSW parameters.
+
+        Storage goes through a StorageBackend (see backends.py): "chroma"
+        keeps vectors in a ChromaDB collection, "numpy" in a memory-mapped
+        matrix under ``{db_path}/{collection_name}.numpy`` and does not need
+        chromadb at all, "quantized" adds int8 or binary codes to that
+        layout (``{collection_name}.quantized``) for a compact first pass.
+
         Args:
-            db_path: Path to database directory (default: .bmad/data/session-db)
-            collection_name: Collection name (default: bmad_sessions)
+            db_path: Path to database directory (config: database_path)
+            collection_name: Collection name (config: collection_name)
+            embedding_model: Sentence-transformers model (config: embedding_model)
+            backend: Storage backend, "chroma", "numpy" or "quantized"
+                (config: backend)
+            chunking: Also index overlapping chunks of each session and search
+                them with session-level aggregation (config: chunking)
+            chunk_chars: Maximum characters per chunk (config: chunk_chars)
+            chunk_overlap: Characters repeated between consecutive chunks
+                (config: chunk_overlap)
+            embedding_cache: Reuse embeddings of previously seen texts from
+                the content-addressed cache stored next to the database
+            query_cache: Serve repeated identical queries from the in-memory
+                result cache until the next write (or its TTL)
+            lexical_index: Maintain the BM25 keyword index used by the
+                "lexical" and "hybrid" query modes
+            session_index: Maintain the end_time-ordered metadata index used
+                for newest-first listing
+            dedup_policy: What saving a duplicate of a stored session does
+                (config: dedup_policy). Exact copies are never stored twice;
+                "skip" returns the stored session's ID, "merge" also folds
+                the copy's topics, artifacts and time span into it, and
+                "revision" stores near duplicates with a "revision_of" link
+                (exact copies are skipped). "none" (default) disables
+                detection.
+            dedup_threshold: Estimated shingle (Jaccard) similarity at which
+                a session is a near duplicate (config: dedup_threshold)
+            write_lock: Serialize writes of all processes sharing the
+                collection with a file lock; a save or delete that does not
+                get it within write_lock_wait_seconds is spooled for the
+                lock holder (see write_lock.py) (config: write_lock)
 
         Raises:
             DatabaseConnectionError: If ChromaDB initialization fails
-            ImportError: If chromadb is not installed
+            ConfigurationError: If config.yaml or an override is invalid, or
+                the backend or dedup policy is unknown
+            ImportError: If the chroma backend is selected and chromadb is
+                not installed
         """
-        if chromadb is None:
-            raise ImportError(
-                "chromadb is not installed. "
-                "Run: pip install chromadb==1.0.15 sentence-transformers pyyaml"
-            )
-
-        # Set defaults
+        # Set defaults from configuration
+        config = get_config()
         if db_path is None:
-            db_path = str(Path.home() / ".bmad" / "data" / "session-db")
+            db_path = config["database_path"]
         if collection_name is None:
-            collection_name = "bmad_sessions"
+            collection_name = config["collection_name"]
+        if embedding_model is None:
+            embedding_model = config["embedding_model"]
+        if backend is None:
+            backend = config["backend"]
+        if backend not in BACKENDS:
+            raise ConfigurationError(f"Unknown storage backend '{backend}', expected one of {BACKENDS}")
+        if chunking is None:
+            chunking = config["chunking"]
+        if chunk_chars is None:
+            chunk_chars = config["chunk_chars"]
+        if chunk_overlap is None:
+            chunk_overlap = config["chunk_overlap"]
+        if dedup_policy is None:
+            dedup_policy = config["dedup_policy"]
+        if dedup_policy not in DEDUP_POLICIES:
+            raise ConfigurationError(
+                f"Unknown dedup policy '{dedup_policy}', expected one of {DEDUP_POLICIES}"
+            )
+        if dedup_threshold is None:
+            dedup_threshold = config["dedup_threshold"]
+        if write_lock is None:
+            write_lock = config["write_lock"]
 
         self.db_path = db_path
         self.collection_name = collection_name
+        self.embedding_model = embedding_model
+        self.backend = backend
+        self.chunking = chunking
+        self.chunk_chars = chunk_chars
+        self.chunk_overlap = chunk_overlap
+        self.use_embedding_cache = embedding_cache
+        self.use_query_cache = query_cache
+        self.dedup_policy = dedup_policy
+        self.dedup_threshold = dedup_threshold
+        self.use_write_lock = write_lock
+        self.write_lock_wait = config["write_lock_wait_seconds"]
+        self.metrics = get_metrics()
+        self._closed = False
 
         try:
-            # Initialize ChromaDB persistent client
-            self.client = chromadb.PersistentClient(path=db_path)
-
-            # Setup embedding function (sentence transformers)
-            self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-                model_name="all-MiniLM-L6-v2"
+            # Reuse the engine from the registry; its client, collection and
+            # model are only created when first needed
+            self.engine = get_registry().get_engine(
+                db_path, collection_name, embedding_model,
+                options={**config, "backend": backend}, user=self
             )
-
-            # Get or create collection
-            self.collection = self.client.get_or_create_collection(
-                name=collection_name,
-                embedding_function=self.embedding_function
+            self.lexical_index = (
+                self._open_side_index("lexical_index", LexicalIndex, self._rebuild_lexical_index)
+                if lexical_index else None
+            )
+            self.session_index = (
+                self._open_side_index("session_index", SessionIndex, self._rebuild_session_index)
+                if session_index else None
+            )
+            self.dedup_index = (
+                self._open_side_index("dedup_index", DedupIndex, self._rebuild_dedup_index)
+                if dedup_policy != "none" else None
             )
 
-            logger.info(f"SessionDB initialized: {db_path} / {collection_name}")
+            logger.debug(f"SessionDB initialized: {db_path} / {collection_name}")
 
+        except ImportError:
+            raise
         except Exception as e:
             logger.error(f"Failed to initialize ChromaDB: {e}", exc_info=True)
             raise DatabaseConnectionError(f"Cannot connect to ChromaDB: {e}")
 
+    @property
+    def client(self):
+        """Shared chromadb.PersistentClient (imports chromadb on first access)."""
+        return self.engine.client
+
+    @property
+    def embedding_function(self):
+        """Shared embedding function (the model loads on its first call)."""
+        return self.engine.embedding_function
+
+    @property
+    def collection(self) -> StorageBackend:
+        """Session collection backend, opened on first access.
+
+        Raises:
+            DatabaseConnectionError: If the storage cannot be opened
+        """
+        try:
+            return self.engine.collection
+        except ImportError:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to open {self.backend} collection: {e}", exc_info=True)
+            raise DatabaseConnectionError(f"Cannot open {self.backend} storage: {e}")
+
+    @property
+    def chunk_collection(self) -> Optional[StorageBackend]:
+        """Chunk-vector collection (None unless chunking is enabled)."""
+        if not self.chunking:
+            return None
+        return self.engine.get_companion_collection(CHUNK_COLLECTION_SUFFIX)
+
+    @property
+    def embedding_cache(self):
+        """Embedding cache shared by this collection (None when disabled)."""
+        if not self.use_embedding_cache:
+            return None
+        return self.engine.get_embedding_cache()
+
+    @property
+    def query_cache(self):
+        """Query result cache shared by this collection (None when disabled)."""
+        if not self.use_query_cache:
+            return None
+        return self.engine.get_query_cache()
+
     def save_session(
         self,
         conversation_text: str,
@@ -137,7 +432,8 @@ class SessionDB:
         topics: List[str] = None,
         artifacts: List[str] = None,
         start_time: datetime = None,
-        end_time: datetime = None
+        end_time: datetime = None,
+        session_id: str = None
     ) -> str:
         """Save a complete session to the vector database.
 
@@ -151,56 +447,482 @@ class SessionDB:
             artifacts: List of created file paths (optional)
             start_time: Session start (default: estimated from now)
             end_time: Session end (default: now)
+            session_id: Pre-assigned ID, e.g. handed out by the capture queue
+                (default: generated)
 
         Returns:
-            session_id: Unique identifier for saved session
+            session_id: Unique identifier for saved session. Under a
+                dedup_policy other than "none", a duplicate is not stored
+                and the ID of the stored session it duplicates is returned
+                instead, which differs from a passed session_id. A session spooled because another
+                process was writing gets its ID now and is stored (or
+                folded) when the lock holder drains the spool.
 
         Raises:
             DatabaseConnectionError: If save fails
         """
-        try:
-            # Generate session ID
+        # Generate session ID
+        if session_id is None:
             session_id = generate_session_id(agent_name)
 
-            # Handle timestamps
-            if end_time is None:
-                end_time = datetime.utcnow()
-            if start_time is None:
-                # Estimate start time (assume 30 min conversation)
-                from datetime import timedelta
-                start_time = end_time - timedelta(minutes=30)
+        with span("save_session", db_path=self.db_path, collection=self.collection_name,
+                  session_id=session_id, agent_name=agent_name) as current:
+            if current:
+                current.set(doc_bytes=len(conversation_text.encode("utf-8")))
+            if not self._begin_write(self.write_lock_wait):
+                self._spool_write({"op": "save", "session": {
+                    "conversation_text": conversation_text,
+                    "agent_name": agent_name,
+                    "agent_persona": agent_persona,
+                    "project_name": project_name,
+                    "workflow": workflow,
+                    "topics": topics,
+                    "artifacts": artifacts,
+                    "start_time": start_time,
+                    "end_time": end_time,
+                    "session_id": session_id,
+                }})
+                current.set(spooled=True)
+                return session_id
+
+            metrics = self.metrics
+            started = time.perf_counter()
+            try:
+                metadata = build_session_metadata(
+                    session_id=session_id,
+                    conversation_text=conversation_text,
+                    agent_name=agent_name,
+                    agent_persona=agent_persona,
+                    project_name=project_name,
+                    workflow=workflow,
+                    topics=topics,
+                    artifacts=artifacts,
+                    start_time=start_time,
+                    end_time=end_time
+                )
+
+                if self.dedup_index is not None:
+                    with metrics.timer("dedup"):
+                        digest, signature = self._fingerprint(conversation_text)
+                        existing_id = self._resolve_duplicate(session_id, digest, signature, metadata)
+                    if existing_id is not None:
+                        metrics.count("duplicates")
+                        current.set(duplicate_of=existing_id)
+                        return existing_id
+
+                # Add to collection
+                embeddings = self._embed([conversation_text])
+                with metrics.timer("store_write"):
+                    self.collection.add(
+                        ids=[session_id],
+                        documents=[conversation_text],
+                        embeddings=embeddings,
+                        metadatas=[metadata]
+                    )
+                    if self.chunking:
+                        self._add_chunks(session_id, conversation_text, metadata)
+
+                with metrics.timer("index"):
+                    if self.lexical_index is not None:
+                        self.lexical_index.add(session_id, conversation_text, metadata)
+                    if self.session_index is not None:
+                        self.session_index.add(session_id, metadata)
+                    if self.dedup_index is not None:
+                        self.dedup_index.add(session_id, digest, signature)
+
+                metrics.count("saves")
+                logger.info(f"Session saved: {session_id} ({metadata['message_count']} messages)")
+                return session_id
+
+            except Exception as e:
+                metrics.count("errors.save")
+                logger.error(f"Failed to save session: {e}", exc_info=True)
+                raise DatabaseConnectionError(f"Cannot save session: {e}")
+            finally:
+                self.engine.bump_generation()
+                self._end_write()
+                metrics.observe("save", time.perf_counter() - started)
+
+    def save_sessions(
+        self,
+        sessions: Iterable[Dict],
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        on_batch: Callable[[List[str], List[Dict]], None] = None
+    ) -> List[str]:
+        """Save many sessions with batched embedding and batched writes.
 
-            # Count messages (rough estimate)
-            message_count = conversation_text.count("\nUser:") + conversation_text.count("\nAssistant:")
+        Each batch is embedded in a single forward pass and written with one
+        collection call, instead of one of each per session. Batches are
+        written with upsert, so re-running a batch with the same session IDs
+        after an interruption does not create duplicates.
 
-            # Build metadata (ChromaDB requires str, int, float only)
-            metadata = {
-                "session_id": session_id,
-                "agent_name": agent_name,
-                "agent_persona": agent_persona,
-                "workflow": workflow,
-                "project_name": project_name,
-                "start_time": start_time.isoformat() + "Z",
-                "end_time": end_time.isoformat() + "Z",
-                "message_count": message_count,
-                "topics": list_to_csv(topics),
-                "artifacts_created": list_to_csv(artifacts),
-                "session_status": "completed"
-            }
+        Args:
+            sessions: Iterable of dicts with save_session keyword arguments
+                (conversation_text, agent_name, agent_persona, project_name,
+                and optionally workflow, topics, artifacts, start_time,
+                end_time, session_id). Consumed lazily.
+            batch_size: Sessions per embedding/write batch
+            on_batch: Callback invoked after each written batch with the
+                batch's session IDs and input dicts (optional)
 
-            # Add to collection
-            self.collection.add(
-                ids=[session_id],
-                documents=[conversation_text],
-                metadatas=[metadata]
-            )
+        Returns:
+            List of saved session IDs in input order (for a session folded
+            into a duplicate, that session's ID; see dedup_policy)
 
-            logger.info(f"Session saved: {session_id} ({message_count} messages)")
-            return session_id
+        Raises:
+            DatabaseConnectionError: If a batch fails (earlier batches stay saved)
+        """
+        saved_ids: List[str] = []
+        batch: List[Dict] = []
+
+        for session in sessions:
+            batch.append(session)
+            if len(batch) >= batch_size:
+                saved_ids.extend(self._save_batch(batch, on_batch))
+                batch = []
+        if batch:
+            saved_ids.extend(self._save_batch(batch, on_batch))
+
+        logger.info(f"Bulk saved {len(saved_ids)} sessions")
+        return saved_ids
+
+    def _save_batch(self, batch: List[Dict], on_batch=None) -> List[str]:
+        """Embed and write one batch for save_sessions."""
+        metrics = self.metrics
+        started = time.perf_counter()
+        self._begin_write()
+        try:
+            saved_ids, ids, documents, metadatas = [], [], [], []
+            # (session_id, content_hash, signature, metadata) of new sessions,
+            # so duplicates within the batch are caught too
+            pending = []
+            for session in batch:
+                session = dict(session)
+                session_id = session.pop("session_id", None) or generate_session_id(session["agent_name"])
+                metadata = build_session_metadata(session_id=session_id, **session)
+                if self.dedup_index is not None:
+                    with metrics.timer("dedup"):
+                        digest, signature = self._fingerprint(session["conversation_text"])
+                        existing_id = self._resolve_duplicate(session_id, digest, signature, metadata, pending)
+                    if existing_id is not None:
+                        metrics.count("duplicates")
+                        saved_ids.append(existing_id)
+                        continue
+                    pending.append((session_id, digest, signature, metadata))
+                saved_ids.append(session_id)
+                ids.append(session_id)
+                documents.append(session["conversation_text"])
+                metadatas.append(metadata)
+
+            if ids:
+                embeddings = self._embed(documents)
+                with metrics.timer("store_write"):
+                    self.collection.upsert(
+                        ids=ids,
+                        documents=documents,
+                        embeddings=embeddings,
+                        metadatas=metadatas
+                    )
+
+            if self.chunking:
+                chunk_ids, chunk_texts, chunk_metadatas = [], [], []
+                chunk_counts = {}
+                for session_id, document, metadata in zip(ids, documents, metadatas):
+                    c_ids, c_texts, c_metadatas = self._chunk_records(session_id, document, metadata)
+                    chunk_ids.extend(c_ids)
+                    chunk_texts.extend(c_texts)
+                    chunk_metadatas.extend(c_metadatas)
+                    chunk_counts[session_id] = len(c_ids)
+                if chunk_counts:
+                    # Upserted sessions may replace longer ones
+                    self._delete_stale_chunks(chunk_counts)
+                if chunk_ids:
+                    chunk_embeddings = self._embed(chunk_texts)
+                    with metrics.timer("store_write"):
+                        self.chunk_collection.upsert(
+                            ids=chunk_ids,
+                            documents=chunk_texts,
+                            embeddings=chunk_embeddings,
+                            metadatas=chunk_metadatas
+                        )
+
+            with metrics.timer("index"):
+                if self.lexical_index is not None:
+                    self.lexical_index.add_many(zip(ids, documents, metadatas))
+                if self.session_index is not None:
+                    self.session_index.add_many(zip(ids, metadatas))
+                if self.dedup_index is not None:
+                    self.dedup_index.add_many(
+                        (session_id, digest, signature) for session_id, digest, signature, _ in pending
+                    )
+
+            metrics.count("saves", len(ids))
+            if on_batch is not None:
+                on_batch(saved_ids, batch)
+            return saved_ids
 
         except Exception as e:
-            logger.error(f"Failed to save session: {e}", exc_info=True)
-            raise DatabaseConnectionError(f"Cannot save session: {e}")
+            metrics.count("errors.save")
+            logger.error(f"Failed to save batch of {len(batch)} sessions: {e}", exc_info=True)
+            raise DatabaseConnectionError(f"Cannot save session batch: {e}")
+        finally:
+            self.engine.bump_generation()
+            self._end_write()
+            metrics.observe("save", time.perf_counter() - started)
+
+    @property
+    def open_sessions(self) -> OpenSessionStore:
+        """Capture state of sessions opened with open_session."""
+        path = str(Path(self.db_path) / f"{self.collection_name}.open_sessions.sqlite3")
+        return self.engine.get_resource("open_sessions", lambda: OpenSessionStore(path))
+
+    def open_session(
+        self,
+        agent_name: str,
+        agent_persona: str,
+        project_name: str,
+        workflow: str = "none",
+        topics: List[str] = None,
+        artifacts: List[str] = None,
+        start_time: datetime = None,
+        session_id: str = None,
+        turns: List[Union[str, Dict]] = None
+    ) -> str:
+        """Start a session that is captured incrementally.
+
+        The session is listed with session_status "in_progress" right away;
+        it becomes searchable by vector with its first turns (append_turns),
+        and by keyword and "completed" with close_session.
+
+        Args:
+            agent_name: Agent identifier (e.g., "architect")
+            agent_persona: Agent display name (e.g., "Winston")
+            project_name: Project name from config
+            workflow: Workflow name or "none"
+            topics: List of topic keywords (optional)
+            artifacts: List of created file paths (optional)
+            start_time: Session start (default: now)
+            session_id: Pre-assigned ID (default: generated)
+            turns: First turns to append (optional, see append_turns)
+
+        Returns:
+            session_id of the open session
+
+        Raises:
+            DatabaseConnectionError: If the session cannot be opened
+        """
+        self._begin_write()
+        try:
+            if session_id is None:
+                session_id = generate_session_id(agent_name)
+            if start_time is None:
+                start_time = datetime.utcnow()
+
+            metadata = build_session_metadata(
+                session_id=session_id,
+                conversation_text="",
+                agent_name=agent_name,
+                agent_persona=agent_persona,
+                project_name=project_name,
+                workflow=workflow,
+                topics=topics,
+                artifacts=artifacts,
+                start_time=start_time,
+                end_time=start_time,
+                session_status="in_progress"
+            )
+            self.open_sessions.open(session_id, metadata)
+            if self.session_index is not None:
+                self.session_index.add(session_id, metadata)
+            logger.info(f"Session opened: {session_id}")
+
+        except Exception as e:
+            logger.error(f"Failed to open session: {e}", exc_info=True)
+            raise DatabaseConnectionError(f"Cannot open session: {e}")
+        finally:
+            self.engine.bump_generation()
+            self._end_write()
+
+        if turns:
+            self.append_turns(session_id, turns)
+        return session_id
+
+    def append_turns(
+        self,
+        session_id: str,
+        turns: List[Union[str, Dict]],
+        end_time: datetime = None
+    ) -> int:
+        """Add turns to an open session and index their vectors.
+
+        Only the still-growing last chunk and the new turns are re-chunked,
+        and only the chunks this completes plus the new last chunk are
+        embedded; the session vector is the normalized sum of the chunk
+        vectors. The collection stores the excerpt as the document until
+        close_session writes the whole conversation and indexes it for
+        keyword search, so the cost of an append does not grow with the
+        session. message_count, end_time and the excerpt are updated in
+        place and session_status stays "in_progress".
+
+        Args:
+            session_id: Session returned by open_session
+            turns: Strings (e.g. "User: ...") or dicts with "role" and
+                "content" (see format_turns)
+            end_time: Time of the last turn (default: now)
+
+        Returns:
+            Number of chunks embedded
+
+        Raises:
+            SessionNotFoundError: If the session is not open
+            DatabaseConnectionError: If the write fails
+        """
+        import numpy as np
+
+        text = format_turns(turns)
+        with self._exclusive_write(), self.engine.lock:
+            state = self.open_sessions.get(session_id)
+            if state is None:
+                raise SessionNotFoundError(f"No open session: {session_id}")
+            if not text:
+                return 0
+
+            try:
+                # The conversation so far is never read back: counts and
+                # the excerpt only depend on it through its start
+                joined = f"\n{text}" if state['text_chars'] else text
+                metadata = dict(
+                    state['metadata'],
+                    end_time=(end_time or datetime.utcnow()).isoformat() + "Z",
+                    message_count=state['metadata']["message_count"] + count_messages(joined),
+                    excerpt=(state['metadata']["excerpt"] + joined)[:EXCERPT_CHARS]
+                )
+
+                # Chunks before the last are final; the last may still grow
+                fresh = chunk_conversation(
+                    state['tail'] + joined if state['tail'] else text,
+                    max_chars=self.chunk_chars, overlap=self.chunk_overlap
+                )
+                if not fresh:
+                    return 0
+                for chunk in fresh:
+                    chunk["chunk_index"] += state['chunks_done']
+                vectors = np.asarray(self._embed([chunk["text"] for chunk in fresh]), dtype=np.float32)
+
+                vector_sum = (
+                    np.frombuffer(state['vector_sum'], dtype=np.float32).copy()
+                    if state['vector_sum'] is not None else np.zeros(vectors.shape[1], dtype=np.float32)
+                )
+                vector_sum += vectors[:-1].sum(axis=0)
+                session_vector = vector_sum + vectors[-1]
+                session_vector /= np.linalg.norm(session_vector) or 1.0
+
+                self.collection.upsert(
+                    ids=[session_id],
+                    documents=[metadata["excerpt"]],
+                    embeddings=[session_vector.tolist()],
+                    metadatas=[metadata]
+                )
+                if self.chunking:
+                    ids, texts, chunk_metadatas = self._chunk_records(session_id, "", metadata, fresh)
+                    self.chunk_collection.upsert(
+                        ids=ids, documents=texts, embeddings=vectors.tolist(), metadatas=chunk_metadatas
+                    )
+                if self.session_index is not None:
+                    self.session_index.add(session_id, metadata)
+
+                self.open_sessions.append(
+                    session_id, text, metadata, fresh[-1]["chunk_index"], fresh[-1]["text"],
+                    vector_sum.tobytes(), session_vector.tobytes()
+                )
+                logger.debug(f"Appended to {session_id}: {len(fresh)} chunks embedded")
+                return len(fresh)
+
+            except Exception as e:
+                logger.error(f"Failed to append to session {session_id}: {e}", exc_info=True)
+                raise DatabaseConnectionError(f"Cannot append to session: {e}")
+            finally:
+                self.engine.bump_generation()
+
+    def close_session(
+        self,
+        session_id: str,
+        topics: List[str] = None,
+        artifacts: List[str] = None,
+        end_time: datetime = None,
+        turns: List[Union[str, Dict]] = None
+    ) -> Optional[str]:
+        """Mark an open session completed.
+
+        The whole conversation is written to the collection and indexed for
+        keyword search and deduplication. Nothing is embedded unless turns
+        are given: the session and chunk vectors were stored by
+        append_turns.
+
+        Args:
+            session_id: Session returned by open_session
+            topics: Topics to add (optional)
+            artifacts: Created file paths to add (optional)
+            end_time: Session end (default: time of the last append)
+            turns: Last turns to append first (optional)
+
+        Returns:
+            session_id, or None if no turns were ever appended (the empty
+            session is discarded)
+
+        Raises:
+            SessionNotFoundError: If the session is not open
+            DatabaseConnectionError: If the write fails
+        """
+        import numpy as np
+
+        if turns:
+            self.append_turns(session_id, turns, end_time=end_time)
+        with self._exclusive_write(), self.engine.lock:
+            state = self.open_sessions.get(session_id)
+            if state is None:
+                raise SessionNotFoundError(f"No open session: {session_id}")
+
+            try:
+                if not state['text_chars']:
+                    if self.session_index is not None:
+                        self.session_index.delete(session_id)
+                    self.open_sessions.delete(session_id)
+                    logger.warning(f"Session {session_id} closed without turns, discarded")
+                    return None
+
+                metadata = dict(state['metadata'], session_status="completed")
+                for key, items in (("topics", topics), ("artifacts_created", artifacts)):
+                    if items:
+                        metadata[key] = list_to_csv(list(dict.fromkeys(csv_to_list(metadata[key]) + list(items))))
+                if end_time is not None:
+                    metadata["end_time"] = end_time.isoformat() + "Z"
+
+                document = self.open_sessions.document(session_id)
+                self.collection.upsert(
+                    ids=[session_id],
+                    documents=[document],
+                    embeddings=[np.frombuffer(state['session_vector'], dtype=np.float32).tolist()],
+                    metadatas=[metadata]
+                )
+                if self.chunking:
+                    # Chunks of an earlier, longer session stored under this ID
+                    self._delete_stale_chunks({session_id: state['chunks_done'] + 1})
+                if self.lexical_index is not None:
+                    self.lexical_index.add(session_id, document, metadata)
+                if self.session_index is not None:
+                    self.session_index.add(session_id, metadata)
+                if self.dedup_index is not None:
+                    self.dedup_index.add(session_id, *self._fingerprint(document))
+                self.open_sessions.delete(session_id)
+                logger.info(f"Session closed: {session_id} ({metadata['message_count']} messages)")
+                return session_id
+
+            except Exception as e:
+                logger.error(f"Failed to close session {session_id}: {e}", exc_info=True)
+                raise DatabaseConnectionError(f"Cannot close session: {e}")
+            finally:
+                self.engine.bump_generation()
 
     def query_sessions(
         self,
@@ -209,10 +931,27 @@ class SessionDB:
         agent_name: str = None,
         workflow: str = None,
         project_name: str = None,
-        min_relevance: float = 0.0
+        min_relevance: float = 0.0,
+        aggregation: str = "max",
+        mode: str = "vector",
+        include: List[str] = None,
+        topics_any: List[str] = None,
+        artifacts_any: List[str] = None,
+        mmr_lambda: float = None
     ) -> List[Dict]:
         """Semantic search across sessions with optional metadata filters.
 
+        In chunking mode the query runs against chunk vectors and hits are
+        aggregated back to one result per session, so n_results still counts
+        sessions.
+
+        Modes:
+            - "vector": dense-vector similarity (default)
+            - "lexical": BM25 keyword search only; never loads the model
+            - "hybrid": both, fused with reciprocal-rank fusion.
+              min_relevance applies to the vector candidates; keyword
+              matches are always admitted.
+
         Args:
             query_text: Natural language query
             n_results: Maximum results to return
@@ -220,56 +959,538 @@ class SessionDB:
             workflow: Filter by workflow (optional)
             project_name: Filter by project (optional)
             min_relevance: Minimum relevance score 0.0-1.0 (optional)
+            aggregation: Chunk score aggregation, "max" or "topk_mean"
+                (chunking mode only)
+            mode: "vector", "lexical" or "hybrid"
+            include: Fields to return, any of "conversation", "metadata",
+                "excerpt" (default: conversation and metadata). Without
+                "conversation" full documents are never loaded; use
+                get_session_by_id() to fetch one on demand.
+            topics_any: Only sessions tagged with any of these topics (optional)
+            artifacts_any: Only sessions that created any of these files (optional)
+            mmr_lambda: Rerank MMR_OVERFETCH x n_results candidates by
+                maximal marginal relevance on their stored embeddings, so
+                near-duplicate sessions do not fill every slot. 1.0 ranks by
+                relevance only, lower values favour diversity (default: off)
 
         Returns:
             List of dicts with keys:
                 - session_id: str
-                - conversation: str (full text)
-                - metadata: dict
-                - distance: float (lower = more similar)
-                - relevance_score: float (1 - distance, higher = more relevant)
+                - conversation: str (full text, if included)
+                - metadata: dict (if included)
+                - excerpt: str (if included; best chunk or session opening,
+                  at most EXCERPT_CHARS)
+                - distance: float (lower = more similar, in the backend's
+                  distance space)
+                - relevance_score: float 0.0-1.0 (cosine similarity in
+                  vector mode whatever the distance space; best hit = 1.0
+                  scaled in lexical/hybrid mode)
+                - best_chunk: str (chunking mode only, best-matching passage)
+
+        Raises:
+            ConfigurationError: If mode, aggregation or include is invalid,
+                the lexical index is disabled for a lexical/hybrid query, or
+                the session index is disabled for a topic/artifact filter
         """
-        try:
-            # Build where clause for filtering
-            where = {}
-            if agent_name:
-                where["agent_name"] = agent_name
-            if workflow:
-                where["workflow"] = workflow
-            if project_name:
-                where["project_name"] = project_name
-
-            # Query ChromaDB
+        return self.query_sessions_batch(
+            [query_text],
+            n_results=n_results,
+            agent_name=agent_name,
+            workflow=workflow,
+            project_name=project_name,
+            min_relevance=min_relevance,
+            aggregation=aggregation,
+            mode=mode,
+            include=include,
+            topics_any=topics_any,
+            artifacts_any=artifacts_any,
+            mmr_lambda=mmr_lambda
+        )[0]
+
+    def query_sessions_batch(
+        self,
+        query_texts: List[str],
+        n_results: int = 5,
+        agent_name: str = None,
+        workflow: str = None,
+        project_name: str = None,
+        min_relevance: float = 0.0,
+        aggregation: str = "max",
+        mode: str = "vector",
+        include: List[str] = None,
+        topics_any: List[str] = None,
+        artifacts_any: List[str] = None,
+        mmr_lambda: float = None,
+        merge: bool = False
+    ) -> List:
+        """Run several queries with the same filters in one pass.
+
+        All query texts are embedded in one batch and searched with a single
+        multi-query collection call (topic/artifact prefilters are resolved
+        once). Keyword search in "lexical"/"hybrid" mode still runs per
+        query, since it needs no embedding.
+
+        Args:
+            query_texts: Natural language queries, e.g. one per facet
+                (workflow, current story, open files)
+            merge: Return one merged ranking instead of a list per query
+                (see merge_ranked_results); MMR reranks the merged list
+            (other arguments as in query_sessions)
+
+        Returns:
+            One result list per query text, in order (same result dicts as
+            query_sessions); or, with merge=True, a single list of at most
+            n_results sessions, deduplicated across queries, each with
+            "matched_queries" (indexes of the queries that found it)
+
+        Raises:
+            ConfigurationError: As in query_sessions
+        """
+        with span("query_sessions", db_path=self.db_path, collection=self.collection_name,
+                  n_results=n_results, mode=mode,
+                  filters={"agent_name": agent_name, "workflow": workflow, "project_name": project_name,
+                           "topics_any": topics_any, "artifacts_any": artifacts_any}) as current:
+            include = list(DEFAULT_INCLUDE if include is None else include)
+            unknown = [field for field in include if field not in INCLUDE_FIELDS]
+            if unknown:
+                raise ConfigurationError(f"Unknown include fields {unknown}, expected {INCLUDE_FIELDS}")
+            with_documents = "conversation" in include
+
+            if mode not in QUERY_MODES:
+                raise ConfigurationError(f"Unknown query mode '{mode}', expected one of {QUERY_MODES}")
+            if mode != "vector" and self.lexical_index is None:
+                raise ConfigurationError(f"Query mode '{mode}' requires the lexical index")
+            if (topics_any or artifacts_any) and self.session_index is None:
+                raise ConfigurationError("Topic/artifact filters require the session index")
+
+            query_texts = list(query_texts)
+            current.set(queries=len(query_texts))
+            no_results = [] if merge else [[] for _ in query_texts]
+            if not query_texts:
+                return no_results
+
+            # Repeated identical queries are served from the cache until a write
+            cache = self.query_cache
+            cache_key = (
+                "query", tuple(query_texts), n_results, agent_name, workflow, project_name,
+                min_relevance, aggregation, mode, tuple(include),
+                tuple(topics_any or ()), tuple(artifacts_any or ()), mmr_lambda, merge
+            )
+            metrics = self.metrics
+            metrics.count("queries", len(query_texts))
+            generation = self.engine.generation
+            if cache is not None:
+                cached = cache.get(cache_key, generation)
+                if cached is not None:
+                    metrics.count("query_cache_hits")
+                    current.set(cache_hit=True)
+                    logger.debug(f"Query served from cache ({mode})")
+                    return cached
+
+            started = time.perf_counter()
+            candidates = n_results * MMR_OVERFETCH if mmr_lambda is not None else n_results
+            filters = {
+                "agent_name": agent_name,
+                "workflow": workflow,
+                "project_name": project_name
+            }
+
+            try:
+                # Prefilter through the inverted index
+                if topics_any or artifacts_any:
+                    with metrics.timer("prefilter"):
+                        candidate_ids = self.session_index.session_ids_for(
+                            topics_any=topics_any, artifacts_any=artifacts_any
+                        )
+                    current.set(prefilter_candidates=len(candidate_ids))
+                    if not candidate_ids:
+                        logger.info("Query returned 0 results (no sessions match topic/artifact filters)")
+                        return no_results
+                    filters["session_id"] = sorted(candidate_ids)
+
+                if mode == "lexical":
+                    with metrics.timer("lexical"):
+                        results_per_query = [
+                            self._query_lexical(query_text, candidates, filters, with_documents)
+                            for query_text in query_texts
+                        ]
+                elif mode == "hybrid":
+                    fetch = candidates * HYBRID_OVERFETCH
+                    vector_results = self._query_vector_filtered(
+                        query_texts, fetch, filters, min_relevance, aggregation, with_documents
+                    )
+                    with metrics.timer("lexical"):
+                        results_per_query = [
+                            self._fuse(
+                                vector_results[i],
+                                self._query_lexical(query_text, fetch, filters, with_documents),
+                                candidates
+                            )
+                            for i, query_text in enumerate(query_texts)
+                        ]
+                else:
+                    results_per_query = self._query_vector_filtered(
+                        query_texts, candidates, filters, min_relevance, aggregation, with_documents
+                    )
+
+                if merge:
+                    results_per_query = [merge_ranked_results(results_per_query, candidates)]
+                if mmr_lambda is not None:
+                    results_per_query = self._rerank_mmr(results_per_query, n_results, mmr_lambda)
+
+                with metrics.timer("format"):
+                    if merge:
+                        results = self._project(results_per_query[0], include)
+                    else:
+                        # Project all lists at once so legacy excerpts are fetched in one call
+                        self._project([result for results in results_per_query for result in results], include)
+                        results = results_per_query
+                result_count = sum(len(results) for results in results_per_query)
+                current.set(results=result_count)
+                if merge:
+                    logger.info(f"Query returned {result_count} merged results for {len(query_texts)} queries ({mode})")
+                else:
+                    logger.info(f"Query returned {result_count} results for {len(query_texts)} queries ({mode})")
+
+            except ConfigurationError:
+                raise
+            except Exception as e:
+                metrics.count("errors.query")
+                logger.error(f"Query failed: {e}", exc_info=True)
+                return no_results
+
+            elapsed = time.perf_counter() - started
+            metrics.observe("query", elapsed)
+            metrics.slow_query(
+                elapsed, query_texts, mode=mode, n_results=n_results, results=result_count,
+                filters={key: value for key, value in filters.items() if value is not None},
+                topics_any=topics_any, artifacts_any=artifacts_any, collection=self.collection_name
+            )
+            if cache is not None:
+                cache.put(cache_key, results, generation, elapsed)
+            return results
+
+    def _rerank_mmr(self, results_per_query: List[List[Dict]], n_results: int,
+                    lambda_: float) -> List[List[Dict]]:
+        """Keep n_results per list, chosen by MMR over stored session embeddings.
+
+        Embeddings of every candidate are fetched in one call.
+        """
+        import numpy as np
+        from mmr import mmr_select
+
+        session_ids = list(dict.fromkeys(
+            result["session_id"] for results in results_per_query for result in results
+        ))
+        if not session_ids:
+            return results_per_query
+        stored = self.collection.get(ids=session_ids, include=["embeddings"])
+        vectors = {
+            session_id: np.asarray(embedding, dtype=np.float32)
+            for session_id, embedding in zip(stored['ids'], stored['embeddings'])
+        }
+
+        reranked = []
+        for results in results_per_query:
+            candidates = [result for result in results if result["session_id"] in vectors]
+            if not candidates:
+                reranked.append(results[:n_results])
+                continue
+            matrix = np.vstack([vectors[result["session_id"]] for result in candidates])
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.where(norms > 0, norms, 1.0)
+            order = mmr_select(
+                [result["relevance_score"] for result in candidates],
+                matrix,
+                k=n_results,
+                lambda_=lambda_
+            )
+            reranked.append([candidates[i] for i in order])
+        return reranked
+
+    @staticmethod
+    def _vector_where(filters: Dict) -> Optional[Dict]:
+        """ChromaDB where clause for query filters (session_id list -> $in)."""
+        filters = dict(filters)
+        session_ids = filters.pop("session_id", None)
+        if session_ids:
+            filters["session_id"] = {"$in": session_ids}
+        return build_where(**filters)
+
+    def _query_vector_filtered(
+        self,
+        query_texts: List[str],
+        n_results: int,
+        filters: Dict,
+        min_relevance: float,
+        aggregation: str,
+        with_documents: bool = True
+    ) -> List[List[Dict]]:
+        """_query_vector for query filters, searching long ID lists in slices.
+
+        ChromaDB binds every ID of an $in list as an SQL variable and fails
+        past SQLite's limit, so a prefilter with more than
+        PREFILTER_SLICE_IDS sessions is searched one slice at a time and
+        the best hits of all slices are kept. Sessions (and their chunks)
+        fall in exactly one slice, so the merged ranking is exact.
+        """
+        session_ids = filters.get("session_id")
+        if not session_ids or len(session_ids) <= PREFILTER_SLICE_IDS:
+            return self._query_vector(
+                query_texts, n_results, self._vector_where(filters), min_relevance, aggregation, with_documents
+            )
+
+        merged: List[List[Dict]] = [[] for _ in query_texts]
+        for start in range(0, len(session_ids), PREFILTER_SLICE_IDS):
+            where = self._vector_where(dict(filters, session_id=session_ids[start:start + PREFILTER_SLICE_IDS]))
+            sliced = self._query_vector(query_texts, n_results, where, min_relevance, aggregation, with_documents)
+            for results, more in zip(merged, sliced):
+                results.extend(more)
+        return [
+            sorted(results, key=lambda result: result["relevance_score"], reverse=True)[:n_results]
+            for results in merged
+        ]
+
+    def _query_vector(
+        self,
+        query_texts: List[str],
+        n_results: int,
+        where: Optional[Dict],
+        min_relevance: float,
+        aggregation: str,
+        with_documents: bool = True
+    ) -> List[List[Dict]]:
+        """Dense-vector search over whole sessions or chunks, one list per query."""
+        if self.chunking:
+            return self._query_chunks(
+                query_texts, n_results, where, min_relevance, aggregation, with_documents
+            )
+
+        # Query all texts in one call (documents only when the caller wants full text)
+        include = ["metadatas", "distances"] + (["documents"] if with_documents else [])
+        embeddings = self._embed(query_texts)
+        with self.metrics.timer("store_query"):
             results = self.collection.query(
-                query_texts=[query_text],
+                query_embeddings=embeddings,
                 n_results=n_results,
-                where=where if where else None
+                where=where,
+                include=include
             )
 
-            # Format results
+        # Format results (hits are nearest-first, so the threshold cuts a tail)
+        space = self.collection.space
+        results_per_query = []
+        for q in range(len(query_texts)):
             formatted_results = []
-            if results and results['ids'] and results['ids'][0]:
-                for i in range(len(results['ids'][0])):
-                    distance = results['distances'][0][i]
-                    relevance = 1.0 - distance
+            if results and results['ids'] and q < len(results['ids']):
+                for i in range(len(results['ids'][q])):
+                    distance = results['distances'][q][i]
+                    relevance = distance_to_relevance(distance, space)
 
                     # Filter by minimum relevance
                     if relevance >= min_relevance:
-                        formatted_results.append({
-                            "session_id": results['ids'][0][i],
-                            "conversation": results['documents'][0][i],
-                            "metadata": results['metadatas'][0][i],
+                        result = {
+                            "session_id": results['ids'][q][i],
+                            "metadata": results['metadatas'][q][i],
                             "distance": distance,
                             "relevance_score": relevance
-                        })
+                        }
+                        if with_documents:
+                            result["conversation"] = results['documents'][q][i]
+                        formatted_results.append(result)
+            results_per_query.append(formatted_results)
 
-            logger.info(f"Query returned {len(formatted_results)} results")
-            return formatted_results
+        return results_per_query
 
-        except Exception as e:
-            logger.error(f"Query failed: {e}", exc_info=True)
+    def _query_lexical(
+        self,
+        query_text: str,
+        n_results: int,
+        filters: Dict,
+        with_documents: bool = True
+    ) -> List[Dict]:
+        """BM25 search; scores are scaled so the best hit is 1.0."""
+        filters = dict(filters)
+        session_ids = filters.pop("session_id", None)
+        hits = self.lexical_index.search(
+            query_text, limit=n_results, session_ids=session_ids, **filters
+        )
+        if not hits:
             return []
 
+        top_score = hits[0][1] or 1.0
+        by_id = self._fetch_sessions([session_id for session_id, _ in hits], with_documents)
+
+        formatted_results = []
+        for session_id, score in hits:
+            if session_id not in by_id:
+                continue  # Index entry outlived its session
+            document, metadata = by_id[session_id]
+            relevance = max(0.0, min(1.0, score / top_score))
+            result = {
+                "session_id": session_id,
+                "metadata": metadata,
+                "distance": 1.0 - relevance,
+                "relevance_score": relevance
+            }
+            if with_documents:
+                result["conversation"] = document
+            formatted_results.append(result)
+        return formatted_results
+
+    def _fetch_sessions(self, session_ids: List[str], with_documents: bool) -> Dict:
+        """Fetch {session_id: (document or None, metadata)} in one call."""
+        include = ["metadatas"] + (["documents"] if with_documents else [])
+        results = self.collection.get(ids=session_ids, include=include)
+        return {
+            results['ids'][i]: (
+                results['documents'][i] if with_documents else None,
+                results['metadatas'][i]
+            )
+            for i in range(len(results['ids']))
+        }
+
+    def _project(self, results: List[Dict], include: List[str]) -> List[Dict]:
+        """Add bounded excerpts and drop fields the caller did not ask for.
+
+        Excerpts come from the best-matching chunk, the excerpt stored in
+        metadata, or the included conversation. Sessions saved before
+        excerpts were stored are fetched lazily, in one call, and truncated.
+        """
+        if "excerpt" in include:
+            legacy_ids = []
+            for result in results:
+                excerpt = (
+                    result.get("best_chunk")
+                    or result["metadata"].get("excerpt")
+                    or result.get("conversation")
+                )
+                if excerpt is None:
+                    legacy_ids.append(result["session_id"])
+                else:
+                    result["excerpt"] = excerpt[:EXCERPT_CHARS]
+
+            if legacy_ids:
+                documents = self._fetch_sessions(legacy_ids, with_documents=True)
+                for result in results:
+                    if "excerpt" not in result and result["session_id"] in documents:
+                        result["excerpt"] = (documents[result["session_id"]][0] or "")[:EXCERPT_CHARS]
+
+        if "metadata" not in include:
+            for result in results:
+                result.pop("metadata", None)
+        return results
+
+    def _fuse(self, vector_results: List[Dict], lexical_results: List[Dict], n_results: int) -> List[Dict]:
+        """Reciprocal-rank fusion of vector and lexical result lists."""
+        by_id = {result["session_id"]: result for result in lexical_results}
+        by_id.update({result["session_id"]: result for result in vector_results})
+
+        fused = reciprocal_rank_fusion([
+            [result["session_id"] for result in vector_results],
+            [result["session_id"] for result in lexical_results],
+        ])[:n_results]
+        if not fused:
+            return []
+
+        # Scale so a hit ranked first in both lists scores 1.0
+        best_possible = 2.0 / (RRF_K + 1)
+        formatted_results = []
+        for session_id, score in fused:
+            result = dict(by_id[session_id])
+            result["relevance_score"] = min(1.0, score / best_possible)
+            result["distance"] = 1.0 - result["relevance_score"]
+            formatted_results.append(result)
+        return formatted_results
+
+    def score_passages(
+        self,
+        query_texts: List[str],
+        session_ids: List[str],
+        max_passages: int = PASSAGE_MAX_CANDIDATES
+    ) -> List[Dict]:
+        """Score the passages of some sessions against one or more queries.
+
+        In chunking mode the stored chunk vectors of those sessions are
+        searched. Otherwise the sessions are split into PASSAGE_CHARS
+        passages on the fly; when there are more than max_passages, those
+        sharing the most words with the queries are kept, and they are
+        embedded in one batch (repeats come from the embedding cache).
+
+        Args:
+            query_texts: Queries to score against (best score counts)
+            session_ids: Sessions whose passages are candidates
+            max_passages: Maximum passages returned
+
+        Returns:
+            List of dicts, best first, with keys session_id, chunk_index,
+            text, relevance (cosine similarity 0.0-1.0) and embedding
+            (unit-length numpy vector)
+        """
+        import numpy as np
+
+        if not query_texts or not session_ids:
+            return []
+        query_vectors = np.vstack(self._embed(list(query_texts)))
+
+        passages = []
+        if self.chunking:
+            results = self.chunk_collection.query(
+                query_embeddings=list(query_vectors),
+                n_results=max_passages,
+                where={"session_id": {"$in": list(session_ids)}},
+                include=["documents", "metadatas", "embeddings"]
+            )
+            seen = set()
+            for q in range(len(results['ids'])):
+                for i, passage_id in enumerate(results['ids'][q]):
+                    if passage_id in seen:
+                        continue
+                    seen.add(passage_id)
+                    passages.append({
+                        "session_id": results['metadatas'][q][i]["session_id"],
+                        "chunk_index": results['metadatas'][q][i]["chunk_index"],
+                        "text": results['documents'][q][i],
+                        "embedding": np.asarray(results['embeddings'][q][i], dtype=np.float32)
+                    })
+        else:
+            by_id = self._fetch_sessions(list(session_ids), with_documents=True)
+            for session_id in session_ids:
+                if session_id not in by_id:
+                    continue
+                for chunk in chunk_conversation(by_id[session_id][0] or "", max_chars=PASSAGE_CHARS, overlap=0):
+                    passages.append({
+                        "session_id": session_id,
+                        "chunk_index": chunk["chunk_index"],
+                        "text": chunk["text"],
+                    })
+            if len(passages) > max_passages:
+                query_words = set(re.findall(r"\w+", " ".join(query_texts).lower()))
+                passages.sort(
+                    key=lambda passage: len(query_words.intersection(re.findall(r"\w+", passage["text"].lower()))),
+                    reverse=True
+                )
+                passages = passages[:max_passages]
+            if passages:
+                embeddings = self._embed([passage["text"] for passage in passages])
+                for passage, embedding in zip(passages, embeddings):
+                    passage["embedding"] = embedding
+
+        if not passages:
+            return []
+
+        # Stored vectors from older collections may not be unit length
+        matrix = np.vstack([passage["embedding"] for passage in passages])
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms > 0, norms, 1.0)
+        relevance = (matrix @ query_vectors.T).max(axis=1)
+        for passage, vector, score in zip(passages, matrix, relevance):
+            passage["embedding"] = vector
+            passage["relevance"] = max(0.0, min(1.0, float(score)))
+
+        passages.sort(key=lambda passage: passage["relevance"], reverse=True)
+        return passages[:max_passages]
+
     def get_session_by_id(self, session_id: str) -> Dict:
         """Retrieve a specific session by ID.
 
@@ -277,7 +1498,8 @@ class SessionDB:
             session_id: Session identifier
 
         Returns:
-            Dict with session_id, conversation, metadata
+            Dict with session_id, conversation, metadata (for an open
+            session, the conversation appended so far)
 
         Raises:
             SessionNotFoundError: If session doesn't exist
@@ -286,11 +1508,19 @@ class SessionDB:
             results = self.collection.get(ids=[session_id])
 
             if not results or not results['ids']:
-                raise SessionNotFoundError(f"Session not found: {session_id}")
-
+                # Opened sessions are only stored with their first turns
+                state = self.open_sessions.get(session_id)
+                if state is None:
+                    raise SessionNotFoundError(f"Session not found: {session_id}")
+                return {"session_id": session_id, "conversation": "", "metadata": state['metadata']}
+
+            conversation = results['documents'][0]
+            if results['metadatas'][0].get("session_status") == "in_progress":
+                # Only the excerpt is stored until close_session
+                conversation = self.open_sessions.document(session_id) or conversation
             return {
                 "session_id": results['ids'][0],
-                "conversation": results['documents'][0],
+                "conversation": conversation,
                 "metadata": results['metadatas'][0]
             }
 
@@ -305,33 +1535,86 @@ class SessionDB:
         agent_name: str = None,
         workflow: str = None,
         project_name: str = None,
-        limit: int = 10
+        limit: int = 10,
+        since: Union[str, datetime] = None,
+        until: Union[str, datetime] = None,
+        cursor: str = None
     ) -> List[Dict]:
-        """List sessions with metadata filtering (no semantic search).
+        """List sessions newest-first with metadata filtering (no semantic search).
+
+        Served from the session index (ordered by end_time) without touching
+        ChromaDB. With the index disabled, falls back to an unordered
+        collection scan that ignores since/until/cursor.
 
         Args:
             agent_name: Filter by agent (optional)
             workflow: Filter by workflow (optional)
             project_name: Filter by project (optional)
             limit: Maximum results
+            since: Only sessions that ended at or after this time (optional)
+            until: Only sessions that ended before this time (optional)
+            cursor: Continue after a previous page (see list_sessions_page)
 
         Returns:
             List of session metadata dicts (no conversation text)
         """
+        page = self.list_sessions_page(
+            agent_name=agent_name,
+            workflow=workflow,
+            project_name=project_name,
+            limit=limit,
+            since=since,
+            until=until,
+            cursor=cursor
+        )
+        return page["sessions"]
+
+    def list_sessions_page(
+        self,
+        agent_name: str = None,
+        workflow: str = None,
+        project_name: str = None,
+        limit: int = 10,
+        since: Union[str, datetime] = None,
+        until: Union[str, datetime] = None,
+        cursor: str = None
+    ) -> Dict:
+        """Return one newest-first page of sessions plus a cursor for the next.
+
+        Args:
+            Same as list_sessions
+
+        Returns:
+            Dict with keys:
+                - sessions: list of {session_id, metadata}
+                - next_cursor: str, or None on the last page
+        """
         try:
+            if self.session_index is not None:
+                sessions, next_cursor = self.session_index.page(
+                    limit=limit,
+                    cursor=cursor,
+                    since=since,
+                    until=until,
+                    agent_name=agent_name,
+                    workflow=workflow,
+                    project_name=project_name
+                )
+                logger.info(f"Listed {len(sessions)} sessions")
+                return {"sessions": sessions, "next_cursor": next_cursor}
+
             # Build where clause
-            where = {}
-            if agent_name:
-                where["agent_name"] = agent_name
-            if workflow:
-                where["workflow"] = workflow
-            if project_name:
-                where["project_name"] = project_name
+            where = build_where(
+                agent_name=agent_name,
+                workflow=workflow,
+                project_name=project_name
+            )
 
             # Get sessions
-            results = self.collection.get(
-                where=where if where else None,
-                limit=limit
+            results = self.collection.list(
+                limit=limit,
+                where=where,
+                include=["metadatas"]
             )
 
             # Format results (metadata only)
@@ -343,12 +1626,53 @@ class SessionDB:
                         "metadata": results['metadatas'][i]
                     })
 
-            logger.info(f"Listed {len(sessions)} sessions")
-            return sessions
+            logger.info(f"Listed {len(sessions)} sessions (unordered)")
+            return {"sessions": sessions, "next_cursor": None}
 
         except Exception as e:
             logger.error(f"Failed to list sessions: {e}", exc_info=True)
-            return []
+            return {"sessions": [], "next_cursor": None}
+
+    def iter_session_pages(
+        self,
+        page_size: int = 100,
+        **filters
+    ) -> Iterator[List[Dict]]:
+        """Stream newest-first pages of sessions until the index is exhausted.
+
+        Args:
+            page_size: Sessions per page
+            **filters: agent_name, workflow, project_name, since, until
+
+        Yields:
+            Lists of {session_id, metadata}
+        """
+        cursor = None
+        while True:
+            page = self.list_sessions_page(limit=page_size, cursor=cursor, **filters)
+            if page["sessions"]:
+                yield page["sessions"]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+
+    def sessions_touching(self, path_prefix: str, limit: int = 50) -> List[Dict]:
+        """Find sessions that created a file or files under a directory, newest first.
+
+        Args:
+            path_prefix: File or directory path, matched on whole segments
+                (e.g. "src/app/api/webhooks/stripe/route.ts" or "src/app/api")
+            limit: Maximum sessions
+
+        Returns:
+            List of dicts with session_id, metadata and matched_artifacts
+
+        Raises:
+            ConfigurationError: If the session index is disabled
+        """
+        if self.session_index is None:
+            raise ConfigurationError("sessions_touching requires the session index")
+        return self.session_index.sessions_touching(path_prefix, limit=limit)
 
     def delete_session(self, session_id: str) -> bool:
         """Delete a session from the database.
@@ -357,12 +1681,658 @@ class SessionDB:
             session_id: Session to delete
 
         Returns:
-            True if deleted, False if not found
+            True if deleted (or spooled while another process was writing),
+            False if the delete failed
         """
+        if not self._begin_write(self.write_lock_wait):
+            self._spool_write({"op": "delete", "session_id": session_id})
+            return True
+
         try:
             self.collection.delete(ids=[session_id])
+            if self.chunking:
+                self.chunk_collection.delete(where={"session_id": session_id})
+            if self.lexical_index is not None:
+                self.lexical_index.delete(session_id)
+            if self.session_index is not None:
+                self.session_index.delete(session_id)
+            if self.dedup_index is not None:
+                self.dedup_index.delete(session_id)
+            self.open_sessions.delete(session_id)
             logger.info(f"Session deleted: {session_id}")
             return True
         except Exception as e:
             logger.warning(f"Failed to delete session {session_id}: {e}")
             return False
+        finally:
+            self.engine.bump_generation()
+            self._end_write()
+
+    def deduplicate(self, policy: str = "merge", threshold: float = None, dry_run: bool = True) -> Dict:
+        """Find duplicate sessions already stored and optionally fold them.
+
+        Sessions are grouped greedily in storage order: each joins the group
+        of the first earlier session it duplicates. The longest conversation
+        of a group is kept.
+
+        Args:
+            policy: "skip" deletes the other copies, "merge" first folds
+                their metadata into the kept session, "revision" deletes exact
+                copies but only links near duplicates with "revision_of"
+            threshold: Near-duplicate similarity (default: dedup_threshold)
+            dry_run: Only report what would change
+
+        Returns:
+            Report dict with sessions, groups, exact_duplicates,
+            near_duplicates, removed and linked session IDs, and the
+            estimated bytes_reclaimed by the removals
+
+        Raises:
+            ConfigurationError: If the policy is unknown
+        """
+        if policy not in DEDUP_POLICIES or policy == "none":
+            raise ConfigurationError(f"Unknown dedup policy '{policy}'")
+        if threshold is None:
+            threshold = self.dedup_threshold
+
+        scratch = DedupIndex(":memory:")
+        group_of: Dict[str, str] = {}
+        groups: Dict[str, List[str]] = {}
+        digests: Dict[str, str] = {}
+        sizes: Dict[str, int] = {}
+        lengths: Dict[str, int] = {}
+        for page in self._iter_collection(["documents", "metadatas"]):
+            for session_id, document, metadata in zip(page['ids'], page['documents'], page['metadatas']):
+                digest, signature = self._fingerprint(document)
+                digests[session_id] = digest
+                lengths[session_id] = len(document)
+                sizes[session_id] = len(document.encode("utf-8")) + len(json.dumps(metadata))
+
+                matches = scratch.find_exact(digest) or [
+                    other_id for other_id, _ in scratch.find_near(signature, threshold)
+                ]
+                group = group_of[matches[0]] if matches else session_id
+                group_of[session_id] = group
+                groups.setdefault(group, []).append(session_id)
+                scratch.add(session_id, digest, signature)
+        scratch.close()
+
+        merges: Dict[str, List[str]] = {}
+        removed, linked = [], []
+        exact_count = near_count = 0
+        for members in groups.values():
+            if len(members) < 2:
+                continue
+            keeper = max(members, key=lambda session_id: lengths[session_id])
+            for session_id in members:
+                if session_id == keeper:
+                    continue
+                exact = digests[session_id] == digests[keeper]
+                exact_count += exact
+                near_count += not exact
+                if policy == "revision" and not exact:
+                    linked.append((session_id, keeper))
+                    continue
+                removed.append(session_id)
+                if policy == "merge":
+                    merges.setdefault(keeper, []).append(session_id)
+
+        bytes_reclaimed = sum(sizes[session_id] for session_id in removed)
+        if removed:
+            sample = self.collection.get(ids=removed[:1], include=["embeddings"])
+            bytes_reclaimed += len(removed) * len(sample['embeddings'][0]) * 4
+            if self.chunking:
+                chunks = self.chunk_collection.get(
+                    where={"session_id": {"$in": removed}}, include=["documents"]
+                )
+                bytes_reclaimed += sum(
+                    len(text.encode("utf-8")) + 4 * len(sample['embeddings'][0])
+                    for text in chunks['documents']
+                )
+
+        if not dry_run:
+            with self._exclusive_write():
+                for keeper, sources in merges.items():
+                    page = self.collection.get(ids=[keeper] + sources, include=["metadatas"])
+                    found = dict(zip(page['ids'], page['metadatas']))
+                    merged = found[keeper]
+                    for session_id in sources:
+                        merged = merge_session_metadata(merged, found[session_id])
+                    self._update_metadata(keeper, merged)
+                for session_id, keeper in linked:
+                    page = self.collection.get(ids=[session_id], include=["metadatas"])
+                    self._update_metadata(session_id, {**page['metadatas'][0], "revision_of": keeper})
+                for session_id in removed:
+                    self.delete_session(session_id)
+                self.engine.bump_generation()
+
+        report = {
+            "sessions": len(digests),
+            "groups": sum(1 for members in groups.values() if len(members) > 1),
+            "exact_duplicates": exact_count,
+            "near_duplicates": near_count,
+            "removed": removed,
+            "linked": [session_id for session_id, _ in linked],
+            "bytes_reclaimed": bytes_reclaimed,
+            "dry_run": dry_run,
+        }
+        logger.info(
+            f"Dedup {'(dry run) ' if dry_run else ''}{policy}: {exact_count} exact and "
+            f"{near_count} near duplicates in {len(digests)} sessions, "
+            f"{len(removed)} removed, ~{bytes_reclaimed} bytes reclaimed"
+        )
+        return report
+
+    # Write coordination
+
+    @property
+    def write_lock(self) -> Optional[WriterLock]:
+        """Inter-process writer lock of this collection (None when disabled)."""
+        if not self.use_write_lock:
+            return None
+        path = str(Path(self.db_path) / f"{self.collection_name}.write.lock")
+        return self.engine.get_resource("write_lock", lambda: WriterLock(path))
+
+    @property
+    def write_spool(self) -> WriteSpool:
+        """Writes queued by processes that could not take the writer lock."""
+        path = str(Path(self.db_path) / f"{self.collection_name}.write-spool")
+        return self.engine.get_resource("write_spool", lambda: WriteSpool(path))
+
+    def flush_write_spool(self) -> int:
+        """Apply spooled writes now, waiting for the writer lock.
+
+        Returns:
+            Number of spooled writes applied
+        """
+        lock = self.write_lock
+        if lock is None:
+            return 0
+        lock.acquire()
+        try:
+            return self._drain_spool()
+        finally:
+            lock.release()
+
+    def _begin_write(self, timeout: Optional[float] = None) -> bool:
+        """Take the writer lock; the outermost acquire drains the spool first.
+
+        Args:
+            timeout: Seconds to wait for another process's write (None: no limit)
+
+        Returns:
+            True if the caller may write (always when the lock is disabled),
+            False if the lock stayed taken and the write should be spooled
+        """
+        lock = self.write_lock
+        if lock is None:
+            return True
+        if not lock.acquire(timeout):
+            return False
+        if lock.depth == 1:
+            self._drain_spool()
+        return True
+
+    def _end_write(self) -> None:
+        """Release the writer lock taken by _begin_write."""
+        lock = self.write_lock
+        if lock is None:
+            return
+        lock.release()
+        self._drain_if_free()
+
+    @contextmanager
+    def _exclusive_write(self):
+        """Hold the writer lock for a block of writes."""
+        self._begin_write()
+        try:
+            yield
+        finally:
+            self._end_write()
+
+    def _spool_write(self, entry: Dict) -> None:
+        """Queue a write for the current lock holder."""
+        path = self.write_spool.append(entry)
+        logger.info(f"Writer lock busy, {entry['op']} spooled as {path.name}")
+        # The holder may have checked the spool just before this entry landed
+        self._drain_if_free()
+
+    def _drain_if_free(self) -> None:
+        """Drain the spool while it has entries and the lock is free.
+
+        Called after releasing the lock and after spooling: an entry spooled
+        while the holder was finishing is applied by whichever of the two
+        gets the lock next, instead of waiting for the next write.
+        """
+        lock = self.write_lock
+        spool = self.write_spool
+        while lock.depth == 0 and spool.pending() and lock.acquire(timeout=0):
+            try:
+                drained = self._drain_spool()
+            finally:
+                lock.release()
+            if not drained:
+                break
+
+    def _drain_spool(self) -> int:
+        """Apply spooled writes in order (the caller holds the writer lock).
+
+        Consecutive saves are written as save_sessions batches: one
+        embedding pass and one collection write per batch. An entry whose
+        write fails stays spooled and draining stops there, so later
+        entries are not applied ahead of it.
+
+        Returns:
+            Number of entries applied
+        """
+        spool = self.write_spool
+        applied = 0
+        saves, save_paths = [], []
+
+        def flush_saves() -> None:
+            nonlocal applied
+            if saves:
+                self._save_batch(saves)
+                spool.remove(save_paths)
+                applied += len(saves)
+                saves.clear()
+                save_paths.clear()
+
+        try:
+            for path in spool.pending():
+                entry = spool.load(path)
+                if entry is None:
+                    continue
+                op = entry.get("op")
+                if op == "save":
+                    saves.append(entry["session"])
+                    save_paths.append(path)
+                    if len(saves) >= DEFAULT_BATCH_SIZE:
+                        flush_saves()
+                elif op == "delete":
+                    flush_saves()
+                    if not self.delete_session(entry["session_id"]):
+                        break
+                    spool.remove([path])
+                    applied += 1
+                else:
+                    logger.error(f"Unknown spool operation {op!r} in {path.name}, skipped")
+                    spool.remove([path])
+            flush_saves()
+        except Exception as e:
+            # Best effort: the entries stay spooled for the next writer
+            logger.error(f"Cannot apply spooled writes: {e}", exc_info=True)
+
+        if applied:
+            logger.info(f"Applied {applied} spooled writes")
+        return applied
+
+    def _open_side_index(self, name: str, factory, rebuild):
+        """Open a per-collection side index, backfilling it once if empty.
+
+        Args:
+            name: Engine resource name (also part of the file name)
+            factory: Callable taking the index path and returning the index
+            rebuild: Callable taking the index and re-populating it
+        """
+        path = str(Path(self.db_path) / f"{self.collection_name}.{name}.sqlite3")
+        index = self.engine.get_resource(name, lambda: factory(path))
+        with self.engine.lock:
+            if not index.synced:
+                if index.count() == 0 and self.collection.count() > 0:
+                    rebuild(index)
+                index.synced = True
+        return index
+
+    def _iter_collection(self, include: List[str], page_size: int = 500):
+        """Page through every stored session (used to rebuild side indexes)."""
+        offset = 0
+        while True:
+            page = self.collection.list(limit=page_size, offset=offset, include=include)
+            if not page['ids']:
+                break
+            yield page
+            offset += page_size
+
+    def _rebuild_lexical_index(self, index: LexicalIndex) -> int:
+        """Re-index every stored session's text."""
+        index.clear()
+        total = 0
+        for page in self._iter_collection(["documents", "metadatas"]):
+            index.add_many(zip(page['ids'], page['documents'], page['metadatas']))
+            total += len(page['ids'])
+        logger.info(f"Lexical index rebuilt: {total} sessions")
+        return total
+
+    def _rebuild_session_index(self, index: SessionIndex) -> int:
+        """Re-index every stored session's metadata."""
+        index.clear()
+        total = 0
+        for page in self._iter_collection(["metadatas"]):
+            index.add_many(zip(page['ids'], page['metadatas']))
+            total += len(page['ids'])
+        logger.info(f"Session index rebuilt: {total} sessions")
+        return total
+
+    def _rebuild_dedup_index(self, index: DedupIndex) -> int:
+        """Re-fingerprint every stored session's text."""
+        index.clear()
+        total = 0
+        for page in self._iter_collection(["documents"]):
+            index.add_many(
+                (session_id, *self._fingerprint(document))
+                for session_id, document in zip(page['ids'], page['documents'])
+            )
+            total += len(page['ids'])
+        logger.info(f"Dedup index rebuilt: {total} sessions")
+        return total
+
+    @staticmethod
+    def _fingerprint(text: str):
+        """(content hash, MinHash signature) of a conversation."""
+        return content_hash(text), minhash(text)
+
+    def _find_duplicate(self, session_id: str, digest: str, signature: bytes, pending=()):
+        """Closest duplicate among stored and pending (same batch) sessions.
+
+        Returns:
+            (session_id, similarity, exact) of the best match other than
+            session_id itself, or None
+        """
+        best = None
+        for other_id, other_digest, other_signature, _ in pending:
+            if other_id == session_id:
+                continue
+            if other_digest == digest:
+                return other_id, 1.0, True
+            similarity = signature_similarity(signature, other_signature)
+            if similarity >= self.dedup_threshold and (best is None or similarity > best[1]):
+                best = (other_id, similarity, False)
+
+        for other_id in self.dedup_index.find_exact(digest):
+            if other_id != session_id:
+                return other_id, 1.0, True
+        for other_id, similarity in self.dedup_index.find_near(signature, self.dedup_threshold):
+            if other_id != session_id:
+                if best is None or similarity > best[1]:
+                    best = (other_id, similarity, False)
+                break
+        return best
+
+    def _resolve_duplicate(self, session_id: str, digest: str, signature: bytes,
+                           metadata: Dict, pending=()) -> Optional[str]:
+        """Apply the dedup policy to a session about to be stored.
+
+        Returns:
+            ID of the session the new one was folded into, or None to store
+            it (with "revision_of" set in metadata for a near duplicate
+            under the "revision" policy)
+        """
+        match = self._find_duplicate(session_id, digest, signature, pending)
+        if match is None:
+            return None
+        other_id, similarity, exact = match
+
+        if self.dedup_policy == "revision" and not exact:
+            metadata["revision_of"] = other_id
+            logger.info(f"Session {session_id} is a revision of {other_id} ({similarity:.2f})")
+            return None
+
+        if self.dedup_policy == "merge":
+            for pending_id, _, _, pending_metadata in pending:
+                if pending_id == other_id:
+                    pending_metadata.update(merge_session_metadata(pending_metadata, metadata))
+                    break
+            else:
+                page = self.collection.get(ids=[other_id], include=["metadatas"])
+                if page['ids']:
+                    self._update_metadata(other_id, merge_session_metadata(page['metadatas'][0], metadata))
+        logger.info(
+            f"Session {session_id} duplicates {other_id} "
+            f"({'exact' if exact else f'{similarity:.2f}'}), not stored"
+        )
+        return other_id
+
+    def _update_metadata(self, session_id: str, metadata: Dict) -> None:
+        """Rewrite a stored session's metadata and its session index entry."""
+        self.collection.update_metadata([session_id], [metadata])
+        if self.session_index is not None:
+            self.session_index.add(session_id, metadata)
+
+    def rebuild_lexical_index(self) -> int:
+        """Rebuild the keyword index from the collection.
+
+        Returns:
+            Number of sessions indexed
+
+        Raises:
+            ConfigurationError: If the lexical index is disabled
+        """
+        if self.lexical_index is None:
+            raise ConfigurationError("Lexical index is disabled for this SessionDB")
+        with self.engine.lock:
+            count = self._rebuild_lexical_index(self.lexical_index)
+            self.engine.bump_generation()
+            return count
+
+    def _embed(self, texts: List[str]) -> List:
+        """Embed texts in one batch, serving repeats from the embedding cache.
+
+        Vectors are scaled to unit length so that distances in every space
+        convert to cosine similarity (see distance_to_relevance).
+        """
+        import numpy as np
+
+        with self.metrics.timer("embed"):
+            if self.embedding_cache is not None:
+                embeddings = self.embedding_cache.embed(texts, self.embedding_function)
+            else:
+                embeddings = self.embedding_function(texts)
+        normalized = []
+        for embedding in embeddings:
+            vector = np.asarray(embedding, dtype=np.float32)
+            norm = float(np.linalg.norm(vector))
+            normalized.append(vector / norm if norm > 0 else vector)
+        return normalized
+
+    def _chunk_records(self, session_id: str, conversation_text: str, metadata: Dict,
+                       chunks: List[Dict] = None):
+        """Split a session into chunk ids, texts and metadatas (not embedded).
+
+        Pass chunks to build records for already split chunks only.
+        """
+        if chunks is None:
+            chunks = chunk_conversation(
+                conversation_text,
+                max_chars=self.chunk_chars,
+                overlap=self.chunk_overlap
+            )
+
+        # Filterable fields are copied so where clauses work on chunks too
+        ids = [chunk_id(session_id, chunk["chunk_index"]) for chunk in chunks]
+        texts = [chunk["text"] for chunk in chunks]
+        metadatas = [
+            {
+                "session_id": session_id,
+                "chunk_index": chunk["chunk_index"],
+                "agent_name": metadata["agent_name"],
+                "workflow": metadata["workflow"],
+                "project_name": metadata["project_name"],
+            }
+            for chunk in chunks
+        ]
+        return ids, texts, metadatas
+
+    def _delete_stale_chunks(self, chunk_counts: Dict[str, int]) -> None:
+        """Delete chunks numbered chunk_counts[session_id] or higher, in one call."""
+        clauses = [
+            {"$and": [{"session_id": session_id}, {"chunk_index": {"$gte": count}}]}
+            for session_id, count in chunk_counts.items()
+        ]
+        if clauses:
+            self.chunk_collection.delete(where=clauses[0] if len(clauses) == 1 else {"$or": clauses})
+
+    def _add_chunks(self, session_id: str, conversation_text: str, metadata: Dict) -> int:
+        """Embed all chunks of a session in one batch and store them.
+
+        Returns:
+            Number of chunks stored
+        """
+        ids, texts, metadatas = self._chunk_records(session_id, conversation_text, metadata)
+        if not ids:
+            return 0
+
+        self.chunk_collection.add(
+            ids=ids,
+            documents=texts,
+            embeddings=self._embed(texts),
+            metadatas=metadatas
+        )
+        logger.debug(f"Indexed {len(ids)} chunks for {session_id}")
+        return len(ids)
+
+    def _query_chunks(
+        self,
+        query_texts: List[str],
+        n_results: int,
+        where: Optional[Dict],
+        min_relevance: float,
+        aggregation: str,
+        with_documents: bool = True
+    ) -> List[List[Dict]]:
+        """Search chunk vectors and aggregate hits to session level, per query."""
+        if aggregation not in AGGREGATIONS:
+            raise ConfigurationError(
+                f"Unknown aggregation '{aggregation}', expected one of {AGGREGATIONS}"
+            )
+
+        # Several chunks of one session can fill the fetch window, so widen
+        # it until n_results sessions qualify, the collection is exhausted or
+        # CHUNK_MAX_FETCH is reached (embeddings are computed once)
+        chunk_collection = self.chunk_collection
+        embeddings = self._embed(query_texts)
+        fetch = n_results * CHUNK_OVERFETCH
+        scored_per_query: List[List] = [[] for _ in query_texts]
+        pending = list(range(len(query_texts)))
+        while pending:
+            with self.metrics.timer("store_query"):
+                results = chunk_collection.query(
+                    query_embeddings=[embeddings[q] for q in pending],
+                    n_results=fetch,
+                    where=where
+                )
+            widen = []
+            for j, q in enumerate(pending):
+                if not results or not results['ids'] or j >= len(results['ids']):
+                    continue
+                scored, exhausted = self._score_chunk_hits(
+                    results, j, fetch, chunk_collection.space, min_relevance, aggregation
+                )
+                scored_per_query[q] = scored[:n_results]
+                if len(scored) < n_results and not exhausted and fetch < CHUNK_MAX_FETCH:
+                    widen.append(q)
+            if widen:
+                fetch = min(fetch * CHUNK_WIDEN_FACTOR, CHUNK_MAX_FETCH)
+                logger.debug(f"Widening chunk search to {fetch} hits for {len(widen)} queries")
+            pending = widen
+
+        # One fetch for the parents of every query
+        parent_ids = list(dict.fromkeys(
+            parent_id for scored in scored_per_query for _, parent_id, _ in scored
+        ))
+        if not parent_ids:
+            return [[] for _ in query_texts]
+        by_id = self._fetch_sessions(parent_ids, with_documents)
+
+        results_per_query = []
+        for scored in scored_per_query:
+            formatted_results = []
+            for score, parent_id, best_chunk in scored:
+                if parent_id not in by_id:
+                    continue  # Chunk outlived its parent document
+                document, metadata = by_id[parent_id]
+                result = {
+                    "session_id": parent_id,
+                    "metadata": metadata,
+                    "distance": 1.0 - score,
+                    "relevance_score": score,
+                    "best_chunk": best_chunk
+                }
+                if with_documents:
+                    result["conversation"] = document
+                formatted_results.append(result)
+            results_per_query.append(formatted_results)
+        return results_per_query
+
+    @staticmethod
+    def _score_chunk_hits(results: Dict, q: int, fetch: int, space: str,
+                          min_relevance: float, aggregation: str):
+        """Aggregate one query's chunk hits to sessions that pass min_relevance.
+
+        Returns:
+            (scored, exhausted): [(score, session_id, best_chunk)] best first,
+            and whether widening the fetch cannot add qualifying sessions
+        """
+        # Group chunk relevances by parent session (results are best-first)
+        hits: Dict[str, List] = {}
+        relevance = 1.0
+        for i in range(len(results['ids'][q])):
+            parent_id = results['metadatas'][q][i]["session_id"]
+            relevance = distance_to_relevance(results['distances'][q][i], space)
+            hits.setdefault(parent_id, []).append(
+                (relevance, results['documents'][q][i])
+            )
+
+        scored = []
+        for parent_id, chunk_hits in hits.items():
+            if aggregation == "max":
+                score = chunk_hits[0][0]
+            else:
+                top = [relevance for relevance, _ in chunk_hits[:CHUNK_TOPK_MEAN]]
+                score = sum(top) / len(top)
+            if score >= min_relevance:
+                scored.append((score, parent_id, chunk_hits[0][1]))
+        scored.sort(key=lambda item: item[0], reverse=True)
+
+        # Fewer hits than asked for means nothing is left; with "max" a
+        # session first seen further down cannot beat the last chunk's score
+        exhausted = len(results['ids'][q]) < fetch or (
+            aggregation == "max" and relevance < min_relevance
+        )
+        return scored, exhausted
+
+    def stats(self) -> Dict:
+        """Counters and stage timings of this process, with cache and store sizes.
+
+        Counters and stage histograms (see metrics.py) are only recorded
+        with metrics enabled (config: metrics) and cover every SessionDB of
+        the process; the cache and store figures are this collection's.
+
+        Returns:
+            Dict with enabled, uptime_seconds, counters, stages (count,
+            sum/mean/p50/p95/max in ms per stage), sessions, open_sessions,
+            spooled_writes, query_cache and embedding_cache (None when
+            disabled)
+        """
+        stats = self.metrics.snapshot()
+        stats["sessions"] = self.collection.count()
+        stats["open_sessions"] = len(self.open_sessions.ids())
+        stats["spooled_writes"] = len(self.write_spool.pending()) if self.use_write_lock else 0
+        stats["query_cache"] = self.query_cache.stats() if self.query_cache is not None else None
+        stats["embedding_cache"] = (
+            self.embedding_cache.stats() if self.embedding_cache is not None else None
+        )
+        return stats
+
+    def close(self) -> None:
+        """Release this instance's hold on the shared engine.
+
+        The engine (backends, side indexes, caches, write lock) is closed
+        when the last live SessionDB bound to it is closed; other instances
+        keep working until then. The client and the model are freed once no
+        remaining engine uses them. Calling close() again does nothing.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        get_registry().release(self.engine, self)
@@ -0,0 +1,332 @@
+"""
+BMAD Session Logger - Session Index
+SQLite secondary index over session metadata, ordered by end_time.
+
+ChromaDB's ``collection.get(limit=...)`` returns sessions in no particular
+order, so "recent" sessions used to be arbitrary ones. This index keeps a
+B-tree on end_time for O(log n) newest-first listing with keyset (cursor)
+pagination and date-range filters, and serves the metadata without a
+ChromaDB round-trip.
+
+It also keeps inverted indexes from topic and from artifact path to
+session_ids. ChromaDB metadata only holds these as CSV strings, which cannot
+be filtered without a full scan.
+"""
+
+import json
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+
+# Configure logging
+logger = logging.getLogger("bmad.session_logger.session_index")
+
+
+# Constants
+FILTER_COLUMNS = ("agent_name", "workflow", "project_name")
+CURSOR_SEPARATOR = "|"
+SCHEMA_VERSION = 2           # 1: sessions only, 2: + topic/artifact postings
+PREFIX_UPPER_BOUND = "\U0010ffff"
+
+
+def to_timestamp(value: Union[str, datetime, None]) -> Optional[float]:
+    """Convert an ISO 8601 string or datetime (naive = UTC) to epoch seconds."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        text = value[:-1] if value.endswith("Z") else value
+        value = datetime.fromisoformat(text)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def csv_to_list(csv_str: str) -> List[str]:
+    """Split a metadata CSV field (see session_db.list_to_csv)."""
+    return [s.strip() for s in (csv_str or "").split(",") if s.strip()]
+
+
+def normalize_topic(topic: str) -> str:
+    """Topics match case-insensitively."""
+    return topic.strip().lower()
+
+
+def normalize_path(path: str) -> str:
+    """Artifact paths use forward slashes and no leading "./"."""
+    path = path.strip().replace("\\", "/")
+    while path.startswith("./"):
+        path = path[2:]
+    return path
+
+
+def encode_cursor(end_ts: float, session_id: str) -> str:
+    """Build an opaque cursor pointing just after (end_ts, session_id)."""
+    return f"{end_ts!r}{CURSOR_SEPARATOR}{session_id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    """Split a cursor produced by encode_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    end_ts, _, session_id = cursor.partition(CURSOR_SEPARATOR)
+    if not session_id:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return float(end_ts), session_id
+
+
+class SessionIndex:
+    """Time-ordered metadata index for one collection.
+
+    Args:
+        path: SQLite file for the index
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                end_ts REAL NOT NULL,
+                agent_name TEXT,
+                workflow TEXT,
+                project_name TEXT,
+                metadata TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_sessions_end ON sessions(end_ts DESC, session_id DESC);
+
+            CREATE TABLE IF NOT EXISTS session_topics (
+                topic TEXT NOT NULL,
+                session_id TEXT NOT NULL,
+                PRIMARY KEY (topic, session_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_topics_session ON session_topics(session_id);
+
+            CREATE TABLE IF NOT EXISTS session_artifacts (
+                path TEXT NOT NULL,
+                session_id TEXT NOT NULL,
+                PRIMARY KEY (path, session_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_artifacts_session ON session_artifacts(session_id);
+            """
+        )
+        self._conn.commit()
+        self._migrate()
+        self.synced = False
+
+    def _migrate(self) -> None:
+        """Populate postings for indexes created before they existed."""
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < 2:
+            rows = self._conn.execute("SELECT session_id, metadata FROM sessions").fetchall()
+            with self._lock:
+                self._write_postings([(sid, json.loads(meta)) for sid, meta in rows])
+        self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._conn.commit()
+
+    def _write_postings(self, entries: List[Tuple[str, Dict]]) -> None:
+        """Replace topic/artifact postings of the given sessions (no commit)."""
+        ids = [(session_id,) for session_id, _ in entries]
+        self._conn.executemany("DELETE FROM session_topics WHERE session_id = ?", ids)
+        self._conn.executemany("DELETE FROM session_artifacts WHERE session_id = ?", ids)
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO session_topics (topic, session_id) VALUES (?, ?)",
+            [(normalize_topic(topic), session_id)
+             for session_id, metadata in entries
+             for topic in csv_to_list(metadata.get("topics"))]
+        )
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO session_artifacts (path, session_id) VALUES (?, ?)",
+            [(normalize_path(path), session_id)
+             for session_id, metadata in entries
+             for path in csv_to_list(metadata.get("artifacts_created"))]
+        )
+
+    # Maintenance
+
+    def add_many(self, entries: Iterable[Tuple[str, Dict]]) -> None:
+        """Insert or replace (session_id, metadata) entries and their postings."""
+        entries = list(entries)
+        rows = [
+            (session_id, to_timestamp(metadata.get("end_time")) or 0.0,
+             metadata.get("agent_name"), metadata.get("workflow"),
+             metadata.get("project_name"), json.dumps(metadata))
+            for session_id, metadata in entries
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO sessions "
+                "(session_id, end_ts, agent_name, workflow, project_name, metadata) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._write_postings(entries)
+            self._conn.commit()
+
+    def add(self, session_id: str, metadata: Dict) -> None:
+        self.add_many([(session_id, metadata)])
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM session_topics WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM session_artifacts WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions")
+            self._conn.execute("DELETE FROM session_topics")
+            self._conn.execute("DELETE FROM session_artifacts")
+            self._conn.commit()
+
+    # Listing
+
+    def page(
+        self,
+        limit: int = 10,
+        cursor: str = None,
+        since: Union[str, datetime] = None,
+        until: Union[str, datetime] = None,
+        **filters
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """Return one newest-first page of sessions.
+
+        Args:
+            limit: Page size
+            cursor: Cursor from the previous page (None for the first page)
+            since: Only sessions that ended at or after this time
+            until: Only sessions that ended before this time
+            **filters: Equality filters on agent_name, workflow, project_name
+
+        Returns:
+            (sessions, next_cursor); sessions are dicts with session_id and
+            metadata, next_cursor is None on the last page
+        """
+        clauses, params = [], []
+        for column in FILTER_COLUMNS:
+            if filters.get(column):
+                clauses.append(f"{column} = ?")
+                params.append(filters[column])
+        if since is not None:
+            clauses.append("end_ts >= ?")
+            params.append(to_timestamp(since))
+        if until is not None:
+            clauses.append("end_ts < ?")
+            params.append(to_timestamp(until))
+        if cursor is not None:
+            end_ts, session_id = decode_cursor(cursor)
+            clauses.append("(end_ts, session_id) < (?, ?)")
+            params.extend([end_ts, session_id])
+
+        sql = "SELECT session_id, end_ts, metadata FROM sessions"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY end_ts DESC, session_id DESC LIMIT ?"
+        # Fetch one extra row to know whether another page exists
+        params.append(limit + 1)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        sessions = [
+            {"session_id": session_id, "metadata": json.loads(metadata)}
+            for session_id, _, metadata in rows
+        ]
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0]) if has_more else None
+        return sessions, next_cursor
+
+    # Inverted index lookups
+
+    def session_ids_for(
+        self,
+        topics_any: List[str] = None,
+        artifacts_any: List[str] = None
+    ) -> Set[str]:
+        """Return IDs of sessions tagged with any given topic or artifact.
+
+        When both lists are given a session must match both (any topic AND
+        any artifact).
+
+        Args:
+            topics_any: Topics (case-insensitive)
+            artifacts_any: Exact artifact paths
+
+        Returns:
+            Set of session IDs
+        """
+        result: Optional[Set[str]] = None
+        lookups = (
+            ("session_topics", "topic", [normalize_topic(t) for t in topics_any or []]),
+            ("session_artifacts", "path", [normalize_path(p) for p in artifacts_any or []]),
+        )
+        with self._lock:
+            for table, column, values in lookups:
+                if not values:
+                    continue
+                placeholders = ",".join("?" * len(values))
+                ids = {
+                    row[0] for row in self._conn.execute(
+                        f"SELECT session_id FROM {table} WHERE {column} IN ({placeholders})",
+                        values
+                    )
+                }
+                result = ids if result is None else result & ids
+        return result if result is not None else set()
+
+    def sessions_touching(self, path_prefix: str, limit: int = 50) -> List[Dict]:
+        """Return sessions (newest first) with an artifact at or under path_prefix.
+
+        Matches whole path segments: "src/app/api" matches that file and
+        everything under the directory, but not "src/app/api-old". Uses a
+        range scan on the (path, session_id) primary key, so cost is
+        proportional to the number of matching postings.
+
+        Args:
+            path_prefix: File or directory path (a trailing "/" is optional)
+            limit: Maximum sessions
+
+        Returns:
+            List of dicts with session_id, metadata and matched artifact paths
+        """
+        path = normalize_path(path_prefix).rstrip("/")
+        directory = path + "/" if path else ""
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT s.session_id, s.metadata, GROUP_CONCAT(a.path, ',')
+                   FROM session_artifacts a JOIN sessions s ON s.session_id = a.session_id
+                   WHERE a.path = ? OR (a.path >= ? AND a.path < ?)
+                   GROUP BY s.session_id
+                   ORDER BY s.end_ts DESC, s.session_id DESC
+                   LIMIT ?""",
+                (path, directory, directory + PREFIX_UPPER_BOUND, limit)
+            ).fetchall()
+        return [
+            {"session_id": session_id, "metadata": json.loads(metadata),
+             "matched_artifacts": paths.split(",")}
+            for session_id, metadata, paths in rows
+        ]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
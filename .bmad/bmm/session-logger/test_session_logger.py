@@ -9,6 +9,7 @@ Usage:
 
 import sys
 import os
+import tempfile
 from pathlib import Path
 
 # Add parent directory to path for imports
@@ -69,6 +70,11 @@ test_db_path = str(Path.home() / ".bmad" / "data" / "session-db-test")
 try:
     db = SessionDB(db_path=test_db_path, collection_name="test_collection")
     print(f"  [OK] Database initialized at: {test_db_path}")
+    db_again = SessionDB(db_path=test_db_path, collection_name="test_collection")
+    if db_again.collection is not db.collection:
+        print("  [FAIL] Second SessionDB did not reuse the warm collection")
+        sys.exit(1)
+    print("  [OK] Second SessionDB reused the warm engine")
 except Exception as e:
     print(f"  [FAIL] Database initialization failed: {e}")
     sys.exit(1)
@@ -195,6 +201,1601 @@ except Exception as e:
 
 print()
 
+# Test 10: Shared engines are reference counted
+print("Test 10: Closing shared engines...")
+try:
+    from engine import LazySentenceTransformer, close_engines, get_registry
+
+    db.close()
+    db_again.close()
+    close_engines()
+    if LazySentenceTransformer.models:
+        print("  [FAIL] close_engines() kept embedding models loaded")
+        sys.exit(1)
+    print("  [OK] close_engines() released the embedding models")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        first = SessionDB(db_path=tmp_dir, collection_name="refcount", backend="numpy")
+        second = SessionDB(db_path=tmp_dir, collection_name="refcount", backend="numpy")
+        engine = first.engine
+        saved_id = first.save_session(test_conversation, "architect", "Winston", "test-project")
+        first.close()
+        first.close()
+        if second.engine is not engine or engine.users != 1:
+            print("  [FAIL] Closing one SessionDB closed the engine another one uses")
+            sys.exit(1)
+        results = second.query_sessions("vector database for session logging", n_results=1)
+        if not results or results[0]["session_id"] != saved_id:
+            print("  [FAIL] Remaining SessionDB cannot query after the other was closed")
+            sys.exit(1)
+        print("  [OK] Engine stayed open while another SessionDB used it")
+
+        second.close()
+        if get_registry().get_engine(tmp_dir, "refcount", second.embedding_model,
+                                     options={"backend": "numpy"}) is engine:
+            print("  [FAIL] Engine was not closed by its last user")
+            sys.exit(1)
+        close_engines(db_path=tmp_dir)
+        if LazySentenceTransformer.models:
+            print("  [FAIL] Embedding model outlived the last engine using it")
+            sys.exit(1)
+        print("  [OK] Last close released the engine and the model")
+except Exception as e:
+    print(f"  [FAIL] Engine reference counting failed: {e}")
+    sys.exit(1)
+
+print()
+
+# Test 11: The model loads once, on the first embedding
+print("Test 11: Counting embedding model loads...")
+try:
+    import sentence_transformers
+    from engine import close_engines
+
+    model_loads = []
+    original_model_class = sentence_transformers.SentenceTransformer
+
+    class CountingSentenceTransformer(original_model_class):
+        def __init__(self, *args, **kwargs):
+            model_loads.append(kwargs.get("model_name_or_path"))
+            super().__init__(*args, **kwargs)
+
+    close_engines()
+    sentence_transformers.SentenceTransformer = CountingSentenceTransformer
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            counted = SessionDB(db_path=tmp_dir, collection_name="model_loads")
+            counted.collection.count()
+            if model_loads:
+                print(f"  [FAIL] Opening the database loaded {len(model_loads)} model(s)")
+                sys.exit(1)
+            print("  [OK] Opening the database loaded no model")
+            counted.save_session(test_conversation, "architect", "Winston", "test-project")
+            counted.query_sessions("embedding model for session logging", n_results=1)
+            if len(model_loads) != 1:
+                print(f"  [FAIL] Save and query loaded {len(model_loads)} models, expected 1")
+                sys.exit(1)
+            print("  [OK] Save and query loaded the model exactly once")
+            counted.close()
+    finally:
+        sentence_transformers.SentenceTransformer = original_model_class
+        close_engines()
+except Exception as e:
+    print(f"  [FAIL] Model load count failed: {e}")
+    sys.exit(1)
+
+print()
+
+# Test 12: Daemon framing and in-process fallback
+print("Test 12: Checking daemon framing and fallback...")
+try:
+    import socket
+    import threading
+    from datetime import datetime
+    import daemon_client
+    from capture import capture_turns
+    from config import reload_config
+
+    left, right = socket.socketpair()
+    sent = {"method": "db.list_sessions", "params": {"since": datetime(2025, 1, 2, 3, 4, 5), "limit": 5}}
+    left.sendall(daemon_client.encode_message(sent))
+    received = daemon_client.read_message(right)
+    left.close()
+    if received != sent or daemon_client.read_message(right) is not None:
+        print(f"  [FAIL] Frame round trip returned {received!r}")
+        sys.exit(1)
+    right.close()
+    print("  [OK] Length-prefixed frames round-trip (datetimes included)")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # A socket file nobody listens on, as left by a killed daemon
+        stale_path = os.path.join(tmp_dir, "stale.sock")
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(stale_path)
+        stale.close()
+        os.environ["BMAD_SESSION_LOGGER_DAEMON_SOCKET_PATH"] = stale_path
+        try:
+            reload_config()
+            if daemon_client.get_daemon_client() is not None:
+                print("  [FAIL] Daemon client used although use_daemon is off by default")
+                sys.exit(1)
+            print("  [OK] use_daemon is off by default")
+
+            os.environ["BMAD_SESSION_LOGGER_USE_DAEMON"] = "1"
+            reload_config()
+            if daemon_client.daemon_call("stats") != (False, None):
+                print("  [FAIL] Unreachable daemon was not reported as unhandled")
+                sys.exit(1)
+            if daemon_client.get_daemon_client() is not None:
+                print("  [FAIL] Failed connection was retried right away")
+                sys.exit(1)
+            if not isinstance(get_relevant_context(query="vector database", db_path=test_db_path), str):
+                print("  [FAIL] In-process fallback did not return a context string")
+                sys.exit(1)
+            print("  [OK] Unreachable daemon falls back to in-process calls")
+
+            # A daemon that reads requests but never answers
+            silent_path = os.path.join(tmp_dir, "silent.sock")
+            silent = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            silent.bind(silent_path)
+            silent.listen(4)
+            silent.settimeout(5)
+            received = []
+
+            def _swallow():
+                try:
+                    while True:
+                        conn, _ = silent.accept()
+                        message = daemon_client.read_message(conn)
+                        if message is not None:
+                            received.append(message)
+                except OSError:
+                    pass
+
+            silent_thread = threading.Thread(target=_swallow, daemon=True)
+            silent_thread.start()
+            os.environ["BMAD_SESSION_LOGGER_DAEMON_SOCKET_PATH"] = silent_path
+            os.environ["BMAD_SESSION_LOGGER_DAEMON_TIMEOUT_SECONDS"] = "0.3"
+            daemon_client._unavailable_until = 0.0
+            reload_config()
+            try:
+                try:
+                    daemon_client.daemon_call("stats")
+                    print("  [FAIL] Unanswered request was reported as handled")
+                    sys.exit(1)
+                except daemon_client.DaemonTimeoutError:
+                    pass
+                if capture_turns("silent-session", ["User: hello"], db_path=test_db_path) is not False:
+                    print("  [FAIL] capture_turns reported success after a daemon timeout")
+                    sys.exit(1)
+                if SessionDB(db_path=test_db_path).open_sessions.get("silent-session") is not None:
+                    print("  [FAIL] Timed-out turns were also appended in-process")
+                    sys.exit(1)
+                if [m["method"] for m in received] != ["stats", "capture_turns"]:
+                    print(f"  [FAIL] Daemon received {[m['method'] for m in received]}")
+                    sys.exit(1)
+            finally:
+                silent.close()
+                os.environ.pop("BMAD_SESSION_LOGGER_DAEMON_TIMEOUT_SECONDS", None)
+            print("  [OK] Daemon timeout fails the call without an in-process rerun")
+        finally:
+            os.environ.pop("BMAD_SESSION_LOGGER_USE_DAEMON", None)
+            os.environ.pop("BMAD_SESSION_LOGGER_DAEMON_SOCKET_PATH", None)
+            daemon_client._unavailable_until = 0.0
+            reload_config()
+except Exception as e:
+    print(f"  [FAIL] Daemon client check failed: {e}")
+    sys.exit(1)
+
+print()
+
+# Test 13: Writer lock across processes, spool and drain
+print("Test 13: Checking the writer lock across processes...")
+try:
+    import subprocess
+    import time
+    from config import reload_config
+    from engine import close_engines
+
+    def hold_writer_lock(lock_path, seconds=None):
+        """Start a process holding the lock for seconds, or until its stdin closes."""
+        holder = subprocess.Popen(
+            [sys.executable, "-c",
+             "import sys, time; sys.path.insert(0, sys.argv[1])\n"
+             "from write_lock import WriterLock\n"
+             "lock = WriterLock(sys.argv[2]); lock.acquire(); print('locked', flush=True)\n"
+             "time.sleep(float(sys.argv[3])) if sys.argv[3] else sys.stdin.read()\n"
+             "lock.release()",
+             str(Path(__file__).parent), lock_path, "" if seconds is None else str(seconds)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+        )
+        if holder.stdout.readline().strip() != "locked":
+            raise RuntimeError("lock holder did not start")
+        return holder
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        lock_path = str(Path(tmp_dir) / "locking.write.lock")
+
+        writer = SessionDB(db_path=tmp_dir, collection_name="locking", backend="numpy")
+        holder = hold_writer_lock(lock_path, seconds=0.5)
+        waited_id = writer.save_session(test_conversation, "architect", "Winston", "test-project")
+        holder.wait(timeout=30)
+        if writer.write_spool.pending() or writer.get_session_by_id(waited_id)["session_id"] != waited_id:
+            print("  [FAIL] Save behind a short writer was spooled instead of waiting")
+            sys.exit(1)
+        print("  [OK] Save waited for another process's short write")
+        writer.close()
+
+        os.environ["BMAD_SESSION_LOGGER_WRITE_LOCK_WAIT_SECONDS"] = "0.2"
+        try:
+            reload_config()
+            impatient = SessionDB(db_path=tmp_dir, collection_name="locking", backend="numpy")
+            holder = hold_writer_lock(lock_path)
+            started = time.perf_counter()
+            spooled_id = impatient.save_session(
+                test_conversation + "\nUser: one more question about spooling?",
+                "architect", "Winston", "test-project"
+            )
+            if time.perf_counter() - started > 5 or len(impatient.write_spool.pending()) != 1:
+                print("  [FAIL] Save behind a held lock was not spooled")
+                sys.exit(1)
+            print("  [OK] Save behind a held lock was spooled")
+
+            holder.stdin.close()
+            holder.wait(timeout=30)
+            if impatient.flush_write_spool() != 1 or impatient.write_spool.pending():
+                print("  [FAIL] Spooled save was not drained")
+                sys.exit(1)
+            if impatient.get_session_by_id(spooled_id)["metadata"]["agent_name"] != "architect":
+                print("  [FAIL] Drained save is not stored")
+                sys.exit(1)
+            print("  [OK] Spool drained once the lock was free")
+            impatient.close()
+        finally:
+            os.environ.pop("BMAD_SESSION_LOGGER_WRITE_LOCK_WAIT_SECONDS", None)
+            reload_config()
+            close_engines(db_path=tmp_dir)
+except Exception as e:
+    print(f"  [FAIL] Writer lock check failed: {e}")
+    sys.exit(1)
+
+print()
+
+# Test 14: Chunked indexing of long sessions
+print("Test 14: Checking chunked multi-vector indexing...")
+try:
+    from chunking import chunk_conversation
+
+    filler_topics = ["sprint planning", "color palette", "database naming", "release notes",
+                     "onboarding docs", "meeting cadence", "logo sizes", "holiday schedule"]
+    long_turns = []
+    for i, subject in enumerate(filler_topics * 2):
+        long_turns.append(f"User: Can we revisit the {subject} decision from last week?")
+        long_turns.append(f"Assistant: Sure, the {subject} stays as agreed; item {i} is closed.")
+    long_turns.insert(16, "User: The ingress TLS certificate expired. How do we automate renewal?")
+    long_turns.insert(17, "Assistant: Install cert-manager with a Let's Encrypt ClusterIssuer "
+                          "so ingress certificates renew automatically before they expire.")
+    long_session = "\n".join(long_turns)
+
+    windows = chunk_conversation(long_session, max_chars=400, overlap=100)
+    if any(len(window["text"]) > 400 for window in windows):
+        print("  [FAIL] A chunk exceeds max_chars")
+        sys.exit(1)
+    if any(windows[i + 1]["text"].split("\n")[0] not in windows[i]["text"] for i in range(len(windows) - 1)):
+        print("  [FAIL] Consecutive chunks do not overlap")
+        sys.exit(1)
+    print(f"  [OK] {len(windows)} bounded, overlapping chunks")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        chunked = SessionDB(db_path=tmp_dir, collection_name="chunked", chunking=True,
+                            chunk_chars=400, chunk_overlap=100, query_cache=False)
+        long_id = chunked.save_session(long_session, "dev", "Amelia", "test-project")
+        chunked.save_session(test_conversation, "architect", "Winston", "test-project")
+        if chunked.chunk_collection.count() != len(windows) + len(chunk_conversation(test_conversation, 400, 100)):
+            print("  [FAIL] Chunk collection does not hold one vector per chunk")
+            sys.exit(1)
+
+        query_text = "automate cert-manager renewal of the ingress TLS certificate"
+        best = chunked.query_sessions(query_text, n_results=2, include=["metadata", "excerpt"])
+        if not best or best[0]["session_id"] != long_id or "cert-manager" not in best[0]["excerpt"]:
+            print("  [FAIL] Passage deep inside a long session was not found by its chunk")
+            sys.exit(1)
+        print("  [OK] Long session found through its matching chunk")
+
+        mean = chunked.query_sessions(query_text, n_results=2, aggregation="topk_mean", include=["metadata"])
+        mean_score = {hit["session_id"]: hit["relevance_score"] for hit in mean}.get(long_id)
+        if mean_score is None or mean_score > best[0]["relevance_score"] + 1e-6:
+            print("  [FAIL] topk_mean aggregation scored above the best chunk")
+            sys.exit(1)
+        print("  [OK] topk_mean aggregation is bounded by the best chunk")
+        chunked.close()
+except Exception as e:
+    print(f"  [FAIL] Chunked indexing check failed: {e}")
+    sys.exit(1)
+
+print()
+
+# Test 15: Background capture queue
+print("Test 15: Checking the background capture queue...")
+try:
+    import queue
+    from capture_queue import CaptureQueue
+
+    def capture_context(n):
+        return {"agent_name": "dev", "agent_persona": "Amelia", "project_name": "test-project",
+                "workflow": f"queue-test-{n}"}
+
+    def capture_text(n):
+        return f"User: Queued capture number {n}, about retry budgets {n * 13}?\nAssistant: Noted item {n}."
+
+    def stalled(capture_queue):
+        """Keep captures queued: no worker thread consumes them."""
+        capture_queue._ensure_worker = lambda: None
+        return capture_queue
+
+    def discard_pending(capture_queue):
+        while True:
+            try:
+                capture_queue._queue.get_nowait()
+            except queue.Empty:
+                return
+            capture_queue._queue.task_done()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_dir = os.path.join(tmp_dir, "db")
+        spool_dir = os.path.join(tmp_dir, "spool")
+        queued_db = SessionDB(db_path=db_dir)
+
+        dropping = stalled(CaptureQueue(db_path=db_dir, maxsize=1, on_full="drop", put_timeout=0.05))
+        dropping.submit(capture_context(1), capture_text(1))
+        dropping.submit(capture_context(2), capture_text(2))
+        if dropping.stats()["dropped"] != 1:
+            print("  [FAIL] Full queue did not drop with on_full='drop'")
+            sys.exit(1)
+        discard_pending(dropping)
+
+        syncing = stalled(CaptureQueue(db_path=db_dir, maxsize=1, on_full="sync", put_timeout=0.05))
+        syncing.submit(capture_context(3), capture_text(3))
+        sync_id = syncing.submit(capture_context(4), capture_text(4))
+        if syncing.stats()["sync_fallbacks"] != 1 or queued_db.get_session_by_id(sync_id)["session_id"] != sync_id:
+            print("  [FAIL] Full queue did not save in the caller's thread with on_full='sync'")
+            sys.exit(1)
+        discard_pending(syncing)
+
+        spooling = stalled(CaptureQueue(db_path=db_dir, maxsize=1, on_full="spool",
+                                        put_timeout=0.05, spool_dir=spool_dir))
+        spooled_ids = [spooling.submit(capture_context(n), capture_text(n)) for n in (5, 6)]
+        if spooling.stats()["spooled"] != 2 or spooling.stats()["dropped"]:
+            print("  [FAIL] Full queue did not keep the capture in the spool with on_full='spool'")
+            sys.exit(1)
+        discard_pending(spooling)
+        print("  [OK] drop, sync and spool policies for a full queue")
+
+        # A new queue (e.g. the next process) recovers and writes the spool
+        recovering = CaptureQueue(db_path=db_dir, spool_dir=spool_dir)
+        if recovering.stats()["recovered"] != 2 or not recovering.flush(timeout=60):
+            print("  [FAIL] Spooled captures were not recovered")
+            sys.exit(1)
+        stats = recovering.stats()
+        if stats["written"] != 2 or stats["spooled"] or stats["pending"]:
+            print(f"  [FAIL] Recovered captures were not written: {stats}")
+            sys.exit(1)
+        for session_id in spooled_ids:
+            queued_db.get_session_by_id(session_id)
+        print("  [OK] Spooled captures recovered and written by the next queue")
+
+        flushed_id = recovering.submit(capture_context(7), capture_text(7))
+        if not recovering.flush(timeout=60) or queued_db.get_session_by_id(flushed_id)["session_id"] != flushed_id:
+            print("  [FAIL] flush() returned before the capture was written")
+            sys.exit(1)
+        recovering.close()
+        print("  [OK] flush() waits for queued captures")
+        queued_db.close()
+except Exception as e:
+    print(f"  [FAIL] Capture queue check failed: {e}")
+    sys.exit(1)
+
+print()
+
+# Test 16: Bulk ingest with checkpoint and resume
+print("Test 16: Checking bulk ingest checkpoints...")
+try:
+    import json
+    from ingest import Checkpoint, ingest
+
+    ingest_defaults = {"agent_name": "dev", "agent_persona": "Amelia",
+                       "project_name": "test-project", "workflow": "backfill"}
+
+    def interrupt_after_first_batch(message):
+        raise KeyboardInterrupt
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source = Path(tmp_dir) / "sessions.jsonl"
+        with open(source, "w", encoding="utf-8") as f:
+            for n in range(10):
+                f.write(json.dumps({
+                    "conversation": f"User: Backfilled session {n} about shard {n * 17}?\nAssistant: Shard {n} is fine.",
+                    "end_time": f"2025-01-{n + 1:02d}T12:00:00Z",
+                }) + "\n")
+        checkpoint_path = Path(tmp_dir) / "ingest.ckpt"
+        ingest_db = SessionDB(db_path=os.path.join(tmp_dir, "db"), backend="numpy")
+
+        try:
+            ingest(source, ingest_db, ingest_defaults, batch_size=4,
+                   checkpoint=Checkpoint(checkpoint_path, source), report=interrupt_after_first_batch)
+            print("  [FAIL] Interrupted ingest did not stop")
+            sys.exit(1)
+        except KeyboardInterrupt:
+            pass
+        if Checkpoint(checkpoint_path, source).position != 4 or ingest_db.collection.count() != 4:
+            print("  [FAIL] Checkpoint does not record the first batch")
+            sys.exit(1)
+        print("  [OK] Checkpoint saved after the first batch")
+
+        resumed = ingest(source, ingest_db, ingest_defaults, batch_size=4,
+                         checkpoint=Checkpoint(checkpoint_path, source), report=lambda message: None)
+        if resumed["sessions"] != 6 or ingest_db.collection.count() != 10:
+            print(f"  [FAIL] Resume ingested {resumed['sessions']} sessions, expected the remaining 6")
+            sys.exit(1)
+        print("  [OK] Resumed run ingested only the remaining sessions")
+
+        ingest(source, ingest_db, ingest_defaults, batch_size=4, report=lambda message: None)
+        if ingest_db.collection.count() != 10:
+            print("  [FAIL] Re-ingesting the same source created duplicates")
+            sys.exit(1)
+        print("  [OK] Re-ingest is idempotent (stable session IDs)")
+        ingest_db.close()
+except Exception as e:
+    print(f"  [FAIL] Bulk ingest check failed: {e}")
+    sys.exit(1)
+
+print()
+
+# Test 17: Embedding cache hits and eviction
+print("Test 17: Checking the embedding cache...")
+try:
+    import numpy as np
+    from embedding_cache import EmbeddingCache
+
+    computed = []
+
+    def fake_embed(texts):
+        computed.extend(texts)
+        return [np.full(384, len(text), dtype=np.float32) for text in texts]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_path = os.path.join(tmp_dir, "embedding_cache.sqlite3")
+        cache = EmbeddingCache("test-model", cache_path, memory_items=8)
+        vectors = cache.embed(["alpha", "beta", "alpha"], fake_embed)
+        if computed != ["alpha", "beta"] or not np.array_equal(vectors[0], vectors[2]):
+            print(f"  [FAIL] Misses were not computed once each: {computed}")
+            sys.exit(1)
+        cache.embed(["beta", "alpha"], fake_embed)
+        reopened = EmbeddingCache("test-model", cache_path)
+        reopened.embed(["alpha"], fake_embed)
+        if len(computed) != 2 or cache.stats()["memory_hits"] < 2 or reopened.stats()["disk_hits"] != 1:
+            print(f"  [FAIL] Repeated texts were recomputed: {computed}")
+            sys.exit(1)
+        other_model = EmbeddingCache("other-model", cache_path)
+        other_model.embed(["alpha"], fake_embed)
+        if len(computed) != 3:
+            print("  [FAIL] Cache entries leaked across models")
+            sys.exit(1)
+        print("  [OK] Memory and disk hits skip the model; entries are per model")
+
+        vector_bytes = 384 * 4
+        cache.disk_max_bytes = 20 * vector_bytes
+        for start in range(0, 60, 5):
+            cache.embed([f"text {n}" for n in range(start, start + 5)], fake_embed)
+        stats = cache.stats()
+        actual_bytes = cache._conn.execute("SELECT SUM(LENGTH(vector)) FROM embeddings").fetchone()[0]
+        if not stats["evictions"] or stats["disk_bytes"] != actual_bytes or actual_bytes > cache.disk_max_bytes:
+            print(f"  [FAIL] Disk tier not kept within budget: {stats}")
+            sys.exit(1)
+        before = len(computed)
+        EmbeddingCache("test-model", cache_path).embed([f"text {n}" for n in range(55, 60)], fake_embed)
+        if len(computed) != before:
+            print("  [FAIL] Most recently stored entries were evicted")
+            sys.exit(1)
+        print(f"  [OK] Disk tier evicted {stats['evictions']} entries and stays within budget")
+        for open_cache in (cache, reopened, other_model):
+            open_cache.close()
+except Exception as e:
+    print(f"  [FAIL] Embedding cache check failed: {e}")
+    sys.exit(1)
+
+print()
+
+# Test 18: Hybrid search with reciprocal-rank fusion
+print("Test 18: Checking hybrid search ordering...")
+try:
+    from lexical_index import reciprocal_rank_fusion, RRF_K
+    from session_db import ConfigurationError
+
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a", "d"]])
+    order = [item_id for item_id, _ in fused]
+    if order[:2] != ["a", "c"] or abs(fused[0][1] - (1 / (RRF_K + 1) + 1 / (RRF_K + 2))) > 1e-12:
+        print(f"  [FAIL] Unexpected fused order: {fused}")
+        sys.exit(1)
+    if order.index("b") > order.index("d") or len(order) != 4:
+        print(f"  [FAIL] Single-list hits not ordered by rank: {order}")
+        sys.exit(1)
+    print("  [OK] Hits in both lists outrank hits in one; ties follow rank")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        hybrid_db = SessionDB(db_path=tmp_dir, collection_name="hybrid", query_cache=False)
+        code_id = hybrid_db.save_session(
+            "User: The build fails with ERRX4471 in the payment service.\n"
+            "Assistant: ERRX4471 means the signing key is missing; mount the secret.",
+            "dev", "Amelia", "test-project")
+        hybrid_db.save_session(test_conversation, "architect", "Winston", "test-project")
+        hybrid_db.save_session(
+            "User: The payment service build is slow.\nAssistant: Cache the dependencies in CI.",
+            "dev", "Amelia", "test-project")
+
+        lexical = hybrid_db.query_sessions("ERRX4471", n_results=3, mode="lexical", include=["metadata"])
+        if [hit["session_id"] for hit in lexical] != [code_id] or lexical[0]["relevance_score"] != 1.0:
+            print(f"  [FAIL] Lexical mode did not return only the exact keyword match: {lexical}")
+            sys.exit(1)
+
+        hybrid = hybrid_db.query_sessions("payment build ERRX4471", n_results=3, mode="hybrid",
+                                          include=["metadata"])
+        scores = [hit["relevance_score"] for hit in hybrid]
+        if not hybrid or hybrid[0]["session_id"] != code_id or scores != sorted(scores, reverse=True):
+            print(f"  [FAIL] Hybrid ranking not fused best-first: {hybrid}")
+            sys.exit(1)
+        if len({hit["session_id"] for hit in hybrid}) != len(hybrid):
+            print("  [FAIL] Hybrid results contain duplicates")
+            sys.exit(1)
+        print("  [OK] Hybrid mode ranks the keyword and vector match first, without duplicates")
+
+        try:
+            hybrid_db.query_sessions("payment", mode="fuzzy")
+            print("  [FAIL] Unknown query mode was accepted")
+            sys.exit(1)
+        except ConfigurationError:
+            print("  [OK] Unknown query mode raises ConfigurationError")
+        hybrid_db.close()
+except Exception as e:
+    print(f"  [FAIL] Hybrid search check failed: {e}")
+    sys.exit(1)
+
+print()
+
+# Test 19: Result projections
+print("Test 19: Checking result projections...")
+try:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        projected = SessionDB(db_path=tmp_dir, collection_name="projections", query_cache=False)
+        projected_id = projected.save_session(test_conversation, "architect", "Winston", "test-project")
+        requested = []
+        backend = projected.collection
+        for method in ("query", "get"):
+            def recording(*args, _call=getattr(backend, method), **kwargs):
+                requested.append(kwargs.get("include"))
+                return _call(*args, **kwargs)
+            setattr(backend, method, recording)
+
+        full = projected.query_sessions("vector database for session logging", n_results=1)
+        if full[0].get("conversation") != test_conversation or "metadata" not in full[0] or "excerpt" in full[0]:
+            print("  [FAIL] Default projection is not conversation + metadata")
+            sys.exit(1)
+
+        del requested[:]
+        slim = projected.query_sessions("vector database for session logging", n_results=1,
+                                        include=["metadata", "excerpt"])
+        if "conversation" in slim[0] or slim[0]["excerpt"] != test_conversation[:len(slim[0]["excerpt"])]:
+            print("  [FAIL] Excerpt projection returned the conversation or a wrong excerpt")
+            sys.exit(1)
+        if not requested or any("documents" in (include or []) for include in requested):
+            print(f"  [FAIL] Documents were loaded without 'conversation': {requested}")
+            sys.exit(1)
+        print("  [OK] Without 'conversation' no document is loaded; the excerpt comes from metadata")
+
+        ids_only = projected.query_sessions("vector database for session logging", n_results=1, include=[])
+        if set(ids_only[0]) - {"session_id", "distance", "relevance_score"}:
+            print(f"  [FAIL] Empty projection returned extra fields: {sorted(ids_only[0])}")
+            sys.exit(1)
+        if ids_only[0]["session_id"] != projected_id:
+            print("  [FAIL] Empty projection lost the session ID")
+            sys.exit(1)
+        print("  [OK] An empty projection returns IDs and scores only")
+
+        try:
+            projected.query_sessions("vector database", include=["embedding"])
+            print("  [FAIL] Unknown include field was accepted")
+            sys.exit(1)
+        except ConfigurationError:
+            print("  [OK] Unknown include field raises ConfigurationError")
+        projected.close()
+except Exception as e:
+    print(f"  [FAIL] Projection check failed: {e}")
+    sys.exit(1)
+
+print()
+
+# Test 20: Keyset pagination of the session list
+print("Test 20: Checking keyset pagination...")
+try:
+    from datetime import datetime, timedelta
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paged = SessionDB(db_path=tmp_dir, collection_name="pages", query_cache=False)
+        base = datetime(2026, 1, 1, 12, 0, 0)
+        ended = [base + timedelta(hours=n) for n in range(7)] + [base + timedelta(hours=3)]
+        saved_ids = paged.save_sessions(
+            {
+                "conversation_text": f"User: Page item {n} about topic {n * 7}.\nAssistant: Noted item {n}.",
+                "agent_name": "dev" if n % 2 else "pm",
+                "agent_persona": "Amelia" if n % 2 else "John",
+                "project_name": "test-project",
+                "start_time": end_time - timedelta(minutes=5),
+                "end_time": end_time,
+            }
+            for n, end_time in enumerate(ended)
+        )
+
+        seen, cursor, page_count = [], None, 0
+        while True:
+            page = paged.list_sessions_page(limit=3, cursor=cursor)
+            seen.extend(session["session_id"] for session in page["sessions"])
+            page_count += 1
+            if page_count == 1:
+                # A session saved mid-walk sorts before the cursor and must not shift later pages
+                paged.save_session("User: Late arrival.\nAssistant: Filed.", "dev", "Amelia",
+                                   "test-project", end_time=base + timedelta(days=1))
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        if sorted(seen) != sorted(saved_ids) or len(seen) != len(set(seen)) or page_count != 3:
+            print(f"  [FAIL] Pages skipped or repeated sessions: {len(seen)} seen in {page_count} pages")
+            sys.exit(1)
+        end_times = [paged.get_session_by_id(session_id)["metadata"]["end_time"] for session_id in seen]
+        if end_times != sorted(end_times, reverse=True):
+            print("  [FAIL] Pages are not newest-first")
+            sys.exit(1)
+        print("  [OK] Pages cover every session once, newest-first, including end_time ties")
+
+        dev_pages = [page for page in paged.iter_session_pages(page_size=2, agent_name="dev")]
+        dev_ids = [session["session_id"] for page in dev_pages for session in page]
+        if len(dev_ids) != 5 or any(len(page) > 2 for page in dev_pages):
+            print(f"  [FAIL] Filtered page walk returned {len(dev_ids)} sessions")
+            sys.exit(1)
+        window = paged.list_sessions(limit=10, since=base + timedelta(hours=2), until=base + timedelta(hours=5))
+        if len(window) != 4:
+            print(f"  [FAIL] since/until window returned {len(window)} sessions, expected 4")
+            sys.exit(1)
+        print("  [OK] Filters and since/until windows apply to pages")
+        paged.close()
+except Exception as e:
+    print(f"  [FAIL] Pagination check failed: {e}")
+    sys.exit(1)
+
+print()
+
+# Test 21: Topic and artifact postings
+print("Test 21: Checking topic and artifact postings...")
+try:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tagged = SessionDB(db_path=tmp_dir, collection_name="postings", query_cache=False)
+        api_id = tagged.save_session("User: Add the Stripe webhook.\nAssistant: Added the route.",
+                                     "dev", "Amelia", "test-project", topics=["Payments", "webhooks"],
+                                     artifacts=["src/app/api/webhooks/stripe/route.ts"])
+        old_id = tagged.save_session("User: Retire the old API.\nAssistant: Moved it aside.",
+                                     "dev", "Amelia", "test-project", topics=["cleanup"],
+                                     artifacts=["src/app/api-old/index.ts"])
+        exact_id = tagged.save_session("User: Document the API folder.\nAssistant: Wrote the readme.",
+                                       "pm", "John", "test-project", topics=["payments"],
+                                       artifacts=["src/app/api"])
+
+        if tagged.session_index.session_ids_for(topics_any=["PAYMENTS"]) != {api_id, exact_id}:
+            print("  [FAIL] Topic lookup is not case-insensitive")
+            sys.exit(1)
+        both = tagged.session_index.session_ids_for(topics_any=["payments"], artifacts_any=["./src/app/api"])
+        if both != {exact_id}:
+            print(f"  [FAIL] Topic AND artifact lookup returned {both}")
+            sys.exit(1)
+        filtered = tagged.query_sessions("webhook route", n_results=3, topics_any=["cleanup"], include=[])
+        if [hit["session_id"] for hit in filtered] != [old_id]:
+            print("  [FAIL] topics_any did not restrict the vector search")
+            sys.exit(1)
+        print("  [OK] Topic and artifact postings filter searches")
+
+        touching = {hit["session_id"] for hit in tagged.sessions_touching("src/app/api/")}
+        if touching != {api_id, exact_id}:
+            print(f"  [FAIL] Directory match crossed a segment boundary: {touching}")
+            sys.exit(1)
+        if {hit["session_id"] for hit in tagged.sessions_touching("src\\app\\api-old")} != {old_id}:
+            print("  [FAIL] Backslash path did not match its own directory")
+            sys.exit(1)
+        if tagged.sessions_touching("src/app/api/webhooks/stripe/route"):
+            print("  [FAIL] A partial file name matched")
+            sys.exit(1)
+        print("  [OK] sessions_touching matches whole path segments")
+
+        many_ids = [f"missing-{n}" for n in range(40000)] + [api_id]
+        keyword_hits = tagged.lexical_index.search("Stripe webhook", session_ids=many_ids)
+        if [session_id for session_id, _ in keyword_hits] != [api_id]:
+            print("  [FAIL] Keyword search over 40K candidate IDs lost its hit")
+            sys.exit(1)
+        print("  [OK] Keyword search accepts more candidate IDs than SQLite variables")
+
+        tagged.delete_session(exact_id)
+        if exact_id in tagged.session_index.session_ids_for(topics_any=["payments"]):
+            print("  [FAIL] Deleted session kept its postings")
+            sys.exit(1)
+        print("  [OK] Deleting a session removes its postings")
+        tagged.close()
+except Exception as e:
+    print(f"  [FAIL] Postings check failed: {e}")
+    sys.exit(1)
+
+print()
+
+# Test 22: Benchmark corpus and report comparison
+print("Test 22: Checking the benchmark corpus generator...")
+try:
+    from benchmark import compare_reports, generate_corpus, percentiles
+
+    corpus = list(generate_corpus(20, seed=7, min_chars=500, max_chars=1500))
+    if corpus != list(generate_corpus(20, seed=7, min_chars=500, max_chars=1500)):
+        print("  [FAIL] Same seed produced a different corpus")
+        sys.exit(1)
+    if corpus == list(generate_corpus(20, seed=8, min_chars=500, max_chars=1500)):
+        print("  [FAIL] Different seeds produced the same corpus")
+        sys.exit(1)
+    # The last turn may run past the target length
+    if any(not 500 <= len(record["conversation_text"]) < 1500 + 1000 for record in corpus):
+        print("  [FAIL] Conversation length outside the requested range")
+        sys.exit(1)
+    if len({record["session_id"] for record in corpus}) != 20 or any(not record["artifacts"] for record in corpus):
+        print("  [FAIL] Records are missing unique IDs or artifacts")
+        sys.exit(1)
+    print("  [OK] Corpus is deterministic per seed and within bounds")
+
+    if percentiles([float(n) for n in range(1, 101)]) != {"p50_ms": 50.0, "p95_ms": 95.0, "p99_ms": 99.0,
+                                                         "mean_ms": 50.5}:
+        print("  [FAIL] Unexpected latency percentiles")
+        sys.exit(1)
+    baseline = {"results": {"query": {"p95_ms": 10.0, "sessions_per_sec": 100.0, "count": 5}}}
+    current = {"results": {"query": {"p95_ms": 12.0, "sessions_per_sec": 80.0, "count": 50}}}
+    regressions = compare_reports(current, baseline, tolerance=0.1)
+    if len(regressions) != 2 or compare_reports(baseline, baseline, tolerance=0.1):
+        print(f"  [FAIL] Unexpected regressions: {regressions}")
+        sys.exit(1)
+    print("  [OK] Percentiles and regression comparison")
+except Exception as e:
+    print(f"  [FAIL] Benchmark check failed: {e}")
+    sys.exit(1)
+
+print()
+
+# Test 23: Configuration precedence and environment overrides
+print("Test 23: Checking configuration precedence...")
+try:
+    from config import DEFAULTS, get_config, load_config, reload_config
+
+    config_env = ("BMAD_SESSION_LOGGER_CONFIG", "BMAD_PROJECT_ROOT", "HOME", "BMAD_SESSION_LOGGER_DATABASE_PATH",
+                  "BMAD_SESSION_LOGGER_CHUNKING", "BMAD_SESSION_LOGGER_MAX_CONTEXT_SESSIONS")
+    saved_env = {name: os.environ.get(name) for name in config_env}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        try:
+            for name in config_env:
+                os.environ.pop(name, None)
+            config_file = os.path.join(tmp_dir, "config.yaml")
+            with open(config_file, "w") as f:
+                f.write("database_path: '{project-root}/sessions'\n"
+                        "max_context_sessions: 7\n"
+                        "chunk_chars: 900\n")
+            os.environ["BMAD_PROJECT_ROOT"] = tmp_dir
+            os.environ["BMAD_SESSION_LOGGER_MAX_CONTEXT_SESSIONS"] = "9"
+            os.environ["BMAD_SESSION_LOGGER_CHUNKING"] = "on"
+            loaded = load_config(config_file)
+            if (loaded["chunk_chars"] != 900 or loaded["max_context_sessions"] != 9
+                    or loaded["chunking"] is not True or loaded["hnsw_m"] != DEFAULTS["hnsw_m"]):
+                print("  [FAIL] Precedence is not environment > file > defaults")
+                sys.exit(1)
+            if loaded["database_path"] != os.path.join(tmp_dir, "sessions"):
+                print(f"  [FAIL] {{project-root}} not resolved: {loaded['database_path']}")
+                sys.exit(1)
+            print("  [OK] Environment overrides the file, which overrides defaults")
+
+            os.environ["BMAD_SESSION_LOGGER_CHUNKING"] = "sometimes"
+            try:
+                load_config(config_file)
+                print("  [FAIL] Invalid boolean override was accepted")
+                sys.exit(1)
+            except ConfigurationError:
+                print("  [OK] Invalid override raises ConfigurationError")
+            os.environ.pop("BMAD_SESSION_LOGGER_CHUNKING")
+
+            os.environ["BMAD_SESSION_LOGGER_CONFIG"] = config_file
+            reload_config()
+            cached = get_config()
+            with open(config_file, "a") as f:
+                f.write("default_query_results: 11\n")
+            if get_config()["default_query_results"] != cached["default_query_results"]:
+                print("  [FAIL] Config file re-read without reload_config")
+                sys.exit(1)
+            reload_config()
+            if get_config()["default_query_results"] != 11:
+                print("  [FAIL] reload_config did not re-read the file")
+                sys.exit(1)
+            configured = SessionDB(collection_name="configured")
+            explicit = SessionDB(collection_name="configured", chunking=True, chunk_chars=400)
+            if (configured.db_path != os.path.join(tmp_dir, "sessions") or configured.chunk_chars != 900
+                    or explicit.chunk_chars != 400):
+                print("  [FAIL] SessionDB does not take unset arguments from config")
+                sys.exit(1)
+            configured.close()
+            explicit.close()
+            print("  [OK] Config is cached per process; explicit arguments beat config")
+
+            registry = get_registry()
+            cpu_function = registry.get_embedding_function("test-model", {"embedding_device": "cpu"})
+            if (registry.get_embedding_function("test-model", {}) is not cpu_function
+                    or registry.get_embedding_function("test-model", {"embedding_device": "cuda"}) is cpu_function):
+                print("  [FAIL] Embedding functions are not keyed by device")
+                sys.exit(1)
+            print("  [OK] Embedding functions are shared per model and device")
+
+            # An unchanged default keeps using the pre-config database until the new one exists
+            with open(config_file, "w") as f:
+                f.write("collection_name: bmad_sessions\n")
+            os.environ["HOME"] = tmp_dir
+            legacy_path = os.path.join(tmp_dir, ".bmad", "data", "session-db")
+            os.makedirs(legacy_path)
+            if load_config(config_file)["database_path"] != legacy_path:
+                print("  [FAIL] Default database path did not fall back to the legacy location")
+                sys.exit(1)
+            os.makedirs(os.path.join(tmp_dir, "project", ".bmad", "data", "session-db"))
+            os.environ["BMAD_PROJECT_ROOT"] = os.path.join(tmp_dir, "project")
+            if not load_config(config_file)["database_path"].startswith(os.environ["BMAD_PROJECT_ROOT"]):
+                print("  [FAIL] Existing default database path was not used")
+                sys.exit(1)
+            print("  [OK] Legacy database path is used only until the default exists")
+        finally:
+            for name, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+            reload_config()
+except Exception as e:
+    print(f"  [FAIL] Configuration check failed: {e}")
+    sys.exit(1)
+
+print()
+
+# Test 24: NumPy storage backend
+print("Test 24: Checking the NumPy backend...")
+try:
+    import numpy as np
+    from numpy_backend import NumpyBackend
+
+    rng = np.random.default_rng(13)
+    vectors = rng.standard_normal((300, 384)).astype(np.float32)
+    ids = [f"vec-{n}" for n in range(300)]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store_path = os.path.join(tmp_dir, "sessions.numpy")
+        store = NumpyBackend(store_path)
+        store.add(ids, vectors, [f"doc {n}" for n in range(300)],
+                  [{"agent_name": "dev" if n % 3 else "pm", "n": n} for n in range(300)])
+
+        queries = rng.standard_normal((4, 384)).astype(np.float32)
+        unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        expected = [[ids[row] for row in np.argsort(-(unit @ query))[:5]] for query in queries]
+        found = store.query(queries, n_results=5, include=["distances"])
+        if found["ids"] != expected:
+            print("  [FAIL] Query does not return the exact nearest neighbours")
+            sys.exit(1)
+        if any(distance < 0 or distance > 4 for distances in found["distances"] for distance in distances):
+            print("  [FAIL] Distances are not squared L2 between unit vectors")
+            sys.exit(1)
+
+        where = {"$and": [{"agent_name": "pm"}, {"n": {"$gte": 150}}]}
+        filtered = store.query(queries[:1], n_results=50, where=where, include=["metadatas"])
+        if not filtered["ids"][0] or any(m["agent_name"] != "pm" or m["n"] < 150 for m in filtered["metadatas"][0]):
+            print("  [FAIL] where filter admitted non-matching rows")
+            sys.exit(1)
+        print("  [OK] Exact top-k with filters")
+
+        other = NumpyBackend(store_path)
+        store.upsert(["vec-0"], vectors[1:2], ["replaced"], [{"agent_name": "dev", "n": 0}])
+        store.delete(ids=["vec-2"])
+        reread = other.get(ids=["vec-0", "vec-2"], include=["documents"])
+        if reread["ids"] != ["vec-0"] or reread["documents"] != ["replaced"] or other.count() != 299:
+            print("  [FAIL] Another instance did not see upsert and delete")
+            sys.exit(1)
+        store.add(["vec-new"], vectors[2:3], ["new"], [{"agent_name": "dev", "n": 300}])
+        if other.count() != 300 or other.query(vectors[2:3], n_results=1)["ids"] != [["vec-new"]]:
+            print("  [FAIL] Freed row was not reused visibly")
+            sys.exit(1)
+        other.close()
+        store.close()
+        reopened = NumpyBackend(store_path)
+        if reopened.count() != 300:
+            print("  [FAIL] Rows were not persisted")
+            sys.exit(1)
+        reopened.close()
+        print("  [OK] Writes are shared between instances and persist")
+
+        numpy_db = SessionDB(db_path=tmp_dir, collection_name="numpy-db", backend="numpy", query_cache=False)
+        numpy_id = numpy_db.save_session(test_conversation, "architect", "Winston", "test-project")
+        hits = numpy_db.query_sessions("vector database for session logging", n_results=1, include=["metadata"])
+        if not hits or hits[0]["session_id"] != numpy_id:
+            print("  [FAIL] SessionDB on the numpy backend did not find its session")
+            sys.exit(1)
+        numpy_db.close()
+        print("  [OK] SessionDB works on the numpy backend")
+except Exception as e:
+    print(f"  [FAIL] NumPy backend check failed: {e}")
+    sys.exit(1)
+
+print()
+
+# Test 25: Multi-query batch search
+print("Test 25: Checking batch queries...")
+try:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        batch_db = SessionDB(db_path=tmp_dir, collection_name="batch", query_cache=False)
+        batch_db.save_session(test_conversation, "architect", "Winston", "test-project")
+        batch_db.save_session("User: Plan the sprint backlog.\nAssistant: Ranked the stories by value.",
+                              "pm", "John", "test-project")
+        batch_db.save_session("User: Write tests for the login form.\nAssistant: Added form validation tests.",
+                              "dev", "Amelia", "test-project")
+        facets = ["vector database for session logging", "sprint backlog stories", "login form tests"]
+        singles = [batch_db.query_sessions(text, n_results=2, include=["metadata"]) for text in facets]
+
+        embed_calls, store_calls = [], []
+        plain_embed, plain_query = batch_db._embed, batch_db.collection.query
+        batch_db._embed = lambda texts: embed_calls.append(len(texts)) or plain_embed(texts)
+        batch_db.collection.query = lambda *args, **kwargs: store_calls.append(1) or plain_query(*args, **kwargs)
+        batched = batch_db.query_sessions_batch(facets, n_results=2, include=["metadata"])
+        if embed_calls != [3] or len(store_calls) != 1:
+            print(f"  [FAIL] Batch used {len(embed_calls)} embedding and {len(store_calls)} store calls")
+            sys.exit(1)
+        if [[hit["session_id"] for hit in hits] for hits in batched] != \
+                [[hit["session_id"] for hit in hits] for hits in singles]:
+            print("  [FAIL] Batch results differ from single queries")
+            sys.exit(1)
+        print("  [OK] One embedding pass and one store call return the single-query results")
+
+        merged = batch_db.query_sessions_batch(facets, n_results=3, include=["metadata"], merge=True)
+        batched = batch_db.query_sessions_batch(facets, n_results=3, include=["metadata"])
+        merged_ids = [hit["session_id"] for hit in merged]
+        if len(merged_ids) != 3 or len(set(merged_ids)) != 3:
+            print(f"  [FAIL] Merged ranking is not deduplicated: {merged_ids}")
+            sys.exit(1)
+        for hit in merged:
+            if any(hit["session_id"] not in [h["session_id"] for h in batched[q]] for q in hit["matched_queries"]):
+                print("  [FAIL] matched_queries names a query that did not find the session")
+                sys.exit(1)
+        print("  [OK] merge=True returns one deduplicated ranking with matched_queries")
+        batch_db.close()
+except Exception as e:
+    print(f"  [FAIL] Batch query check failed: {e}")
+    sys.exit(1)
+
+print()
+
+# Test 26: Query result cache invalidation
+print("Test 26: Checking the query cache...")
+try:
+    import time
+    from query_cache import QueryCache
+
+    cache = QueryCache(max_items=2, ttl_seconds=0.2)
+    cache.put("a", [{"session_id": "s1"}], generation=1)
+    served = cache.get("a", generation=1)
+    served[0]["session_id"] = "changed"
+    if cache.get("a", generation=1) != [{"session_id": "s1"}]:
+        print("  [FAIL] Cached value was not copied")
+        sys.exit(1)
+    if cache.get("a", generation=2) is not None or cache.get("a", generation=1) is not None:
+        print("  [FAIL] Entry from an older generation was served")
+        sys.exit(1)
+    cache.put("b", "old", generation=1)
+    time.sleep(0.3)
+    if cache.get("b", generation=1) is not None:
+        print("  [FAIL] Expired entry was served")
+        sys.exit(1)
+    for key in ("c", "d", "e"):
+        cache.put(key, key, generation=1)
+    stats = cache.stats()
+    if cache.get("c", generation=1) is not None or (stats["stale"], stats["expired"], stats["evictions"]) != (1, 1, 1):
+        print(f"  [FAIL] Unexpected cache counters: {stats}")
+        sys.exit(1)
+    print("  [OK] Entries are copied and dropped by generation, TTL and LRU")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cached_db = SessionDB(db_path=tmp_dir, collection_name="cached")
+        cached_db.save_session(test_conversation, "architect", "Winston", "test-project")
+        first = cached_db.query_sessions("Kubernetes TLS ingress", n_results=5, include=["metadata"])
+        again = cached_db.query_sessions("Kubernetes TLS ingress", n_results=5, include=["metadata"])
+        if cached_db.query_cache.stats()["hits"] != 1 or again != first:
+            print("  [FAIL] Repeated query was not served from the cache")
+            sys.exit(1)
+        new_id = cached_db.save_session("User: Kubernetes ingress TLS renewal again.\nAssistant: Use cert-manager.",
+                                        "dev", "Amelia", "test-project")
+        after_write = cached_db.query_sessions("Kubernetes TLS ingress", n_results=5, include=["metadata"])
+        if new_id not in [hit["session_id"] for hit in after_write]:
+            print("  [FAIL] A write did not invalidate the cached query")
+            sys.exit(1)
+        cached_db.delete_session(new_id)
+        after_delete = cached_db.query_sessions("Kubernetes TLS ingress", n_results=5, include=["metadata"])
+        if new_id in [hit["session_id"] for hit in after_delete]:
+            print("  [FAIL] A delete did not invalidate the cached query")
+            sys.exit(1)
+        print("  [OK] Saves and deletes invalidate cached queries")
+        cached_db.close()
+except Exception as e:
+    print(f"  [FAIL] Query cache check failed: {e}")
+    sys.exit(1)
+
+print()
+
+# Test 27: Top-k under min_relevance and filters
+print("Test 27: Checking top-k widening...")
+try:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        widened = SessionDB(db_path=tmp_dir, collection_name="widen", chunking=True,
+                            chunk_chars=200, chunk_overlap=50, query_cache=False)
+        flooding_id = widened.save_session(
+            "\n".join(f"User: kubernetes ingress tls certificate renewal step {n}" for n in range(120)),
+            "dev", "Amelia", "test-project")
+        other_ids = [
+            widened.save_session(f"User: kubernetes ingress tls question {n}.\nAssistant: See runbook {n}.",
+                                 "pm" if n == 0 else "dev", "Amelia", "test-project")
+            for n in range(3)
+        ]
+        if widened.chunk_collection.count() <= 3 * 8:
+            print("  [FAIL] Flooding session does not fill the first fetch window")
+            sys.exit(1)
+
+        fetches = []
+        plain_query = widened.chunk_collection.query
+        widened.chunk_collection.query = lambda *args, **kwargs: fetches.append(kwargs["n_results"]) or \
+            plain_query(*args, **kwargs)
+        top = widened.query_sessions("kubernetes ingress tls certificate renewal", n_results=3, include=[])
+        top_ids = [hit["session_id"] for hit in top]
+        if top_ids[:1] != [flooding_id] or not set(top_ids[1:]) <= set(other_ids) or len(top) != 3:
+            print(f"  [FAIL] Search did not return 3 sessions: {top_ids}")
+            sys.exit(1)
+        if len(fetches) < 2 or fetches != sorted(fetches):
+            print(f"  [FAIL] Chunk fetch did not widen: {fetches}")
+            sys.exit(1)
+        print(f"  [OK] Chunk fetch widened {fetches} until 3 sessions qualified")
+
+        everything = widened.query_sessions("kubernetes ingress tls certificate renewal", n_results=10, include=[])
+        threshold = (everything[1]["relevance_score"] + everything[2]["relevance_score"]) / 2
+        above = widened.query_sessions("kubernetes ingress tls certificate renewal", n_results=10,
+                                       min_relevance=threshold, include=[])
+        if [hit["session_id"] for hit in above] != [hit["session_id"] for hit in everything[:2]]:
+            print("  [FAIL] min_relevance did not return exactly the sessions above it")
+            sys.exit(1)
+        filtered = widened.query_sessions("kubernetes ingress tls certificate renewal", n_results=3,
+                                          agent_name="dev", include=["metadata"])
+        if len(filtered) != 3 or other_ids[0] in [hit["session_id"] for hit in filtered]:
+            print("  [FAIL] Filtered search returned fewer sessions than exist")
+            sys.exit(1)
+        print("  [OK] min_relevance and filters keep top-k complete")
+        widened.close()
+except Exception as e:
+    print(f"  [FAIL] Widening check failed: {e}")
+    sys.exit(1)
+
+print()
+
+# Test 28: Token-budgeted context assembly
+print("Test 28: Checking the context budget...")
+try:
+    from context_builder import CHARS_PER_TOKEN, build_context
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        budget_db = SessionDB(db_path=tmp_dir, collection_name="budget", chunking=True,
+                              chunk_chars=300, chunk_overlap=50, query_cache=False)
+        budget_db.save_session(long_session, "dev", "Amelia", "test-project")
+        budget_db.save_session(test_conversation, "architect", "Winston", "test-project")
+        budget_query = "automate cert-manager renewal of the ingress TLS certificate"
+        budget_hits = budget_db.query_sessions(budget_query, n_results=2, include=["metadata", "excerpt"])
+        for budget_tokens in (60, 150, 400):
+            context = build_context(budget_db, [budget_query], budget_hits, budget_tokens=budget_tokens)
+            if not context or len(context) > budget_tokens * CHARS_PER_TOKEN:
+                print(f"  [FAIL] Context of {len(context)} chars for a {budget_tokens}-token budget")
+                sys.exit(1)
+            if budget_tokens >= 150 and "cert-manager" not in context:
+                print(f"  [FAIL] {budget_tokens}-token context misses the relevant passage")
+                sys.exit(1)
+        if "holiday schedule" in build_context(budget_db, [budget_query], budget_hits, budget_tokens=150):
+            print("  [FAIL] Small budget was spent on an unrelated passage of the long session")
+            sys.exit(1)
+        print("  [OK] Context stays within budget and includes the relevant passage")
+        budget_db.close()
+
+        # Without chunk vectors the context is packed from stored excerpts
+        plain_db = SessionDB(db_path=tmp_dir)
+        plain_db.save_session(test_conversation, "architect", "Winston", "test-project")
+        passage_calls = []
+        plain_score_passages = SessionDB.score_passages
+        SessionDB.score_passages = lambda self, *args, **kwargs: passage_calls.append(1) or \
+            plain_score_passages(self, *args, **kwargs)
+        try:
+            packed = get_relevant_context("vector database for session logging", db_path=tmp_dir,
+                                          min_relevance=0.0, budget_tokens=100)
+        finally:
+            SessionDB.score_passages = plain_score_passages
+        if not packed or len(packed) > 100 * CHARS_PER_TOKEN or passage_calls:
+            print(f"  [FAIL] Unchunked context scored passages or exceeded the budget ({len(packed)} chars)")
+            sys.exit(1)
+        legacy = get_relevant_context("vector database for session logging", db_path=tmp_dir,
+                                      min_relevance=0.0, budget_tokens=0)
+        if "vector database" not in legacy:
+            print("  [FAIL] budget_tokens=0 did not show the session opening")
+            sys.exit(1)
+        plain_db.close()
+        print("  [OK] Unchunked sessions are packed from excerpts without embedding passages")
+except Exception as e:
+    print(f"  [FAIL] Context budget check failed: {e}")
+    sys.exit(1)
+
+print()
+
+# Test 29: MMR diversity reranking
+print("Test 29: Checking MMR reranking...")
+try:
+    import numpy as np
+    from mmr import mmr_select
+
+    candidate_vectors = np.array([[1.0, 0.0], [0.995, 0.0998], [0.0, 1.0]], dtype=np.float32)
+    relevances = [0.9, 0.89, 0.7]
+    if mmr_select(relevances, candidate_vectors, lambda_=1.0) != [0, 1, 2]:
+        print("  [FAIL] lambda 1.0 does not rank by relevance")
+        sys.exit(1)
+    if mmr_select(relevances, candidate_vectors, lambda_=0.5) != [0, 2, 1]:
+        print("  [FAIL] A near-duplicate was not demoted below a distinct candidate")
+        sys.exit(1)
+    skipped = mmr_select(relevances, candidate_vectors, k=2, lambda_=0.5, accept=lambda index: index != 2)
+    if skipped != [0, 1]:
+        print(f"  [FAIL] Rejected candidate was selected or counted: {skipped}")
+        sys.exit(1)
+    print("  [OK] mmr_select trades relevance for diversity and honors accept")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        diverse_db = SessionDB(db_path=tmp_dir, collection_name="mmr", dedup_policy="none", query_cache=False)
+        twin_text = "User: Kubernetes ingress TLS certificate renewal with cert-manager.\nAssistant: Done."
+        twin_ids = [diverse_db.save_session(twin_text, "dev", "Amelia", "test-project") for _ in range(2)]
+        diverse_db.save_session("User: Kubernetes ingress TLS timeouts.\nAssistant: Raised the limit.",
+                                "dev", "Amelia", "test-project")
+        diverse_db.save_session(test_conversation, "architect", "Winston", "test-project")
+        query_text = "Kubernetes ingress TLS certificate renewal"
+        by_relevance = diverse_db.query_sessions(query_text, n_results=2, include=[])
+        diverse = diverse_db.query_sessions(query_text, n_results=2, include=[], mmr_lambda=0.5)
+        if sorted(hit["session_id"] for hit in by_relevance) != sorted(twin_ids):
+            print("  [FAIL] Plain ranking did not put the identical sessions first")
+            sys.exit(1)
+        diverse_ids = [hit["session_id"] for hit in diverse]
+        if diverse_ids[0] not in twin_ids or len(diverse_ids) != 2 or diverse_ids[1] in twin_ids:
+            print("  [FAIL] MMR kept the duplicate instead of the distinct session")
+            sys.exit(1)
+        print("  [OK] mmr_lambda replaces a duplicate hit with a distinct one")
+        diverse_db.close()
+except Exception as e:
+    print(f"  [FAIL] MMR check failed: {e}")
+    sys.exit(1)
+
+print()
+
+# Test 30: Duplicate detection and dedup policies
+print("Test 30: Checking dedup policies...")
+try:
+    words = ["ingress", "renewal", "cluster", "issuer", "secret", "namespace", "helm", "chart",
+             "probe", "replica", "rollout", "canary", "metrics", "alert", "budget", "quota"]
+    base_text = "\n".join(
+        f"User: step {n} checks the {words[n % 16]} and {words[(n * 7) % 16]} settings."
+        for n in range(40)
+    )
+    near_text = base_text.replace("step 39 checks", "step 39 reviews")
+    copy_text = "  " + base_text.replace("\n", "\n ") + "\n"
+
+    def policy_db(tmp_dir, policy):
+        return SessionDB(db_path=tmp_dir, collection_name=f"dedup-{policy}", dedup_policy=policy,
+                         dedup_threshold=0.8, query_cache=False)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        skip_db = policy_db(tmp_dir, "skip")
+        original_id = skip_db.save_session(base_text, "dev", "Amelia", "test-project", topics=["ingress"])
+        if (skip_db.save_session(copy_text, "dev", "Amelia", "test-project", topics=["extra"]) != original_id
+                or skip_db.save_session(near_text, "dev", "Amelia", "test-project") != original_id
+                or skip_db.collection.count() != 1):
+            print("  [FAIL] skip policy stored a duplicate")
+            sys.exit(1)
+        if skip_db.session_index.session_ids_for(topics_any=["extra"]):
+            print("  [FAIL] skip policy changed the stored session")
+            sys.exit(1)
+        skip_db.close()
+
+        merge_db = policy_db(tmp_dir, "merge")
+        original_id = merge_db.save_session(base_text, "dev", "Amelia", "test-project", topics=["ingress"])
+        merged_id = merge_db.save_session(copy_text, "dev", "Amelia", "test-project", topics=["extra"])
+        if merged_id != original_id or merge_db.session_index.session_ids_for(topics_any=["extra"]) != {original_id}:
+            print("  [FAIL] merge policy did not fold the copy's topics into the stored session")
+            sys.exit(1)
+        merge_db.close()
+        print("  [OK] skip and merge keep one stored copy")
+
+        revision_db = policy_db(tmp_dir, "revision")
+        original_id = revision_db.save_session(base_text, "dev", "Amelia", "test-project")
+        revision_id = revision_db.save_session(near_text, "dev", "Amelia", "test-project")
+        exact_id = revision_db.save_session(copy_text, "dev", "Amelia", "test-project", topics=["extra"])
+        revision = revision_db.get_session_by_id(revision_id)
+        if revision_id == original_id or revision["metadata"].get("revision_of") != original_id:
+            print("  [FAIL] Near duplicate was not stored as a revision")
+            sys.exit(1)
+        if exact_id != original_id or revision_db.collection.count() != 2:
+            print("  [FAIL] Exact copy was stored under the revision policy")
+            sys.exit(1)
+        if revision_db.session_index.session_ids_for(topics_any=["extra"]):
+            print("  [FAIL] revision policy merged the exact copy's metadata")
+            sys.exit(1)
+        distinct_id = revision_db.save_session(test_conversation, "architect", "Winston", "test-project")
+        if distinct_id in (original_id, revision_id):
+            print("  [FAIL] A distinct session was treated as a duplicate")
+            sys.exit(1)
+        revision_db.close()
+        print("  [OK] revision links near duplicates and skips exact copies")
+
+        batch_db = policy_db(tmp_dir, "skip")
+        batch_ids = batch_db.save_sessions([
+            {"conversation_text": text, "agent_name": "dev", "agent_persona": "Amelia",
+             "project_name": "test-project"}
+            for text in (near_text, copy_text, test_conversation)
+        ])
+        if batch_ids[0] != batch_ids[1] or batch_db.collection.count() != 2:
+            print(f"  [FAIL] Duplicates within one batch were both stored: {batch_ids}")
+            sys.exit(1)
+        batch_db.close()
+
+        none_db = policy_db(tmp_dir, "none")
+        none_db.save_session(base_text, "dev", "Amelia", "test-project")
+        none_db.save_session(base_text, "dev", "Amelia", "test-project")
+        if none_db.collection.count() != 2:
+            print("  [FAIL] Policy 'none' still deduplicated")
+            sys.exit(1)
+        none_db.close()
+        print("  [OK] Batches fold duplicates among themselves; 'none' stores every copy")
+except Exception as e:
+    print(f"  [FAIL] Dedup check failed: {e}")
+    sys.exit(1)
+
+print()
+
+# Test 31: Incremental open/append/close capture
+print("Test 31: Checking incremental session capture...")
+try:
+    from session_db import SessionNotFoundError, count_messages
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        streaming = SessionDB(db_path=tmp_dir, collection_name="streaming", chunking=True,
+                              chunk_chars=400, chunk_overlap=100, query_cache=False)
+        open_id = streaming.open_session("dev", "Amelia", "test-project", topics=["ingress"])
+        if streaming.get_session_by_id(open_id)["metadata"]["session_status"] != "in_progress":
+            print("  [FAIL] Opened session is not listed as in progress")
+            sys.exit(1)
+
+        embedded = []
+        for start in range(0, len(long_turns), 4):
+            batch = long_turns[start:start + 4]
+            if start % 8:
+                batch = [{"role": turn.split(": ", 1)[0].lower(), "content": turn.split(": ", 1)[1]}
+                         for turn in batch]
+            embedded.append(streaming.append_turns(open_id, batch))
+        if max(embedded) > 3:
+            print(f"  [FAIL] An append embedded more than its own chunks: {embedded}")
+            sys.exit(1)
+        partial = streaming.get_session_by_id(open_id)
+        if (partial["conversation"] != long_session
+                or partial["metadata"]["message_count"] != count_messages(long_session)):
+            print("  [FAIL] Open session does not return the conversation appended so far")
+            sys.exit(1)
+        query_text = "automate cert-manager renewal of the ingress TLS certificate"
+        if [hit["session_id"] for hit in streaming.query_sessions(query_text, n_results=1, include=[])] != [open_id]:
+            print("  [FAIL] Open session is not searchable by vector")
+            sys.exit(1)
+        print(f"  [OK] {len(embedded)} appends embedded at most {max(embedded)} chunks each")
+
+        # Another process (here: a fresh engine) continues from the stored state
+        streaming.close()
+        close_engines(db_path=tmp_dir)
+        resumed = SessionDB(db_path=tmp_dir, collection_name="streaming", chunking=True,
+                            chunk_chars=400, chunk_overlap=100, query_cache=False)
+        resumed.append_turns(open_id, ["User: Thanks, closing the ticket now."])
+        if resumed.close_session(open_id, artifacts=["k8s/cert-manager.yaml"]) != open_id:
+            print("  [FAIL] close_session did not return the session ID")
+            sys.exit(1)
+        full_text = long_session + "\nUser: Thanks, closing the ticket now."
+        closed = resumed.get_session_by_id(open_id)
+        if closed["conversation"] != full_text or closed["metadata"]["session_status"] != "completed":
+            print("  [FAIL] Closed session is not the completed full conversation")
+            sys.exit(1)
+        expected_chunks = chunk_conversation(full_text, max_chars=400, overlap=100)
+        stored_chunks = resumed.chunk_collection.get(where={"session_id": open_id}, include=["documents"])
+        if sorted(stored_chunks["documents"]) != sorted(chunk["text"] for chunk in expected_chunks):
+            print("  [FAIL] Incremental chunks differ from chunking the whole conversation")
+            sys.exit(1)
+        keyword_hits = resumed.query_sessions("ClusterIssuer", mode="lexical", include=[])
+        if open_id not in [hit["session_id"] for hit in keyword_hits]:
+            print("  [FAIL] Closed session is not searchable by keyword")
+            sys.exit(1)
+        print("  [OK] A resumed session closes to the same chunks as a one-shot save")
+
+        empty_id = resumed.open_session("pm", "John", "test-project")
+        listed_ids = [session["session_id"] for session in resumed.list_sessions()]
+        if empty_id not in listed_ids:
+            print("  [FAIL] Opened session is not listed")
+            sys.exit(1)
+        if resumed.close_session(empty_id) is not None or empty_id in [
+                session["session_id"] for session in resumed.list_sessions()]:
+            print("  [FAIL] Empty session was stored")
+            sys.exit(1)
+        try:
+            resumed.append_turns(empty_id, ["User: too late"])
+            print("  [FAIL] Appending to a closed session was accepted")
+            sys.exit(1)
+        except SessionNotFoundError:
+            print("  [OK] Empty sessions are discarded; closed sessions reject appends")
+        resumed.close()
+except Exception as e:
+    print(f"  [FAIL] Incremental capture check failed: {e}")
+    sys.exit(1)
+
+print()
+
+# Test 32: Metrics and stats()
+print("Test 32: Checking metrics and stats()...")
+try:
+    import json
+    from metrics import Histogram, Metrics
+
+    disabled = Metrics(enabled=False)
+    disabled.count("saves")
+    with disabled.timer("save"):
+        pass
+    if disabled.snapshot()["counters"] or disabled.snapshot()["stages"]:
+        print("  [FAIL] Disabled metrics recorded values")
+        sys.exit(1)
+
+    histogram = Histogram()
+    for seconds in (0.002, 0.002, 0.004, 0.2):
+        histogram.observe(seconds)
+    if histogram.quantile(0.5) != 0.0025 or histogram.quantile(1.0) != 0.2 or histogram.summary()["count"] != 4:
+        print(f"  [FAIL] Unexpected histogram summary: {histogram.summary()}")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        slow_log = os.path.join(tmp_dir, "slow.jsonl")
+        recorded = Metrics(enabled=True, slow_query_ms=1.0, slow_query_log_path=slow_log)
+        recorded.count("errors.save")
+        with recorded.timer("embed"):
+            pass
+        recorded.slow_query(0.5, ["a slow query"], mode="vector")
+        recorded.slow_query(0.0001, ["a fast query"])
+        prometheus = recorded.to_prometheus()
+        if ("bmad_session_logger_errors_save_total 1" not in prometheus
+                or 'bmad_session_logger_stage_seconds_count{stage="embed"} 1' not in prometheus):
+            print("  [FAIL] Prometheus text is missing counters or stages")
+            sys.exit(1)
+        with open(slow_log) as f:
+            slow_entries = [json.loads(line) for line in f]
+        if len(slow_entries) != 1 or slow_entries[0]["queries"] != ["a slow query"]:
+            print(f"  [FAIL] Unexpected slow-query log: {slow_entries}")
+            sys.exit(1)
+        dumped = recorded.dump(os.path.join(tmp_dir, "metrics.json"))
+        with open(dumped) as f:
+            if json.load(f)["counters"] != {"errors.save": 1, "slow_queries": 1}:
+                print("  [FAIL] JSON dump does not match the counters")
+                sys.exit(1)
+        print("  [OK] Counters, histograms, slow-query log and dumps")
+
+        measured = SessionDB(db_path=tmp_dir, collection_name="measured")
+        process_metrics = measured.metrics
+        was_enabled = process_metrics.enabled
+        process_metrics.enabled = True
+        process_metrics.reset()
+        try:
+            measured.save_session(test_conversation, "architect", "Winston", "test-project")
+            measured.query_sessions("vector database for session logging", n_results=1)
+            measured.query_sessions("vector database for session logging", n_results=1)
+            stats = measured.stats()
+        finally:
+            process_metrics.enabled = was_enabled
+            process_metrics.reset()
+        if stats["counters"].get("saves") != 1 or stats["counters"].get("query_cache_hits") != 1:
+            print(f"  [FAIL] Unexpected counters: {stats['counters']}")
+            sys.exit(1)
+        if not {"save", "embed", "store_write", "query", "store_query"} <= set(stats["stages"]):
+            print(f"  [FAIL] Missing stages: {sorted(stats['stages'])}")
+            sys.exit(1)
+        if stats["sessions"] != 1 or stats["query_cache"]["hits"] != 1 or stats["open_sessions"] != 0:
+            print("  [FAIL] stats() sizes do not match the collection")
+            sys.exit(1)
+        measured.close()
+        print("  [OK] stats() reports per-stage timings, counters and cache sizes")
+except Exception as e:
+    print(f"  [FAIL] Metrics check failed: {e}")
+    sys.exit(1)
+
+print()
+
+# Test 33: Tracing and profiling
+print("Test 33: Checking tracing and profiling...")
+try:
+    import json
+    from tracing import TraceFileExporter, add_span_listener, profile, remove_span_listener, span
+
+    if span("idle"):
+        print("  [FAIL] Spans are recorded while tracing is off")
+        sys.exit(1)
+
+    finished = []
+    add_span_listener(finished.append)
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            traced = SessionDB(db_path=tmp_dir, collection_name="traced", query_cache=False)
+            traced.save_session(test_conversation, "architect", "Winston", "test-project")
+            traced.query_sessions("vector database for session logging", n_results=1, agent_name="architect")
+            traced.close()
+        try:
+            with span("failing"):
+                raise KeyError("boom")
+        except KeyError:
+            pass
+    finally:
+        remove_span_listener(finished.append)
+
+    by_name = {}
+    for finished_span in finished:
+        by_name.setdefault(finished_span.name, finished_span)
+    save_span, query_span = by_name.get("save_session"), by_name.get("query_sessions")
+    if save_span is None or query_span is None or "failing" not in by_name:
+        print(f"  [FAIL] Missing spans: {sorted(by_name)}")
+        sys.exit(1)
+    save_children = {s.name for s in finished if s.parent_id == save_span.span_id}
+    query_children = {s.name for s in finished if s.parent_id == query_span.span_id}
+    if not {"embed", "store_write"} <= save_children or not {"embed", "store_query"} <= query_children:
+        print(f"  [FAIL] Stage spans not nested: {save_children}, {query_children}")
+        sys.exit(1)
+    if save_span.attributes.get("doc_bytes") != len(test_conversation.encode("utf-8")):
+        print("  [FAIL] save_session span lacks doc_bytes")
+        sys.exit(1)
+    if query_span.attributes.get("filters") != {"agent_name": "architect"}:
+        print(f"  [FAIL] Unexpected query filters attribute: {query_span.attributes.get('filters')}")
+        sys.exit(1)
+    if not by_name["failing"].error.startswith("KeyError") or span("idle"):
+        print("  [FAIL] Span error not recorded or tracing left on")
+        sys.exit(1)
+    print("  [OK] Pipeline spans nest their stages and carry attributes and errors")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for trace_format in ("jsonl", "chrome"):
+            trace_path = os.path.join(tmp_dir, f"trace.{trace_format}")
+            exporter = TraceFileExporter(trace_path, trace_format)
+            for finished_span in finished[:3]:
+                exporter(finished_span)
+            exporter.close()
+            with open(trace_path) as f:
+                lines = f.read().splitlines()
+            if trace_format == "chrome":
+                events = json.loads("\n".join(lines).rstrip(",") + "]")
+                if [event["ph"] for event in events] != ["X"] * 3:
+                    print("  [FAIL] Chrome trace is not a list of complete events")
+                    sys.exit(1)
+            elif [json.loads(line)["span_id"] for line in lines] != [s.span_id for s in finished[:3]]:
+                print("  [FAIL] JSON-lines trace does not hold one span per line")
+                sys.exit(1)
+        print("  [OK] JSON-lines and Chrome trace exports")
+
+        stats_path = os.path.join(tmp_dir, "call.pstats")
+        with profile("cprofile", output=stats_path) as cpu:
+            sorted(range(10000), key=lambda value: -value)
+        with profile("tracemalloc") as memory:
+            allocated = [bytearray(1024) for _ in range(100)]
+        if "sorted" not in cpu.report or not os.path.exists(stats_path) or memory.peak_bytes < 100 * 1024:
+            print("  [FAIL] Profile reports are incomplete")
+            sys.exit(1)
+        del allocated
+        try:
+            with profile("perf"):
+                pass
+            print("  [FAIL] Unknown profile mode was accepted")
+            sys.exit(1)
+        except ValueError:
+            print("  [OK] cProfile and tracemalloc profiles")
+except Exception as e:
+    print(f"  [FAIL] Tracing check failed: {e}")
+    sys.exit(1)
+
+print()
+
+# Test 34: Quantized backend recall
+print("Test 34: Checking the quantized backend...")
+try:
+    import numpy as np
+    from numpy_backend import NumpyBackend
+    from quantized_backend import QuantizedBackend, quantize_int8
+
+    rng = np.random.default_rng(25)
+    centers = rng.standard_normal((40, 384)).astype(np.float32)
+    vectors = (centers[rng.integers(0, 40, 3000)] + 0.8 * rng.standard_normal((3000, 384))).astype(np.float32)
+    queries = (centers[rng.integers(0, 40, 20)] + 0.8 * rng.standard_normal((20, 384))).astype(np.float32)
+    ids = [f"vec-{n}" for n in range(3000)]
+    metadatas = [{"n": n} for n in range(3000)]
+
+    codes, scales = quantize_int8(vectors[:100])
+    if np.abs(codes * scales[:, None] - vectors[:100]).max() > scales.max():
+        print("  [FAIL] int8 codes do not reconstruct the vectors")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        exact = NumpyBackend(os.path.join(tmp_dir, "exact"))
+        exact.add(ids, vectors, [""] * 3000, metadatas)
+        truth = exact.query(queries, n_results=10, include=["distances"])
+        exact_distances = {
+            (q, session_id): distance
+            for q, (row_ids, row_distances) in enumerate(zip(truth["ids"], truth["distances"]))
+            for session_id, distance in zip(row_ids, row_distances)
+        }
+        exact.close()
+
+        store_path = os.path.join(tmp_dir, "quantized")
+        for quantization, min_recall in (("int8", 0.95), ("binary", 0.8)):
+            store = QuantizedBackend(store_path, quantization)
+            if store.count() == 0:
+                store.add(ids, vectors, [""] * 3000, metadatas)
+            found = store.query(queries, n_results=10, include=["distances"])
+            recall = np.mean([len(set(a) & set(b)) / 10 for a, b in zip(found["ids"], truth["ids"])])
+            if recall < min_recall:
+                print(f"  [FAIL] {quantization} recall@10 is {recall:.2f}")
+                sys.exit(1)
+            for q, (row_ids, row_distances) in enumerate(zip(found["ids"], found["distances"])):
+                for session_id, distance in zip(row_ids, row_distances):
+                    expected = exact_distances.get((q, session_id))
+                    if expected is not None and abs(expected - distance) > 1e-4:
+                        print("  [FAIL] Rescored distances are not exact")
+                        sys.exit(1)
+            usage = store.memory_usage()
+            per_row = {"int8": 384 + 4, "binary": 384 // 8}[quantization]
+            if usage["codes_bytes"] != per_row * 3000:
+                print(f"  [FAIL] Unexpected {quantization} code size: {usage}")
+                sys.exit(1)
+            store.close()
+            print(f"  [OK] {quantization}: recall@10 {recall:.2f}, {per_row} bytes per vector, exact distances")
+
+        if os.path.exists(os.path.join(store_path, "int8.npy")):
+            print("  [FAIL] Switching quantization left stale int8 codes")
+            sys.exit(1)
+        try:
+            QuantizedBackend(store_path, "int4")
+            print("  [FAIL] Unknown quantization was accepted")
+            sys.exit(1)
+        except ValueError:
+            pass
+
+        quantized_db = SessionDB(db_path=tmp_dir, collection_name="quantized-db", backend="quantized",
+                                 query_cache=False)
+        quantized_id = quantized_db.save_session(test_conversation, "architect", "Winston", "test-project")
+        hits = quantized_db.query_sessions("vector database for session logging", n_results=1, include=[])
+        if [hit["session_id"] for hit in hits] != [quantized_id]:
+            print("  [FAIL] SessionDB on the quantized backend did not find its session")
+            sys.exit(1)
+        quantized_db.close()
+        print("  [OK] Switching quantization rebuilds codes; SessionDB runs on the quantized backend")
+except Exception as e:
+    print(f"  [FAIL] Quantized backend check failed: {e}")
+    sys.exit(1)
+
+print()
+
 # Success!
 print("=" * 70)
 print("[SUCCESS] ALL TESTS PASSED!")
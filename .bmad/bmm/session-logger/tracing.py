@@ -0,0 +1,341 @@
+"""
+BMAD Session Logger - Tracing
+Nested spans across the capture and query pipelines, exported to a local
+JSON-lines or Chrome trace file, plus single-call cProfile/tracemalloc
+capture.
+
+Spans cover the hooks, the query/capture helpers and SessionDB:
+
+    on_agent_start > get_relevant_context > query_sessions > embed, store_query, ...
+    on_agent_exit > capture_session_on_exit > save_session > dedup, embed, ...
+
+The innermost spans are the metric stages (see metrics.py), so a slow
+context load shows whether embedding, vector search (store_query), the
+topic/artifact prefilter or formatting took the time. Spans carry
+attributes such as db_path, n_results, filters, doc_bytes and result count.
+
+Tracing is off unless trace_path is set (config) or a listener is added
+with add_span_listener; while off, span() returns a shared no-op span. The
+trace file is appended to by every process: with trace_format "chrome" (or
+a ".json" trace_path) it is a Chrome/Perfetto trace of complete ("X")
+events, openable in chrome://tracing or ui.perfetto.dev; otherwise one
+JSON object per span.
+
+Profiling a single call:
+    with profile("cprofile", output="ctx.pstats") as result:
+        get_relevant_context("auth design")
+    print(result.report)
+"""
+
+import io
+import os
+import json
+import time
+import logging
+import threading
+import itertools
+import contextvars
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+from config import get_config
+
+
+# Configure logging
+logger = logging.getLogger("bmad.session_logger.tracing")
+
+
+# Constants
+TRACE_FORMATS = ("jsonl", "chrome")
+PROFILE_MODES = ("cprofile", "tracemalloc")
+PROFILE_TOP = 25             # lines in a profile report
+ATTRIBUTE_CHARS = 200        # longer string attributes are truncated
+
+
+class Span:
+    """One timed operation; attributes can be added until it ends."""
+
+    __slots__ = ("name", "span_id", "parent_id", "trace_id", "attributes",
+                 "start_ns", "duration_ns", "error", "thread_id")
+
+    def __init__(self, name: str, span_id: int, parent: Optional["Span"], attributes: Dict):
+        self.name = name
+        self.span_id = span_id
+        self.parent_id = parent.span_id if parent is not None else None
+        self.trace_id = parent.trace_id if parent is not None else span_id
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.duration_ns = 0
+        self.error = None
+        self.thread_id = threading.get_ident()
+
+    def set(self, **attributes) -> None:
+        """Add or replace attributes."""
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "trace_id": f"{os.getpid()}-{self.trace_id}",
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start_ns / 1e9,
+            "duration_ms": round(self.duration_ns / 1e6, 3),
+            "pid": os.getpid(),
+            "tid": self.thread_id,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NullSpan:
+    """Shared stand-in for span() while tracing is off."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def __bool__(self):
+        # "if current:" guards attributes that are costly to compute
+        return False
+
+    def set(self, **attributes) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+_current_span: contextvars.ContextVar = contextvars.ContextVar("bmad_session_logger_span", default=None)
+
+
+def _clean(value):
+    """Make an attribute value compact and JSON-serializable."""
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, str):
+        return value if len(value) <= ATTRIBUTE_CHARS else value[:ATTRIBUTE_CHARS] + "..."
+    if isinstance(value, dict):
+        return {str(key): _clean(item) for key, item in value.items() if item is not None}
+    if isinstance(value, (list, tuple, set)):
+        return [_clean(item) for item in value]
+    return _clean(str(value))
+
+
+class TraceFileExporter:
+    """Appends finished spans to a trace file.
+
+    Args:
+        path: Trace file (created with its parent directory if missing)
+        trace_format: "jsonl" (one span per line) or "chrome" (trace events)
+    """
+
+    def __init__(self, path: str, trace_format: str = "jsonl"):
+        if trace_format not in TRACE_FORMATS:
+            raise ValueError(f"Unknown trace format '{trace_format}', expected one of {TRACE_FORMATS}")
+        self.path = path
+        self.trace_format = trace_format
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        if trace_format == "chrome" and self._file.tell() == 0:
+            # JSON Array Format: the closing bracket is optional, so
+            # processes can keep appending events
+            self._file.write("[\n")
+            self._file.flush()
+
+    def __call__(self, span: Span) -> None:
+        if self.trace_format == "chrome":
+            record = {
+                "name": span.name,
+                "cat": "bmad_session_logger",
+                "ph": "X",
+                "ts": span.start_ns // 1000,
+                "dur": span.duration_ns // 1000,
+                "pid": os.getpid(),
+                "tid": span.thread_id,
+                "args": dict(span.attributes, **({"error": span.error} if span.error else {})),
+            }
+            line = json.dumps(record) + ",\n"
+        else:
+            line = json.dumps(span.to_dict()) + "\n"
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line)
+                self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class Tracer:
+    """Creates spans and hands finished ones to the listeners."""
+
+    def __init__(self):
+        self._listeners: List[Callable[[Span], None]] = []
+        self._ids = itertools.count(1)
+        self.enabled = False
+
+    def add_listener(self, listener: Callable[[Span], None]) -> None:
+        self._listeners = self._listeners + [listener]
+        self.enabled = True
+
+    def remove_listener(self, listener: Callable[[Span], None]) -> None:
+        # Equality, not identity: each obj.method access is a new bound method
+        self._listeners = [item for item in self._listeners if item != listener]
+        self.enabled = bool(self._listeners)
+
+    def span(self, name: str, **attributes):
+        """Context manager for a span nested in the current one (no-op when off)."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return self._span(name, attributes)
+
+    @contextmanager
+    def _span(self, name: str, attributes: Dict):
+        span = Span(name, next(self._ids), _current_span.get(), attributes)
+        token = _current_span.set(span)
+        started = time.perf_counter_ns()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.duration_ns = time.perf_counter_ns() - started
+            _current_span.reset(token)
+            self._finish(span)
+
+    def _finish(self, span: Span) -> None:
+        span.attributes = _clean(span.attributes)
+        for listener in self._listeners:
+            try:
+                listener(span)
+            except Exception as e:
+                logger.warning(f"Span listener {listener!r} failed: {e}")
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """Process-wide Tracer, exporting to trace_path when it is configured."""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                tracer = Tracer()
+                config = get_config()
+                if config["trace_path"]:
+                    trace_format = config["trace_format"] or (
+                        "chrome" if config["trace_path"].endswith(".json") else "jsonl"
+                    )
+                    try:
+                        tracer.add_listener(TraceFileExporter(config["trace_path"], trace_format))
+                    except (OSError, ValueError) as e:
+                        logger.warning(f"Tracing disabled: {e}")
+                _tracer = tracer
+    return _tracer
+
+
+def span(name: str, **attributes):
+    """Open a span on the process-wide tracer (see Tracer.span).
+
+    Example:
+        with span("get_relevant_context", db_path=db_path) as current:
+            ...
+            current.set(results=len(results))
+    """
+    return get_tracer().span(name, **attributes)
+
+
+def add_span_listener(listener: Callable[[Span], None]) -> None:
+    """Receive every finished span (turns tracing on).
+
+    Listeners run on the thread that ended the span and must be quick.
+    """
+    get_tracer().add_listener(listener)
+
+
+def remove_span_listener(listener: Callable[[Span], None]) -> None:
+    get_tracer().remove_listener(listener)
+
+
+# Profiling
+
+class ProfileResult:
+    """Outcome of profile(): report text, plus the pstats.Stats or snapshot."""
+
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.report = ""
+        self.stats = None
+        self.peak_bytes = None
+        self.seconds = 0.0
+
+
+@contextmanager
+def profile(mode: str = "cprofile", output: str = None, top: int = PROFILE_TOP):
+    """Profile the calls made inside the block.
+
+    Args:
+        mode: "cprofile" (CPU time per function) or "tracemalloc" (memory
+            allocated per source line, and the peak)
+        output: File for the raw data (optional): a .pstats dump for
+            cprofile, a tracemalloc snapshot otherwise
+        top: Lines in the report
+
+    Yields:
+        ProfileResult, filled in when the block exits
+
+    Raises:
+        ValueError: If the mode is unknown
+    """
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode '{mode}', expected one of {PROFILE_MODES}")
+    result = ProfileResult(mode)
+    started = time.perf_counter()
+
+    if mode == "cprofile":
+        import cProfile
+        import pstats
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield result
+        finally:
+            profiler.disable()
+            result.seconds = time.perf_counter() - started
+            stream = io.StringIO()
+            result.stats = pstats.Stats(profiler, stream=stream).sort_stats("cumulative")
+            result.stats.print_stats(top)
+            result.report = stream.getvalue()
+            if output:
+                profiler.dump_stats(output)
+    else:
+        import tracemalloc
+
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        try:
+            yield result
+        finally:
+            result.seconds = time.perf_counter() - started
+            snapshot = tracemalloc.take_snapshot()
+            result.peak_bytes = tracemalloc.get_traced_memory()[1]
+            if not was_tracing:
+                tracemalloc.stop()
+            result.stats = snapshot
+            lines = [f"Peak traced memory: {result.peak_bytes / 1024:.1f} KiB"]
+            lines += [str(stat) for stat in snapshot.statistics("lineno")[:top]]
+            result.report = "\n".join(lines) + "\n"
+            if output:
+                snapshot.dump(output)
@@ -0,0 +1,195 @@
+"""
+BMAD Session Logger - Write Lock
+Single-writer file lock and write-ahead spool shared by every process that
+opens the same collection.
+
+Agent processes, hooks and scripts each open the database on their own, and
+nothing else coordinates their writes to the same SQLite and vector files.
+A writer first takes ``{collection}.write.lock`` (an OS file lock, released
+by the kernel if the process dies). A save or delete that cannot get it
+within write_lock_wait_seconds (long enough to queue behind ordinary saves)
+does not wait any longer: it is written as one JSON file to
+``{collection}.write-spool/`` and returns. A spooled write is not
+searchable until a lock holder drains it. Whoever holds the
+lock drains the spool before its own write and again after releasing it,
+grouping consecutive saves into one embedding pass and one collection
+write, so a burst of parallel agents costs a few large commits instead of
+many contended small ones.
+
+Spool files are written to a temporary name and renamed into place, so a
+reader never sees half an entry, and are removed only after their write
+succeeded. Replaying an entry twice after a crash is harmless: spooled
+saves are written with upsert under the ID assigned when they were queued.
+"""
+
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+# Configure logging
+logger = logging.getLogger("bmad.session_logger.write_lock")
+
+
+# Constants
+POLL_SECONDS = 0.01          # retry interval while waiting for the file lock
+SPOOL_SUFFIX = ".json"
+DATETIME_FIELDS = ("start_time", "end_time")
+
+
+class WriterLock:
+    """Inter-process exclusive lock on a file, re-entrant within a thread.
+
+    Threads of one process share the file lock, so they are serialized by
+    an in-process lock first; nested acquires by the holding thread only
+    count depth.
+
+    Args:
+        path: Lock file (created if missing, never deleted)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._thread_lock = threading.RLock()
+        self._file = open(path, "a+b")
+        self._depth = 0
+
+    @property
+    def depth(self) -> int:
+        """Nesting depth of the holding thread (0 when not held)."""
+        return self._depth
+
+    def _try_lock_file(self) -> bool:
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def _unlock_file(self) -> None:
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Take the lock.
+
+        Args:
+            timeout: Seconds to wait; None waits indefinitely, 0 only tries
+
+        Returns:
+            True if the lock is now held by this thread
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if not self._thread_lock.acquire(timeout=-1 if timeout is None else max(timeout, 0)):
+            return False
+        if self._depth == 0:
+            while not self._try_lock_file():
+                if deadline is not None and time.monotonic() >= deadline:
+                    self._thread_lock.release()
+                    return False
+                time.sleep(POLL_SECONDS)
+        self._depth += 1
+        return True
+
+    def release(self) -> None:
+        """Release one level of the lock held by this thread."""
+        self._depth -= 1
+        if self._depth == 0:
+            self._unlock_file()
+        self._thread_lock.release()
+
+    def close(self) -> None:
+        with self._thread_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def _to_json(entry: Dict) -> Dict:
+    """Make a spooled save JSON-serializable."""
+    if entry.get("op") != "save":
+        return entry
+    session = dict(entry["session"])
+    for field in DATETIME_FIELDS:
+        if isinstance(session.get(field), datetime):
+            session[field] = session[field].isoformat()
+    return {**entry, "session": session}
+
+
+def _from_json(entry: Dict) -> Dict:
+    """Restore datetimes of a spooled save."""
+    if entry.get("op") != "save":
+        return entry
+    session = dict(entry["session"])
+    for field in DATETIME_FIELDS:
+        if isinstance(session.get(field), str):
+            session[field] = datetime.fromisoformat(session[field])
+    return {**entry, "session": session}
+
+
+class WriteSpool:
+    """Directory of writes queued while another process held the write lock.
+
+    Entries are {"op": "save", "session": {save_session kwargs}} or
+    {"op": "delete", "session_id": str}, one file each, named so that
+    sorting the names restores submission order.
+
+    Args:
+        directory: Spool directory (created if missing)
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def append(self, entry: Dict) -> Path:
+        """Queue an entry atomically and return its file."""
+        name = f"{time.time_ns():020d}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        path = self.directory / (name + SPOOL_SUFFIX)
+        tmp_path = self.directory / (name + ".tmp")
+        tmp_path.write_text(json.dumps(_to_json(entry)), encoding="utf-8")
+        os.replace(tmp_path, path)
+        return path
+
+    def pending(self) -> List[Path]:
+        """Queued entry files, oldest first."""
+        return sorted(self.directory.glob("*" + SPOOL_SUFFIX))
+
+    def load(self, path: Path) -> Optional[Dict]:
+        """Read an entry, or None if it is unreadable (it is then set aside)."""
+        try:
+            return _from_json(json.loads(path.read_text(encoding="utf-8")))
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Unreadable spool entry {path.name}: {e}")
+            try:
+                os.replace(path, path.with_suffix(".bad"))
+            except OSError:
+                pass
+            return None
+
+    def remove(self, paths: List[Path]) -> None:
+        for path in paths:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass